@@ -70,7 +70,7 @@ WHERE MONTH(issue_date) = 11 ;
 -- Good Loan Percentage
 Select 
 	(count(case when loan_status = 'Fully Paid' or loan_status = 'Current' then id
-END )*100) /
+END )*100.0) /
 	count(id) as Good_loan_Percentage
 from bank_loan_data;
 
@@ -123,7 +123,7 @@ Select loan_status,
 FROM bank_loan_data 
 group by loan_status ;
 
-
+-- MTD LOAN STATUS
 SELECT 
 	loan_status, 
 	SUM(total_payment) AS MTD_Total_Amount_Received, 
@@ -148,6 +148,18 @@ FROM bank_loan_data
 GROUP BY MONTH(issue_date), MONTHNAME(issue_date)
 ORDER BY MONTH(issue_date);
 
+-- Keeps the months of different years apart
+-- Month by Year
+SELECT 
+    YEAR(issue_date) AS Year_Number, 
+    MONTH(issue_date) AS Month_Number, 
+    COUNT(id) AS Total_Loan_Applications,
+    SUM(loan_amount) AS Total_Funded_Amount,
+    SUM(total_payment) AS Total_Amount_Received
+FROM bank_loan_data
+GROUP BY YEAR(issue_date), MONTH(issue_date)
+ORDER BY YEAR(issue_date), MONTH(issue_date);
+
 
 -- STATE
 SELECT 
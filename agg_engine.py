@@ -0,0 +1,133 @@
+# agg_engine.py
+
+import numpy as np
+import pandas as pd
+
+# Up to this many possible key combinations, keys are numbered densely (a
+# mixed-radix number of the codes); beyond it the combinations that occur
+# are renumbered first (np.unique), so memory follows the data, not the product
+DENSE_KEY_LIMIT = 1 << 22
+
+
+def factorize(values):
+    """Integer codes (-1 = missing) and the labels they stand for, in groupby's sort order.
+
+    A categorical column already is codes plus categories, so it costs nothing.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values, sort=True)
+
+
+def combine_codes(codes, sizes, missing=True):
+    """Number the combinations of several code arrays (-1 = missing) in lexicographic order.
+
+    Returns (group of every element, -1 where any code is missing; number
+    of groups; function turning group numbers back into codes per array).
+    Without `missing`, the codes are known to be all present.
+    """
+    if len(codes) == 1:
+        return codes[0], sizes[0], lambda groups: [groups]
+    combinations = np.prod(sizes, dtype='float64')
+    # Built in place, in the narrowest type the largest key fits
+    key = codes[0].astype('int32' if combinations < 2 ** 31 else 'int64')
+    for c, size in zip(codes[1:], sizes[1:]):
+        key *= size
+        key += c
+    if missing:
+        key[np.logical_or.reduce([c < 0 for c in codes])] = -1
+    if combinations <= DENSE_KEY_LIMIT:
+        return key, int(combinations), lambda groups: np.unravel_index(groups, sizes)
+    valid = key >= 0
+    occurring, inverse = np.unique(key[valid], return_inverse=True)
+    group = np.full(len(key), -1, dtype='int64')
+    group[valid] = inverse
+    return group, len(occurring), lambda groups: np.unravel_index(occurring[groups], sizes)
+
+
+def add_up(group, n_groups, weights=None):
+    """Per-group totals of `weights` (row counts without), skipping elements of group -1"""
+    keep = group >= 0
+    if not keep.all():
+        group = group[keep]
+        weights = None if weights is None else weights[keep]
+    return np.bincount(group, weights=weights, minlength=n_groups)
+
+
+class CodedFrame:
+    """A frame reduced once to the totals of every combination of its dimensions.
+
+    The dimensions are factorized to integer codes, and one np.bincount
+    per measure over the combined codes adds the rows up into cells (much
+    like loan_cube's cube, for any frame). aggregate() then only adds up
+    cells, so each breakdown costs next to nothing however many rows the
+    frame has.
+    """
+
+    def __init__(self, df, dims, measures):
+        codes, sizes = [], []
+        self.labels = {}
+        for dim in dims:
+            dim_codes, labels = factorize(df[dim])
+            # Missing values get code 0 of their own, so those rows still
+            # count in breakdowns by the other dimensions
+            codes.append(dim_codes.astype('int32') + 1)
+            sizes.append(len(labels) + 1)
+            self.labels[dim] = (labels, df[dim].dtype)
+        if dims:
+            cell, n_cells, decode = combine_codes(codes, sizes, missing=False)
+        else:
+            cell, n_cells, decode = np.zeros(len(df), dtype='int64'), 1, lambda groups: []
+
+        rows = np.bincount(cell, minlength=n_cells)
+        occupied = np.flatnonzero(rows)
+        self.rows = rows[occupied]
+        self.codes = {dim: dim_codes - 1 for dim, dim_codes in zip(dims, decode(occupied))}
+        self.sums, self.present, self.integer = {}, {}, {}
+        for m in measures:
+            values = df[m].to_numpy()
+            self.integer[m] = pd.api.types.is_integer_dtype(df[m].dtype)
+            self.present[m] = self.rows
+            if values.dtype.kind == 'f':
+                missing = np.isnan(values)
+                if missing.any():
+                    values = np.where(missing, 0.0, values)
+                    self.present[m] = self.rows - np.bincount(cell, weights=missing, minlength=n_cells)[occupied]
+            elif values.dtype.kind not in 'iub':
+                # Nullable or object columns
+                values = df[m].to_numpy(dtype='float64', na_value=np.nan)
+                missing = np.isnan(values)
+                values = np.where(missing, 0.0, values)
+                self.present[m] = self.rows - np.bincount(cell, weights=missing, minlength=n_cells)[occupied]
+            self.sums[m] = np.bincount(cell, weights=values, minlength=n_cells)[occupied]
+
+    def aggregate(self, dims, sums=(), means=(), count=None):
+        """One row per combination of `dims` that occurs, like groupby(dims, observed=True).agg().
+
+        `sums` and `means` name measures to add up or average (missing
+        values skipped), and `count` names a column for the rows per
+        group. Rows missing any of `dims` are left out, and the groups
+        come in groupby's order, so the result can replace a groupby's
+        `.reset_index()` as is.
+        """
+        group, n_groups, decode = combine_codes([self.codes[dim] for dim in dims],
+                                                [len(self.labels[dim][0]) for dim in dims])
+        rows = add_up(group, n_groups, self.rows)
+        observed = np.flatnonzero(rows)
+        result = {}
+        for dim, codes in zip(dims, decode(observed)):
+            labels, dtype = self.labels[dim]
+            if isinstance(dtype, pd.CategoricalDtype):
+                result[dim] = pd.Categorical.from_codes(codes, dtype=dtype)
+            else:
+                result[dim] = labels.take(codes)
+        if count:
+            result[count] = rows[observed].astype('int64')
+        for m in sums:
+            total = add_up(group, n_groups, self.sums[m])[observed]
+            result[m] = total.round().astype('int64') if self.integer[m] else total
+        for m in means:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[m] = (add_up(group, n_groups, self.sums[m])[observed]
+                             / add_up(group, n_groups, self.present[m])[observed])
+        return pd.DataFrame(result)
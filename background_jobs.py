@@ -0,0 +1,243 @@
+# background_jobs.py
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs run at the same time by each manager (each dashboard process)
+DEFAULT_JOB_WORKERS = int(os.environ.get('DASHBOARD_JOB_WORKERS', 2))
+
+# A job whose progress file has not been touched for this long is taken for
+# dead (the process running it was killed, say) and started again by the
+# next request for it. The process running a job touches the file every
+# HEARTBEAT_SECONDS while the job is queued or running, however long a step takes.
+STALE_JOB_SECONDS = 120
+HEARTBEAT_SECONDS = 10
+
+# Finished jobs are deleted from disk after this long
+JOB_RESULT_TTL = 15 * 60  # seconds
+
+# Files in a job's directory
+PROGRESS_FILE = 'progress.json'
+RESULT_FILE = 'result.pkl'
+ERROR_FILE = 'error.txt'
+CANCEL_FILE = 'cancel'
+WAITERS_DIR = 'waiters'
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next progress report after it was cancelled"""
+
+
+def job_id(key):
+    """Identical requests (same key) get the same job"""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+
+
+def _write_atomic(path, data, mode='w'):
+    with open(path + '.tmp', mode) as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+class JobProgress:
+    """Passed to a running job as `progress`: call it with (done, total, label) between steps.
+
+    Each call is also where a cancelled job stops, by raising JobCancelled.
+    `on_cancel` is called just before, holding `lock`.
+    """
+
+    def __init__(self, job_dir, lock=None, on_cancel=None):
+        self.job_dir = job_dir
+        self.lock = lock or threading.Lock()
+        self.on_cancel = on_cancel
+
+    def __call__(self, done, total, label=''):
+        with self.lock:
+            if os.path.exists(os.path.join(self.job_dir, CANCEL_FILE)):
+                if self.on_cancel is not None:
+                    self.on_cancel()
+                raise JobCancelled()
+        _write_atomic(os.path.join(self.job_dir, PROGRESS_FILE),
+                      json.dumps({'done': done, 'total': total, 'label': label}))
+
+
+def _run_job(job_dir, fn, args, progress=None):
+    """Run one job in a worker and leave its result (or error) in its directory"""
+    progress = progress or JobProgress(job_dir)
+    try:
+        progress(0, 1, 'Starting')
+        result = fn(*args, progress=progress)
+        _write_atomic(os.path.join(job_dir, RESULT_FILE), pickle.dumps(result), mode='wb')
+    except JobCancelled:
+        pass
+    except Exception as e:
+        _write_atomic(os.path.join(job_dir, ERROR_FILE), f"{type(e).__name__}: {e}")
+
+
+class JobManager:
+    """Runs slow jobs off the request threads, in a few job threads, and tracks them on disk.
+
+    Each job has a directory under `jobs_dir` with its progress, a cancel
+    marker and finally its pickled result or error, so any process using
+    the same directory (every worker of serve.py) can follow a job that
+    another one started. Jobs are named after their key, so identical
+    pending requests share one job. A job is cancelled once every waiter
+    that asked for it has been released. The jobs run in this process,
+    so they see its current data and record their stage timings in its
+    metrics; they do share its interpreter with the request threads,
+    which only submit and poll them.
+
+    A job this process still holds (queued or running) is never taken
+    for stale here, and a heartbeat keeps it from looking stale to the
+    other processes.
+    """
+
+    def __init__(self, jobs_dir=None, workers=DEFAULT_JOB_WORKERS):
+        self.jobs_dir = jobs_dir or tempfile.mkdtemp(prefix='loan-jobs-')
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        # Job id -> runs of it queued or running in this process
+        self._live = {}
+        self._pruned_at = 0.0
+        threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def _job_dir(self, job):
+        return os.path.join(self.jobs_dir, job)
+
+    def _leave(self, job):
+        """One run of `job` stopped (called holding the lock)"""
+        self._live[job] -= 1
+        if not self._live[job]:
+            del self._live[job]
+
+    def _run(self, job, fn, args):
+        stopped = []
+
+        def on_cancel():
+            # Under the lock, so submit() never revives a run that is stopping
+            self._leave(job)
+            stopped.append(True)
+
+        progress = JobProgress(self._job_dir(job), self._lock, on_cancel)
+        try:
+            _run_job(self._job_dir(job), fn, args, progress)
+        finally:
+            if not stopped:
+                with self._lock:
+                    self._leave(job)
+
+    def _heartbeat(self):
+        """Touch the progress files of the jobs this process holds, so other processes see them alive"""
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                jobs = list(self._live)
+            for job in jobs:
+                try:
+                    os.utime(os.path.join(self._job_dir(job), PROGRESS_FILE))
+                except OSError:
+                    pass
+
+    def submit(self, key, fn, *args, waiter=None):
+        """Start fn(*args, progress=JobProgress) for `key`, unless that job is already pending or done.
+
+        `waiter` (e.g. a browser session) is recorded as waiting for the
+        job until released. Returns the job id.
+        """
+        job = job_id(key)
+        job_dir = self._job_dir(job)
+        with self._lock:
+            self._prune()
+            state = self.status(job)['state']
+            if state == 'cancelled' and job in self._live:
+                # Cancelled but still queued or between steps here: let it go on
+                os.remove(os.path.join(job_dir, CANCEL_FILE))
+            elif state in ('cancelled', 'failed', 'stale'):
+                shutil.rmtree(job_dir, ignore_errors=True)
+            try:
+                # Creating the directory is atomic, so only one process starts the job
+                os.makedirs(os.path.join(job_dir, WAITERS_DIR))
+                created = True
+            except FileExistsError:
+                created = False
+            if waiter is not None:
+                open(os.path.join(job_dir, WAITERS_DIR, str(waiter)), 'w').close()
+            if created:
+                _write_atomic(os.path.join(job_dir, PROGRESS_FILE),
+                              json.dumps({'done': 0, 'total': 1, 'label': 'Queued'}))
+                self._live[job] = self._live.get(job, 0) + 1
+                self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def release(self, job, waiter):
+        """`waiter` no longer needs the job; cancel it if it is unfinished and nobody else does"""
+        job_dir = self._job_dir(job)
+        try:
+            os.remove(os.path.join(job_dir, WAITERS_DIR, str(waiter)))
+        except OSError:
+            pass
+        try:
+            waiting = os.listdir(os.path.join(job_dir, WAITERS_DIR))
+        except OSError:
+            return
+        if not waiting and self.status(job)['state'] == 'running':
+            self.cancel(job)
+
+    def cancel(self, job):
+        try:
+            open(os.path.join(self._job_dir(job), CANCEL_FILE), 'w').close()
+        except OSError:
+            pass
+
+    def status(self, job):
+        """The job's state (None if unknown, 'running', 'done', 'failed', 'cancelled' or 'stale') and progress"""
+        job_dir = self._job_dir(job)
+        status = {'state': None, 'done': 0, 'total': 1, 'label': '', 'error': None}
+        if not os.path.isdir(job_dir):
+            return status
+        if os.path.exists(os.path.join(job_dir, RESULT_FILE)):
+            return dict(status, state='done', done=1)
+        try:
+            with open(os.path.join(job_dir, ERROR_FILE), encoding='utf-8') as f:
+                return dict(status, state='failed', error=f.read())
+        except OSError:
+            pass
+        if os.path.exists(os.path.join(job_dir, CANCEL_FILE)):
+            return dict(status, state='cancelled')
+        path = os.path.join(job_dir, PROGRESS_FILE)
+        try:
+            with open(path, encoding='utf-8') as f:
+                status.update(json.load(f))
+            age = time.time() - os.path.getmtime(path)
+        except (OSError, ValueError):
+            return dict(status, state='running')  # being written right now
+        stale = age > STALE_JOB_SECONDS and job not in self._live
+        return dict(status, state='stale' if stale else 'running')
+
+    def result(self, job):
+        with open(os.path.join(self._job_dir(job), RESULT_FILE), 'rb') as f:
+            return pickle.load(f)
+
+    def _prune(self, max_age=JOB_RESULT_TTL):
+        """Delete the directories of jobs untouched for `max_age` seconds, at most once a minute"""
+        now = time.time()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        for job in os.listdir(self.jobs_dir):
+            if job in self._live:
+                continue
+            job_dir = self._job_dir(job)
+            try:
+                if now - os.path.getmtime(os.path.join(job_dir, PROGRESS_FILE)) > max_age:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+            except OSError:
+                continue
@@ -1,46 +1,186 @@
+import os
+import threading
+import time
+import uuid
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from plotly.subplots import make_subplots
 import dash
-from dash import dcc, html, Input, Output
+import flask
+from dash import dcc, html, callback, no_update, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from datetime import datetime
-import numpy as np
-
-# Load the cleaned data
-try:
-    df = pd.read_csv('cleaned_financial_loan.csv')
-    # Convert date columns back to datetime
-    date_columns = ['issue_date', 'last_credit_pull_date', 'last_payment_date', 'next_payment_date']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
-    print("Data loaded successfully!")
-except Exception as e:
-    print(f"Error loading data: {e}")
-    # Create sample data for demonstration
-    np.random.seed(42)
-    n = 1000
-    df = pd.DataFrame({
-        'id': range(1, n+1),
-        'loan_amount': np.random.uniform(5000, 50000, n),
-        'total_payment': np.random.uniform(6000, 60000, n),
-        'int_rate': np.random.uniform(0.05, 0.25, n),
-        'dti': np.random.uniform(0.1, 0.8, n),
-        'issue_date': pd.date_range('2023-01-01', periods=n, freq='D'),
-        'loan_status': np.random.choice(['Fully Paid', 'Current', 'Charged Off'], n, p=[0.6, 0.3, 0.1]),
-        'address_state': np.random.choice(['CA', 'TX', 'NY', 'FL', 'IL'], n),
-        'term': np.random.choice(['36 months', '60 months'], n),
-        'emp_length': np.random.choice(['< 1 year', '1 year', '2 years', '3 years', '4 years', '5 years', '6 years', '7 years', '8 years', '9 years', '10+ years'], n),
-        'purpose': np.random.choice(['debt_consolidation', 'credit_card', 'home_improvement', 'major_purchase', 'medical', 'car', 'vacation', 'wedding'], n),
-        'home_ownership': np.random.choice(['RENT', 'OWN', 'MORTGAGE'], n)
-    })
+from background_jobs import JobManager, job_id
+from bitmap_index import BitmapIndex
+from loan_cube import CUBE_CACHE_DIR, read_source_cube
+from parallel_agg import DEFAULT_WORKERS as AGGREGATION_WORKERS, THREADED_START_METHOD, build_cube_parallel
+from period_kpis import build_daily_totals
+from time_rollups import GRANULARITIES, TimePyramid, build_pyramid
+from query_backend import BACKENDS, make_backend
+from stage_metrics import CONTENT_TYPE, registry, start_snapshot_writer
+from view_cache import TTLCache
+from loan_data import (CACHE_META_FILE, CLEANED_FILE_PATH, PARTITIONS_META_FILE, cache_dir_for,
+                       file_state, load_cleaned_data, watch_for_changes)
+from generate_loan_data import generate_sample_data
+
+STARTED_AT = time.perf_counter()
+
+# How often the data source is checked for changes to reload (0 = never)
+RELOAD_CHECK_INTERVAL = 5  # seconds
+
+# What computes the KPIs and chart data: 'pandas' rolls up the loan cube,
+# 'sql' runs the queries of 'Query MySql File.sql' on an SQLite copy
+QUERY_BACKEND = os.environ.get('DASHBOARD_BACKEND', 'pandas')
+backend_name = QUERY_BACKEND
+
+# The loan data and its cube live in one snapshot that is replaced as a
+# whole: a reload builds the new snapshot on the side and swaps it in with
+# a single assignment, so requests keep using the old one until then and
+# never see a half-built state
+_snapshot = None
+_data_ready = threading.Event()
+_bitmaps_lock = threading.Lock()
+
+
+def make_snapshot(df, data_version, cube=None, source=None, cache_dir=None, shared=False):
+    # Pre-aggregate the loans once; every chart and KPI below rolls up this
+    # cube instead of rescanning the loan-level rows. With
+    # $DASHBOARD_AGG_WORKERS > 1 it is built by that many processes, not
+    # forked, as this process already runs request and job threads.
+    if cube is None:
+        with registry.stage('data.build_cube'):
+            cube = build_cube_parallel(df, AGGREGATION_WORKERS, start_method=THREADED_START_METHOD)
+    print(f"Loan cube: {len(cube):,} cells from {len(df):,} loans")
+    # The sql backend keeps its database next to the column cache (`cache_dir`),
+    # written by serve.py beforehand when `shared`
+    with registry.stage('data.backend'):
+        backend = make_backend(backend_name, df, cube, data_version, cache_dir, build=not shared)
+    # Running per-day totals behind the MTD / PMTD / QTD / YTD tiles, and the
+    # day-to-year rollups of the trend chart summed from them, so moving the
+    # reference date or the granularity is a lookup rather than a scan
+    with registry.stage('data.time_rollups'):
+        pyramid = TimePyramid(build_daily_totals(df))
+    # The bitmap index is left for get_bitmaps to build on the first filtered
+    # request, so processes that never get one don't hold it in memory
+    return {'df': df, 'cube': cube, 'backend': backend, 'pyramid': pyramid, 'bitmaps': None,
+            'data_version': data_version, 'source': source}
+
+
+def publish(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+    _data_ready.set()
+    df = snapshot['df']
+    registry.set_gauge('dashboard_data_rows', len(df))
+    # Shallow: the array sizes alone, rather than a pass over every string on each reload
+    registry.set_gauge('dashboard_data_memory_bytes', int(df.memory_usage(deep=False).sum()))
+    registry.set_gauge('dashboard_cube_cells', len(snapshot['cube']))
+    registry.set_gauge('dashboard_data_loaded_timestamp_seconds', time.time())
+
+
+def get_bitmaps(snapshot):
+    """The snapshot's bitmap index, built the first time a filtered selection needs it.
+
+    A bitset per dimension value, so the filtered pyramids select their
+    loans with bitwise ANDs / ORs instead of comparing strings.
+    """
+    with _bitmaps_lock:
+        if snapshot['bitmaps'] is None:
+            with registry.stage('data.bitmap_index'):
+                snapshot['bitmaps'] = BitmapIndex(snapshot['df'])
+    return snapshot['bitmaps']
+
+
+def set_data(df, data_version, cube=None):
+    """Make `df` the data behind every page, KPI and chart"""
+    publish(make_snapshot(df, data_version, cube))
+
+
+def source_state(csv_path, shared=False):
+    """Signature of the file whose changes trigger a reload, or None if it is missing"""
+    cache_dir = cache_dir_for(csv_path)
+    if os.path.isdir(csv_path):
+        # clean_data.py rewrites the partition list last
+        path = os.path.join(csv_path, PARTITIONS_META_FILE)
+    elif shared:
+        # serve.py writes the cube last when it refreshes the shared caches
+        path = os.path.join(cache_dir, CUBE_CACHE_DIR, CACHE_META_FILE)
+    elif os.path.exists(csv_path):
+        path = csv_path
+    else:
+        path = os.path.join(cache_dir, CACHE_META_FILE)
+    state = file_state(path)
+    return None if state is None else (path,) + state
+
+
+def read_data(csv_path=CLEANED_FILE_PATH, shared=False):
+    """Load the cleaned data into a new snapshot.
+
+    With `shared`, the column cache and the cube stored next to it (see
+    serve.py) are memory-mapped read-only, so every worker process uses
+    the same copy in the OS page cache instead of building its own. Only
+    serve.py writes those caches then.
+    """
+    source = source_state(csv_path, shared)
+    # Uses the columnar cache written by clean_data.py when it is up to date;
+    # the data version identifies this exact copy of the file for the KPI cache
+    df, data_version = load_cleaned_data(csv_path, show_memory=not shared,
+                                         mmap=shared, write_cache=not shared)
+    # The cube stored with the cache (by clean_data.py or serve.py) saves
+    # rebuilding it; partitions each have theirs, which are added up
+    cube = read_source_cube(csv_path, mmap=shared)
+    return make_snapshot(df, data_version, cube, source, cache_dir_for(csv_path), shared)
+
+
+def load_data(csv_path=CLEANED_FILE_PATH, shared=False):
+    """Load the cleaned data (or sample data if that fails) and publish it"""
+    start = time.perf_counter()
+    try:
+        snapshot = read_data(csv_path, shared)
+        print("Data loaded successfully!")
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        # Create sample data for demonstration
+        n = 1000
+        snapshot = make_snapshot(generate_sample_data(n, seed=42), ('sample', n),
+                                 source=source_state(csv_path, shared))
+    publish(snapshot)
+    print(f"⏱️  Data ready in {time.perf_counter() - start:.2f}s "
+          f"({time.perf_counter() - STARTED_AT:.2f}s after import)")
+
+
+def reload_data(csv_path=CLEANED_FILE_PATH, shared=False):
+    """Build a snapshot of the changed data source and swap it in once fully ready"""
+    start = time.perf_counter()
+    print(f"🔄 Data source changed, reloading '{csv_path}'...")
+    snapshot = read_data(csv_path, shared)
+    # Build the default page now, so the first visitor after the swap is not kept waiting
+    get_view(snapshot, UNFILTERED)
+    publish(snapshot)
+    print(f"✅ Reloaded {len(snapshot['df']):,} loans in {time.perf_counter() - start:.2f}s")
+
+
+def run_data_loader(csv_path, shared, reload_interval):
+    """Load the data, then keep reloading it whenever its source changes"""
+    load_data(csv_path, shared)
+    if reload_interval:
+        watch_for_changes(lambda: source_state(csv_path, shared),
+                          lambda state: reload_data(csv_path, shared),
+                          reload_interval, initial=get_data()['source'])
+
+
+def data_ready():
+    return _data_ready.is_set()
+
+
+def get_data():
+    """The current data snapshot, waiting for the background load if needed"""
+    _data_ready.wait()
+    return _snapshot
 
-# Initialize the Dash app with custom CSS
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 # Custom CSS for beautiful styling
-app.index_string = '''
+INDEX_STRING = '''
 <!DOCTYPE html>
 <html>
     <head>
@@ -246,87 +386,43 @@ app.index_string = '''
 '''
 
 # Calculate KPIs
+@registry.timed('kpis.calculate_kpis')
 def calculate_kpis():
-    # Total KPIs
-    total_applications = len(df)
-    total_funded = df['loan_amount'].sum()
-    total_received = df['total_payment'].sum()
-    avg_interest_rate = df['int_rate'].mean() * 100
-    avg_dti = df['dti'].mean() * 100
-    
-    # Good vs Bad Loans
-    good_loans = df[df['loan_status'].isin(['Fully Paid', 'Current'])]
-    bad_loans = df[df['loan_status'] == 'Charged Off']
-    
-    good_loan_percentage = (len(good_loans) / total_applications) * 100
-    bad_loan_percentage = (len(bad_loans) / total_applications) * 100
-    
-    good_loan_amount = good_loans['loan_amount'].sum()
-    bad_loan_amount = bad_loans['loan_amount'].sum()
-    
-    # MTD and PMTD calculations (assuming current month is December)
-    current_month = 12
-    previous_month = 11
-    
-    mtd_applications = len(df[df['issue_date'].dt.month == current_month])
-    pmtd_applications = len(df[df['issue_date'].dt.month == previous_month])
-    
-    mtd_funded = df[df['issue_date'].dt.month == current_month]['loan_amount'].sum()
-    pmtd_funded = df[df['issue_date'].dt.month == previous_month]['loan_amount'].sum()
-    
-    mtd_received = df[df['issue_date'].dt.month == current_month]['total_payment'].sum()
-    pmtd_received = df[df['issue_date'].dt.month == previous_month]['total_payment'].sum()
-    
-    return {
-        'total_applications': total_applications,
-        'total_funded': total_funded,
-        'total_received': total_received,
-        'avg_interest_rate': avg_interest_rate,
-        'avg_dti': avg_dti,
-        'good_loan_percentage': good_loan_percentage,
-        'bad_loan_percentage': bad_loan_percentage,
-        'good_loan_amount': good_loan_amount,
-        'bad_loan_amount': bad_loan_amount,
-        'mtd_applications': mtd_applications,
-        'pmtd_applications': pmtd_applications,
-        'mtd_funded': mtd_funded,
-        'pmtd_funded': pmtd_funded,
-        'mtd_received': mtd_received,
-        'pmtd_received': pmtd_received
-    }
+    """Return all KPIs of the whole book from the query backend"""
+    return get_data()['backend'].select().kpis()
 
 # Create enhanced visualizations with beautiful colors
-def create_monthly_trend_chart():
-    monthly_data = df.groupby(df['issue_date'].dt.to_period('M')).agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum'
-    }).reset_index()
-    
-    monthly_data['issue_date'] = monthly_data['issue_date'].astype(str)
+@registry.timed('figure.trend')
+def create_trend_chart(trend=None, granularity='M'):
+    trend = get_data()['pyramid'].level(granularity) if trend is None else trend
+    # Weeks are labelled by their first day
+    periods = trend['period']
+    trend_data = trend.assign(issue_date=periods.dt.start_time.dt.strftime('%Y-%m-%d')
+                              if granularity == 'W' else periods.astype(str))
+    label = GRANULARITIES[granularity]
     
     fig = make_subplots(
         rows=2, cols=1,
-        subplot_titles=('📊 Monthly Loan Applications', '💰 Monthly Amounts ($)'),
+        subplot_titles=(f'📊 {label} Loan Applications', f'💰 {label} Amounts ($)'),
         vertical_spacing=0.15
     )
     
     fig.add_trace(
-        go.Bar(x=monthly_data['issue_date'], y=monthly_data['id'], 
+        go.Bar(x=trend_data['issue_date'], y=trend_data['count'], 
                name='Applications', marker_color='#667eea',
                marker_line_color='#764ba2', marker_line_width=2),
         row=1, col=1
     )
     
     fig.add_trace(
-        go.Scatter(x=monthly_data['issue_date'], y=monthly_data['loan_amount'], 
+        go.Scatter(x=trend_data['issue_date'], y=trend_data['loan_amount'], 
                    name='Funded Amount', line=dict(color='#28a745', width=4),
                    mode='lines+markers', marker=dict(size=8, color='#28a745')),
         row=2, col=1
     )
     
     fig.add_trace(
-        go.Scatter(x=monthly_data['issue_date'], y=monthly_data['total_payment'], 
+        go.Scatter(x=trend_data['issue_date'], y=trend_data['total_payment'], 
                    name='Amount Received', line=dict(color='#fd7e14', width=4),
                    mode='lines+markers', marker=dict(size=8, color='#fd7e14')),
         row=2, col=1
@@ -335,7 +431,7 @@ def create_monthly_trend_chart():
     fig.update_layout(
         height=600, 
         showlegend=True, 
-        title_text="📈 Monthly Trends Analysis",
+        title_text=f"📈 {label} Trends Analysis",
         title_font_size=20,
         title_font_color='#2c3e50',
         plot_bgcolor='rgba(0,0,0,0)',
@@ -348,14 +444,10 @@ def create_monthly_trend_chart():
     
     return fig
 
-def create_loan_status_chart():
-    status_data = df.groupby('loan_status').agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum',
-        'int_rate': 'mean',
-        'dti': 'mean'
-    }).reset_index()
+@registry.timed('figure.loan_status')
+def create_loan_status_chart(data=None):
+    data = get_data()['backend'].select() if data is None else data
+    status_data = data.rollup(['loan_status'])
     
     fig = make_subplots(
         rows=2, cols=2,
@@ -372,7 +464,7 @@ def create_loan_status_chart():
     
     # Pie chart for loan count
     fig.add_trace(
-        go.Pie(labels=status_data['loan_status'], values=status_data['id'],
+        go.Pie(labels=status_data['loan_status'], values=status_data['count'],
                name="Loan Count", marker_colors=colors[:len(status_data)],
                textinfo='label+percent', textposition='inside'),
         row=1, col=1
@@ -418,12 +510,10 @@ def create_loan_status_chart():
     
     return fig
 
-def create_geographic_chart():
-    state_data = df.groupby('address_state').agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum'
-    }).reset_index()
+@registry.timed('figure.geographic')
+def create_geographic_chart(data=None):
+    data = get_data()['backend'].select() if data is None else data
+    state_data = data.rollup(['address_state'])
     
     fig = make_subplots(
         rows=1, cols=2,
@@ -433,7 +523,7 @@ def create_geographic_chart():
     )
     
     fig.add_trace(
-        go.Bar(x=state_data['address_state'], y=state_data['id'],
+        go.Bar(x=state_data['address_state'], y=state_data['count'],
                name="Applications", marker_color='#20c997',
                marker_line_color='#28a745', marker_line_width=2),
         row=1, col=1
@@ -462,31 +552,22 @@ def create_geographic_chart():
     
     return fig
 
-def create_categorical_charts():
+@registry.timed('figure.categorical')
+def create_categorical_charts(data=None):
     """Create categorical analysis charts"""
+    data = get_data()['backend'].select() if data is None else data
+
     # Purpose analysis
-    purpose_data = df.groupby('purpose').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index().sort_values('id', ascending=False).head(10)
+    purpose_data = data.rollup(['purpose']).sort_values('count', ascending=False).head(10)
     
     # Term analysis
-    term_data = df.groupby('term').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    term_data = data.rollup(['term'])
     
     # Employee length analysis
-    emp_data = df.groupby('emp_length').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    emp_data = data.rollup(['emp_length'])
     
     # Home ownership analysis
-    home_data = df.groupby('home_ownership').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    home_data = data.rollup(['home_ownership'])
     
     fig = make_subplots(
         rows=2, cols=2,
@@ -503,7 +584,7 @@ def create_categorical_charts():
     
     # Purpose bar chart
     fig.add_trace(
-        go.Bar(x=purpose_data['purpose'], y=purpose_data['id'],
+        go.Bar(x=purpose_data['purpose'], y=purpose_data['count'],
                name="Applications", marker_color=colors[:len(purpose_data)],
                marker_line_color='#495057', marker_line_width=1),
         row=1, col=1
@@ -511,7 +592,7 @@ def create_categorical_charts():
     
     # Term pie chart
     fig.add_trace(
-        go.Pie(labels=term_data['term'], values=term_data['id'],
+        go.Pie(labels=term_data['term'], values=term_data['count'],
                name="Term Distribution", marker_colors=colors[:len(term_data)],
                textinfo='label+percent', textposition='inside'),
         row=1, col=2
@@ -519,7 +600,7 @@ def create_categorical_charts():
     
     # Employee length bar chart
     fig.add_trace(
-        go.Bar(x=emp_data['emp_length'], y=emp_data['id'],
+        go.Bar(x=emp_data['emp_length'], y=emp_data['count'],
                name="Applications", marker_color='#28a745',
                marker_line_color='#20c997', marker_line_width=2),
         row=2, col=1
@@ -527,7 +608,7 @@ def create_categorical_charts():
     
     # Home ownership bar chart
     fig.add_trace(
-        go.Bar(x=home_data['home_ownership'], y=home_data['id'],
+        go.Bar(x=home_data['home_ownership'], y=home_data['count'],
                name="Applications", marker_color='#6f42c1',
                marker_line_color='#e83e8c', marker_line_width=2),
         row=2, col=2
@@ -549,19 +630,16 @@ def create_categorical_charts():
     
     return fig
 
-def create_good_vs_bad_loan_chart():
-    good_loans = df[df['loan_status'].isin(['Fully Paid', 'Current'])]
-    bad_loans = df[df['loan_status'] == 'Charged Off']
+@registry.timed('figure.good_vs_bad')
+def create_good_vs_bad_loan_chart(kpis=None):
+    kpis = calculate_kpis() if kpis is None else kpis
     
     # Create comparison data
     comparison_data = pd.DataFrame({
         'Category': ['Good Loans', 'Bad Loans'],
-        'Count': [len(good_loans), len(bad_loans)],
-        'Amount': [good_loans['loan_amount'].sum(), bad_loans['loan_amount'].sum()],
-        'Percentage': [
-            (len(good_loans) / len(df)) * 100,
-            (len(bad_loans) / len(df)) * 100
-        ]
+        'Count': [kpis['good_loan_applications'], kpis['bad_loan_applications']],
+        'Amount': [kpis['good_loan_amount'], kpis['bad_loan_amount']],
+        'Percentage': [kpis['good_loan_percentage'], kpis['bad_loan_percentage']]
     })
     
     fig = make_subplots(
@@ -613,167 +691,643 @@ def create_good_vs_bad_loan_chart():
 
 
 
-# App layout with beautiful UI
-app.layout = html.Div([
-    # Header Section
-    html.Div([
+# Element id, KPI and display format of every KPI card and quick-stat tile
+KPI_DISPLAY = [
+    ('kpi-total-applications', 'total_applications', "{:,}"),
+    ('kpi-total-funded', 'total_funded', "${:,.0f}"),
+    ('kpi-total-received', 'total_received', "${:,.0f}"),
+    ('kpi-good-loan-percentage', 'good_loan_percentage', "{:.1f}%"),
+    ('kpi-avg-interest-rate', 'avg_interest_rate', "{:.2f}%"),
+    ('kpi-avg-dti', 'avg_dti', "{:.1f}%"),
+    ('kpi-bad-loan-percentage', 'bad_loan_percentage', "{:.1f}%"),
+    ('stat-good-loan-amount', 'good_loan_amount', "{:,.0f}")
+]
+
+# Same for the tiles of the periods ending on the reference date (see
+# period_kpis.DailyTotals.period_kpis); these follow the reference date
+# and the dropdown filters, not the issue date range
+PERIOD_DISPLAY = [
+    ('kpi-mtd-applications', 'mtd_applications', "{:,}"),
+    ('stat-mtd-funded', 'mtd_funded', "{:,.0f}"),
+    ('stat-mtd-received', 'mtd_received', "{:,.0f}"),
+    ('stat-pmtd-applications', 'pmtd_applications', "{:,}"),
+    ('stat-qtd-applications', 'qtd_applications', "{:,}"),
+    ('stat-ytd-funded', 'ytd_funded', "{:,.0f}"),
+    ('stat-mom-applications', 'mom_applications', "{:+.1f}%"),
+    ('stat-yoy-applications', 'yoy_applications', "{:+.1f}%")
+]
+
+# Graphs recomputed when the filters change, in callback output order
+GRAPH_IDS = ['loan-status-chart', 'geographic-chart', 'good-vs-bad-chart', 'categorical-chart']
+
+
+def format_kpis(kpis, display=KPI_DISPLAY):
+    """Format the KPIs for display, keyed by element id"""
+    # Averages over an empty selection are NaN, and so are growth rates over an empty period
+    return {elem_id: "n/a" if pd.isna(kpis[key]) else fmt.format(kpis[key])
+            for elem_id, key, fmt in display}
+
+
+def filter_options(cube, dim):
+    """Dropdown options for one cube dimension"""
+    values = sorted(str(v) for v in cube[dim].dropna().unique())
+    return [{'label': v, 'value': v} for v in values]
+
+
+def dropdown_filter(label, filter_id, dim, cube):
+    return dbc.Col([
+        html.Label(label, className="quick-stats-label"),
+        dcc.Dropdown(id=filter_id, options=filter_options(cube, dim), multi=True,
+                     placeholder="All")
+    ], width=2)
+
+
+def page_header():
+    return html.Div([
         html.H1("🏦 Bank Loan Analytics Dashboard", className="header-title"),
         html.P("Comprehensive Financial Analytics & Performance Insights", className="header-subtitle")
-    ], className="header-section"),
-    
-    # Main Dashboard Container
-    html.Div([
-        # KPI Cards Row 1
-        dbc.Row([
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("📊", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['total_applications']:,}", className="kpi-value"),
-                        html.H4("Total Applications", className="kpi-label"),
-                        html.P("Total loan applications received", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("💰", className="kpi-icon"),
-                        html.H2(f"${calculate_kpis()['total_funded']:,.0f}", className="kpi-value"),
-                        html.H4("Total Funded", className="kpi-label"),
-                        html.P("Total amount funded across all loans", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("💵", className="kpi-icon"),
-                        html.H2(f"${calculate_kpis()['total_received']:,.0f}", className="kpi-value"),
-                        html.H4("Total Received", className="kpi-label"),
-                        html.P("Total amount received from borrowers", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("📈", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['good_loan_percentage']:.1f}%", className="kpi-value"),
-                        html.H4("Good Loan %", className="kpi-label"),
-                        html.P("Percentage of performing loans", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3)
-        ], className="mb-4"),
+    ], className="header-section")
+
+
+# App layout with beautiful UI
+@registry.timed('layout.build')
+def build_layout(snapshot=None):
+    """Build the whole page from the current data"""
+    snapshot = snapshot or get_data()
+    cube = snapshot['cube']
+    # All KPI cards, quick stats and charts read from the unfiltered view,
+    # which is built on the first page load and cached after that
+    view = get_view(snapshot, UNFILTERED)
+    kpi_text = dict(zip([elem_id for elem_id, _, _ in KPI_DISPLAY], view))
+    period = snapshot['pyramid'].daily_totals.period_kpis()
+    kpi_text.update(format_kpis(period, PERIOD_DISPLAY))
+    figures = dict(zip(GRAPH_IDS, view[len(KPI_DISPLAY):]))
+    issue_months = cube['issue_month'].dropna()
+
+    return html.Div([
+        # Header Section
+        page_header(),
+    
+        # Main Dashboard Container
+        html.Div([
+            # Filter Bar
+            html.Div([
+                html.H3("🔎 Filters", className="section-title"),
+                dbc.Row([
+                    dropdown_filter("State", 'filter-state', 'address_state', cube),
+                    dropdown_filter("Term", 'filter-term', 'term', cube),
+                    dropdown_filter("Purpose", 'filter-purpose', 'purpose', cube),
+                    dropdown_filter("Loan Status", 'filter-status', 'loan_status', cube),
+                    dbc.Col([
+                        html.Label("Issue Date", className="quick-stats-label"),
+                        dcc.DatePickerRange(
+                            id='filter-dates',
+                            min_date_allowed=issue_months.min().start_time.date() if len(issue_months) else None,
+                            max_date_allowed=issue_months.max().end_time.date() if len(issue_months) else None,
+                            display_format='MMM YYYY',
+                            clearable=True
+                        )
+                    ], width=4)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        html.Label("Reference Date (MTD / QTD / YTD)", className="quick-stats-label"),
+                        dcc.DatePickerSingle(
+                            id='reference-date',
+                            date=period['reference_date'].date(),
+                            min_date_allowed=issue_months.min().start_time.date() if len(issue_months) else None,
+                            max_date_allowed=issue_months.max().end_time.date() if len(issue_months) else None,
+                            display_format='DD MMM YYYY'
+                        )
+                    ], width=4)
+                ], className="mt-3"),
+                # Progress of the background job building a filtered view
+                # (see update_dashboard), polled until it is done
+                dcc.Store(id='view-job'),
+                dcc.Store(id='session-id', data=uuid.uuid4().hex),
+                dcc.Interval(id='view-poll', interval=VIEW_POLL_INTERVAL, disabled=True),
+                html.Div(id='view-progress', className="mt-3")
+            ], className="chart-section"),
+
+            # KPI Cards Row 1
+            dbc.Row([
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("📊", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-total-applications'], id='kpi-total-applications', className="kpi-value"),
+                            html.H4("Total Applications", className="kpi-label"),
+                            html.P("Total loan applications received", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("💰", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-total-funded'], id='kpi-total-funded', className="kpi-value"),
+                            html.H4("Total Funded", className="kpi-label"),
+                            html.P("Total amount funded across all loans", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("💵", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-total-received'], id='kpi-total-received', className="kpi-value"),
+                            html.H4("Total Received", className="kpi-label"),
+                            html.P("Total amount received from borrowers", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("📈", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-good-loan-percentage'], id='kpi-good-loan-percentage', className="kpi-value"),
+                            html.H4("Good Loan %", className="kpi-label"),
+                            html.P("Percentage of performing loans", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3)
+            ], className="mb-4"),
         
-        # KPI Cards Row 2
-        dbc.Row([
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("🎯", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['mtd_applications']:,}", className="kpi-value"),
-                        html.H4("MTD Applications", className="kpi-label"),
-                        html.P("Month-to-date applications", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("📊", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['avg_interest_rate']:.2f}%", className="kpi-value"),
-                        html.H4("Avg Interest Rate", className="kpi-label"),
-                        html.P("Average interest rate across all loans", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("⚖️", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['avg_dti']:.1f}%", className="kpi-value"),
-                        html.H4("Avg DTI Ratio", className="kpi-label"),
-                        html.P("Average debt-to-income ratio", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3),
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.Span("📉", className="kpi-icon"),
-                        html.H2(f"{calculate_kpis()['bad_loan_percentage']:.1f}%", className="kpi-value"),
-                        html.H4("Bad Loan %", className="kpi-label"),
-                        html.P("Percentage of charged-off loans", className="kpi-description")
-                    ])
-                ], className="kpi-card h-100")
-            ], width=3)
-        ], className="mb-4"),
+            # KPI Cards Row 2
+            dbc.Row([
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("🎯", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-mtd-applications'], id='kpi-mtd-applications', className="kpi-value"),
+                            html.H4("MTD Applications", className="kpi-label"),
+                            html.P("Month-to-date applications", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("📊", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-avg-interest-rate'], id='kpi-avg-interest-rate', className="kpi-value"),
+                            html.H4("Avg Interest Rate", className="kpi-label"),
+                            html.P("Average interest rate across all loans", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("⚖️", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-avg-dti'], id='kpi-avg-dti', className="kpi-value"),
+                            html.H4("Avg DTI Ratio", className="kpi-label"),
+                            html.P("Average debt-to-income ratio", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3),
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardBody([
+                            html.Span("📉", className="kpi-icon"),
+                            html.H2(kpi_text['kpi-bad-loan-percentage'], id='kpi-bad-loan-percentage', className="kpi-value"),
+                            html.H4("Bad Loan %", className="kpi-label"),
+                            html.P("Percentage of charged-off loans", className="kpi-description")
+                        ])
+                    ], className="kpi-card h-100")
+                ], width=3)
+            ], className="mb-4"),
         
-        # Quick Stats Section
-        html.Div([
-            html.H3("📊 Quick Statistics", className="section-title"),
+            # Quick Stats Section
             html.Div([
+                html.H3("📊 Quick Statistics", className="section-title"),
                 html.Div([
-                    html.Div(f"{calculate_kpis()['mtd_funded']:,.0f}", className="quick-stats-value"),
-                    html.Div("MTD Funded ($)", className="quick-stats-label")
-                ], className="quick-stats"),
-                html.Div([
-                    html.Div(f"{calculate_kpis()['mtd_received']:,.0f}", className="quick-stats-value"),
-                    html.Div("MTD Received ($)", className="quick-stats-label")
-                ], className="quick-stats"),
-                html.Div([
-                    html.Div(f"{calculate_kpis()['pmtd_applications']:,}", className="quick-stats-value"),
-                    html.Div("PMTD Applications", className="quick-stats-label")
-                ], className="quick-stats"),
-                html.Div([
-                    html.Div(f"{calculate_kpis()['good_loan_amount']:,.0f}", className="quick-stats-value"),
-                    html.Div("Good Loan Amount ($)", className="quick-stats-label")
-                ], className="quick-stats")
-            ], className="stats-grid")
-        ], className="chart-section"),
+                    html.Div([
+                        html.Div(kpi_text['stat-mtd-funded'], id='stat-mtd-funded', className="quick-stats-value"),
+                        html.Div("MTD Funded ($)", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-mtd-received'], id='stat-mtd-received', className="quick-stats-value"),
+                        html.Div("MTD Received ($)", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-pmtd-applications'], id='stat-pmtd-applications', className="quick-stats-value"),
+                        html.Div("PMTD Applications", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-good-loan-amount'], id='stat-good-loan-amount', className="quick-stats-value"),
+                        html.Div("Good Loan Amount ($)", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-qtd-applications'], id='stat-qtd-applications', className="quick-stats-value"),
+                        html.Div("QTD Applications", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-ytd-funded'], id='stat-ytd-funded', className="quick-stats-value"),
+                        html.Div("YTD Funded ($)", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-mom-applications'], id='stat-mom-applications', className="quick-stats-value"),
+                        html.Div("MoM Applications", className="quick-stats-label")
+                    ], className="quick-stats"),
+                    html.Div([
+                        html.Div(kpi_text['stat-yoy-applications'], id='stat-yoy-applications', className="quick-stats-value"),
+                        html.Div("YoY Applications", className="quick-stats-label")
+                    ], className="quick-stats")
+                ], className="stats-grid")
+            ], className="chart-section"),
         
-        # Charts Section
-        html.Div([
-            html.H3("📈 Monthly Trends Analysis", className="section-title"),
-            dcc.Graph(id='monthly-trend-chart', figure=create_monthly_trend_chart())
-        ], className="chart-section"),
+            # Charts Section
+            html.Div([
+                html.H3("📈 Trends Analysis", className="section-title"),
+                dcc.RadioItems(
+                    id='trend-granularity',
+                    options=[{'label': f" {label}", 'value': freq} for freq, label in GRANULARITIES.items()],
+                    value='M',
+                    inline=True,
+                    inputStyle={'marginLeft': '15px'}
+                ),
+                dcc.Graph(id='monthly-trend-chart', figure=get_trend(snapshot, 'M', UNFILTERED))
+            ], className="chart-section"),
         
-        html.Div([
-            html.H3("🔍 Loan Status Analysis", className="section-title"),
-            dcc.Graph(id='loan-status-chart', figure=create_loan_status_chart())
-        ], className="chart-section"),
+            html.Div([
+                html.H3("🔍 Loan Status Analysis", className="section-title"),
+                dcc.Graph(id='loan-status-chart', figure=figures['loan-status-chart'])
+            ], className="chart-section"),
         
-        html.Div([
-            html.H3("🌍 Geographic Analysis", className="section-title"),
-            dcc.Graph(id='geographic-chart', figure=create_geographic_chart())
-        ], className="chart-section"),
+            html.Div([
+                html.H3("🌍 Geographic Analysis", className="section-title"),
+                dcc.Graph(id='geographic-chart', figure=figures['geographic-chart'])
+            ], className="chart-section"),
         
-        html.Div([
-            html.H3("✅ Good vs Bad Loan Analysis", className="section-title"),
-            dcc.Graph(id='good-vs-bad-chart', figure=create_good_vs_bad_loan_chart())
-        ], className="chart-section"),
+            html.Div([
+                html.H3("✅ Good vs Bad Loan Analysis", className="section-title"),
+                dcc.Graph(id='good-vs-bad-chart', figure=figures['good-vs-bad-chart'])
+            ], className="chart-section"),
         
-        html.Div([
-            html.H3("📊 Categorical Analysis", className="section-title"),
-            dcc.Graph(id='categorical-chart', figure=create_categorical_charts())
-        ], className="chart-section"),
+            html.Div([
+                html.H3("📊 Categorical Analysis", className="section-title"),
+                dcc.Graph(id='categorical-chart', figure=figures['categorical-chart'])
+            ], className="chart-section"),
         
-        # Footer
-        html.Div([
-            html.Hr(style={'borderColor': 'rgba(255,255,255,0.2)'}),
-            html.P("🏦 Dashboard created based on SQL KPI queries from Bank Loan Project", 
-                   style={'margin': '0', 'fontSize': '1.1rem'}),
-            html.P("📊 Interactive Analytics Dashboard with Beautiful UI", 
-                   style={'margin': '10px 0 0 0', 'opacity': '0.8'})
-        ], className="footer")
+            # Footer
+            html.Div([
+                html.Hr(style={'borderColor': 'rgba(255,255,255,0.2)'}),
+                html.P("🏦 Dashboard created based on SQL KPI queries from Bank Loan Project", 
+                       style={'margin': '0', 'fontSize': '1.1rem'}),
+                html.P("📊 Interactive Analytics Dashboard with Beautiful UI", 
+                       style={'margin': '10px 0 0 0', 'opacity': '0.8'})
+            ], className="footer")
         
-    ], className="dashboard-container")
+        ], className="dashboard-container")
     
-], className="animate-fade-in")
+    ], className="animate-fade-in")
+
+
+
+def loading_layout():
+    """Lightweight page shown while the data is still loading"""
+    return html.Div([
+        page_header(),
+        html.Div([
+            html.Div([
+                dbc.Spinner(color="primary"),
+                html.H3("Loading loan data...", className="section-title"),
+                html.P("The dashboard will appear as soon as the data is ready.")
+            ], className="chart-section", style={'textAlign': 'center'})
+        ], className="dashboard-container")
+    ], className="animate-fade-in")
+
+
+# How often a page showing the loading state checks whether the data is in
+LOADING_POLL_INTERVAL = 1000  # milliseconds
+
+
+def serve_layout():
+    """Called on every page load, so pages opened before the data is in get the loading state"""
+    ready = data_ready()
+    return html.Div([
+        dcc.Interval(id='loading-poll', interval=LOADING_POLL_INTERVAL, disabled=ready),
+        html.Div(build_layout() if ready else loading_layout(), id='page-content')
+    ])
+
+
+@callback(
+    [Output('page-content', 'children'), Output('loading-poll', 'disabled')],
+    Input('loading-poll', 'n_intervals'),
+    prevent_initial_call=True
+)
+@registry.timed('callback.show_dashboard_when_ready')
+def show_dashboard_when_ready(_):
+    if not data_ready():
+        raise PreventUpdate
+    return build_layout(), True
+
+
+# Filtered views are cached by their normalized filters, so a view that any
+# analyst has already opened comes straight back from memory
+VIEW_CACHE_SIZE = 256
+VIEW_CACHE_TTL = 15 * 60  # seconds
+view_cache = TTLCache(maxsize=VIEW_CACHE_SIZE, ttl=VIEW_CACHE_TTL)
+
+
+def normalize_filters(states, terms, purposes, statuses, start_date, end_date):
+    """Turn the raw filter values into a hashable, order-independent key"""
+    def choice(values):
+        return tuple(sorted(set(values))) if values else None
+
+    def month(date):
+        return str(pd.Period(date, freq='M')) if date else None
+
+    return (choice(states), choice(terms), choice(purposes), choice(statuses),
+            month(start_date), month(end_date))
+
+
+# The page as first opened, with no filters applied
+UNFILTERED = normalize_filters(None, None, None, None, None, None)
+
+
+@registry.timed('view.build')
+def build_view(backend, states, terms, purposes, statuses, start_month, end_month, progress=None):
+    """Compute every KPI tile and figure for one normalized filter key.
+
+    `progress`, if given, is called with (done, total, label) before each step.
+    """
+    progress = progress or (lambda done, total, label: None)
+    filters = {dim: values for dim, values in [
+        ('address_state', states), ('term', terms),
+        ('purpose', purposes), ('loan_status', statuses)] if values}
+    # Every KPI and breakdown of the view comes from one report bundle (for
+    # the SQL backend, one scan per breakdown rather than one per query)
+    progress(0, 5, "Aggregating the loans")
+    with registry.stage('view.report'):
+        data = backend.select(filters, start_month, end_month).report()
+    kpis = data.kpis()
+    text = format_kpis(kpis)
+    figures = []
+    for step, (label, build) in enumerate([
+            ("Loan status chart", lambda: create_loan_status_chart(data)),
+            ("Geographic chart", lambda: create_geographic_chart(data)),
+            ("Good vs bad loan chart", lambda: create_good_vs_bad_loan_chart(kpis)),
+            ("Categorical charts", lambda: create_categorical_charts(data))], start=1):
+        progress(step, 5, label)
+        figures.append(build())
+    return [text[elem_id] for elem_id, _, _ in KPI_DISPLAY] + figures
+
+
+def get_view(snapshot, key):
+    """The KPI texts and figures for one normalized filter key, built on first use"""
+    return view_cache.get_or_compute((snapshot['data_version'],) + key,
+                                     lambda: build_view(snapshot['backend'], *key))
+
+
+# Views not cached yet are built by background jobs (see background_jobs.py)
+# rather than in the callbacks, so a slow view never holds up a request
+# thread: the page shows the job's progress and picks up its result when
+# it is done. Changing the filters again cancels the job if no other page
+# is waiting for it, and pages asking for the same view share one job.
+VIEW_POLL_INTERVAL = 500  # milliseconds
+_jobs = None
+
+
+def job_manager():
+    """The job manager of this process (see create_app), created on first use"""
+    global _jobs
+    if _jobs is None:
+        _jobs = JobManager()
+    return _jobs
+
+
+def _view_job(data_version, key, progress):
+    """Build one view in a job thread, unless the data has been reloaded since it was asked for"""
+    snapshot = get_data()
+    if snapshot['data_version'] != data_version:
+        raise RuntimeError("the data was reloaded while the view was queued")
+    return build_view(snapshot['backend'], *key, progress=progress)
+
+
+def view_progress(status):
+    """The progress bar of a running view job, or a warning if it failed"""
+    if status['state'] == 'failed':
+        return dbc.Alert(f"⚠️ Could not build this view: {status['error']}", color="warning", className="mb-0")
+    percent = round(100 * status['done'] / max(status['total'], 1))
+    return html.Div([
+        html.Label(f"⏳ Updating the charts: {status['label']}...", className="quick-stats-label"),
+        dbc.Progress(value=max(percent, 5), striped=True, animated=True)
+    ])
+
+
+# KPI texts and figures, then the job being polled, whether polling is off and the progress
+VIEW_OUTPUTS = ([(elem_id, 'children') for elem_id, _, _ in KPI_DISPLAY]
+                + [(graph_id, 'figure') for graph_id in GRAPH_IDS]
+                + [('view-job', 'data'), ('view-poll', 'disabled'), ('view-progress', 'children')])
+FILTER_INPUTS = [('filter-state', 'value'), ('filter-term', 'value'), ('filter-purpose', 'value'),
+                 ('filter-status', 'value'), ('filter-dates', 'start_date'), ('filter-dates', 'end_date')]
+
+
+def request_view(snapshot, key, previous, session):
+    """Callback outputs for a filter key: the cached view, or a job building it.
+
+    `previous` is the job this page was waiting for, released if it is not
+    the one for `key`.
+    """
+    full_key = (snapshot['data_version'],) + key
+    if previous and previous != job_id(full_key):
+        job_manager().release(previous, session)
+    view = view_cache.get(full_key)
+    if view is not None:
+        return list(view) + [None, True, None]
+    job = job_manager().submit(full_key, _view_job, snapshot['data_version'], key, waiter=session)
+    registry.inc('dashboard_view_job_requests_total')
+    return [no_update] * (len(VIEW_OUTPUTS) - 3) + [job, False, view_progress(job_manager().status(job))]
+
+
+@callback(
+    [Output(elem_id, prop) for elem_id, prop in VIEW_OUTPUTS],
+    [Input(elem_id, prop) for elem_id, prop in FILTER_INPUTS],
+    [State('view-job', 'data'), State('session-id', 'data')],
+    prevent_initial_call=True
+)
+@registry.timed('callback.update_dashboard')
+def update_dashboard(states, terms, purposes, statuses, start_date, end_date, previous, session):
+    key = normalize_filters(states, terms, purposes, statuses, start_date, end_date)
+    return request_view(get_data(), key, previous, session)
+
+
+@callback(
+    [Output(elem_id, prop, allow_duplicate=True) for elem_id, prop in VIEW_OUTPUTS],
+    Input('view-poll', 'n_intervals'),
+    [State(elem_id, prop) for elem_id, prop in FILTER_INPUTS]
+    + [State('view-job', 'data'), State('session-id', 'data')],
+    prevent_initial_call=True
+)
+@registry.timed('callback.poll_view_job')
+def poll_view_job(_, states, terms, purposes, statuses, start_date, end_date, job, session):
+    if not job:
+        raise PreventUpdate
+    snapshot = get_data()
+    key = normalize_filters(states, terms, purposes, statuses, start_date, end_date)
+    full_key = (snapshot['data_version'],) + key
+    status = job_manager().status(job)
+    if job != job_id(full_key) or status['state'] in (None, 'cancelled', 'stale'):
+        # The data was reloaded, or the job was lost (its worker died, say): start over
+        return request_view(snapshot, key, job, session)
+    outputs = [no_update] * (len(VIEW_OUTPUTS) - 3)
+    if status['state'] == 'running':
+        return outputs + [no_update, no_update, view_progress(status)]
+    if status['state'] == 'failed':
+        return outputs + [None, True, view_progress(status)]
+    view = job_manager().result(job)
+    view_cache.put(full_key, view)
+    return list(view) + [None, True, None]
+
+
+# Daily running totals and time rollups of filtered selections, keyed like
+# the views. The first look at a selection scans its loans once; every
+# reference date or granularity picked after that is a lookup.
+pyramid_cache = TTLCache(maxsize=VIEW_CACHE_SIZE, ttl=VIEW_CACHE_TTL)
+
+
+def get_pyramid(snapshot, states, terms, purposes, statuses):
+    """The TimePyramid of the loans matching the dropdown filters"""
+    filters = {dim: values for dim, values in [
+        ('address_state', states), ('term', terms),
+        ('purpose', purposes), ('loan_status', statuses)] if values}
+    if not filters:
+        return snapshot['pyramid']
+    key = (snapshot['data_version'],) + normalize_filters(states, terms, purposes, statuses, None, None)
+    return pyramid_cache.get_or_compute(key, lambda: build_pyramid(snapshot['df'], filters, get_bitmaps(snapshot)))
+
+
+def get_trend(snapshot, granularity, key):
+    """The trend figure at one granularity for one normalized filter key, built on first use"""
+    def build():
+        states, terms, purposes, statuses, start_month, end_month = key
+        pyramid = get_pyramid(snapshot, states, terms, purposes, statuses)
+        start = pd.Period(start_month, freq='M').start_time if start_month else None
+        end = pd.Period(end_month, freq='M').end_time if end_month else None
+        return create_trend_chart(pyramid.level(granularity, start, end), granularity)
+
+    return view_cache.get_or_compute((snapshot['data_version'], 'trend', granularity) + key, build)
+
+
+@callback(
+    Output('monthly-trend-chart', 'figure'),
+    [Input('trend-granularity', 'value'),
+     Input('filter-state', 'value'),
+     Input('filter-term', 'value'),
+     Input('filter-purpose', 'value'),
+     Input('filter-status', 'value'),
+     Input('filter-dates', 'start_date'),
+     Input('filter-dates', 'end_date')],
+    prevent_initial_call=True
+)
+@registry.timed('callback.update_trend_chart')
+def update_trend_chart(granularity, states, terms, purposes, statuses, start_date, end_date):
+    key = normalize_filters(states, terms, purposes, statuses, start_date, end_date)
+    return get_trend(get_data(), granularity, key)
+
+
+@callback(
+    [Output(elem_id, 'children') for elem_id, _, _ in PERIOD_DISPLAY],
+    [Input('reference-date', 'date'),
+     Input('filter-state', 'value'),
+     Input('filter-term', 'value'),
+     Input('filter-purpose', 'value'),
+     Input('filter-status', 'value')],
+    prevent_initial_call=True
+)
+@registry.timed('callback.update_period_kpis')
+def update_period_kpis(reference_date, states, terms, purposes, statuses):
+    daily = get_pyramid(get_data(), states, terms, purposes, statuses).daily_totals
+    text = format_kpis(daily.period_kpis(reference_date), PERIOD_DISPLAY)
+    return [text[elem_id] for elem_id, _, _ in PERIOD_DISPLAY]
+
+
+def report_response_times(server):
+    """Add a Server-Timing header to every response, time it by route and log the first one's delay after start"""
+    first_response = []
+
+    @server.before_request
+    def start_timer():
+        flask.g.request_started = time.perf_counter()
+
+    @server.after_request
+    def add_timing(response):
+        now = time.perf_counter()
+        started = getattr(flask.g, 'request_started', now)
+        response.headers['Server-Timing'] = f"app;dur={(now - started) * 1000:.1f}"
+        # By route pattern rather than path, so the asset URLs share one series
+        rule = flask.request.url_rule
+        registry.observe('dashboard_http_request_seconds', now - started,
+                         route=rule.rule if rule is not None else 'unmatched')
+        if not first_response:
+            first_response.append(now)
+            print(f"⏱️  First response served {now - STARTED_AT:.2f}s after import "
+                  f"({(now - started) * 1000:.0f} ms in the app)")
+        return response
+
+
+# How often each worker of serve.py shares its metrics with the others
+METRICS_SNAPSHOT_INTERVAL = 5  # seconds
+
+
+def serve_metrics(server, metrics_dir=None):
+    """Expose the stage timings, call counts and data gauges at /metrics in the Prometheus text format.
+
+    With `metrics_dir`, this process also writes its metrics there, and
+    /metrics adds up those of every process writing to it.
+    """
+    if metrics_dir:
+        start_snapshot_writer(metrics_dir, METRICS_SNAPSHOT_INTERVAL)
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(registry.render(metrics_dir), content_type=CONTENT_TYPE)
+
+
+_loader = None
+
+
+def create_app(csv_path=CLEANED_FILE_PATH, background=True, shared=False,
+               reload_interval=RELOAD_CHECK_INTERVAL, backend=QUERY_BACKEND, metrics_dir=None,
+               jobs_dir=None):
+    """Create the dashboard app.
+
+    The data is loaded in a background thread, so the server can start
+    answering right away; pages opened before it is ready show a loading
+    state and switch to the dashboard once it is in. The same thread then
+    checks the data source every `reload_interval` seconds and swaps in a
+    fresh snapshot when it changes. `shared` is used by the multi-worker
+    server in serve.py (see read_data). `backend` picks the query backend
+    (one of query_backend.BACKENDS); both give the same results.
+    Metrics are served at /metrics (see serve_metrics). Filtered views
+    are built by background jobs tracked in `jobs_dir` (a fresh temporary
+    directory if None), which processes serving the same pages share.
+    """
+    global _loader, _jobs, backend_name
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown query backend '{backend}', expected one of {BACKENDS}")
+    backend_name = backend
+    _jobs = JobManager(jobs_dir)
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
+                    suppress_callback_exceptions=True)
+    app.index_string = INDEX_STRING
+    app.layout = serve_layout
+    report_response_times(app.server)
+    serve_metrics(app.server, metrics_dir)
+
+    if _loader is None and not data_ready():
+        _loader = threading.Thread(target=run_data_loader,
+                                   args=(csv_path, shared, reload_interval),
+                                   name='load-data', daemon=True)
+        _loader.start()
+        if not background:
+            _data_ready.wait()
+    return app
+
 
 if __name__ == '__main__':
+    app = create_app()
     print("Starting Beautiful Bank Loan Dashboard...")
     print("Open your browser and go to: http://127.0.0.1:8050/")
     app.run(debug=True, host='127.0.0.1', port=8050)
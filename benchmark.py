@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Bank Loan Analytics - Benchmark Suite
+Times every stage of the pipeline (loading, KPIs, aggregation, figure
+building, HTML output and layout construction) at several data sizes
+and writes the results as JSON, optionally comparing them against a
+saved baseline run.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from clean_data import peak_rss_mb
+from generate_loan_data import generate_loans
+from kpi_engine import clear_kpi_cache, compute_cube_kpis, compute_kpis
+from loan_cube import build_cube
+from parallel_agg import build_cube_parallel
+from loan_data import load_cleaned_data, optimize_dtypes, write_column_cache
+from period_kpis import build_daily_totals
+from time_rollups import TimePyramid
+from agg_engine import CodedFrame
+from bitmap_index import BitmapIndex, scan_mask
+from query_backend import SQLiteBackend
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_TIMEOUT = 300  # seconds
+
+# Multi-predicate slice timed by the filter stages
+BENCH_FILTERS = {'loan_status': ['Fully Paid', 'Current'], 'term': ['60 months'],
+                 'address_state': ['CA', 'NY', 'TX', 'FL']}
+BENCH_MONTHS = ('2021-03', '2021-09')
+# Serves the dashboard from the current directory's cleaned_financial_loan.csv
+SERVER_SCRIPT = """
+import sys
+sys.path.insert(0, {repo!r})
+import bank_loan_dashboard
+bank_loan_dashboard.create_app().run(host='127.0.0.1', port={port}, debug=False)
+"""
+# Slowdowns smaller than this are treated as timing noise when comparing
+NOISE_FLOOR_SECONDS = 0.005
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress prints of the code being measured"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def parse_scale(text):
+    """Parse '10k', '1M' or '250000' into a row count"""
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * factor)
+
+
+def make_dataset(rows, seed=42):
+    """Synthetic cleaned loans with the compact dtypes the loaders produce"""
+    chunks = [optimize_dtypes(chunk, report=False)[0] for chunk in generate_loans(rows, seed)]
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def measure(func, setup=None, repeat=3):
+    """Best wall time over `repeat` runs, plus peak traced memory of one more run"""
+    best = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with quiet():
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+
+    # Memory is measured separately because tracing slows the code down
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        with quiet():
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, done, deadline):
+    """Poll `url` until `done(body)` is true; returns the time it happened"""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if done(response.read()):
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not ready after {STARTUP_TIMEOUT}s")
+
+
+def measure_startup(workdir):
+    """Seconds from launching the dashboard until its first byte, and until the full page is served"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT.format(repo=REPO_DIR, port=port)],
+                              cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + STARTUP_TIMEOUT
+        first_byte = wait_for(base + '/', lambda body: True, deadline)
+        # The layout only contains the KPI cards once the data is loaded
+        # and the default figures have been built
+        ready = wait_for(base + '/_dash-layout', lambda body: b'kpi-total-applications' in body, deadline)
+    finally:
+        server.terminate()
+        server.wait()
+    return first_byte - start, ready - start
+
+
+def build_stages(rows, workdir):
+    """(name, function, setup) for every stage, run against `rows` synthetic loans"""
+    df = make_dataset(rows)
+    csv_path = os.path.join(workdir, 'cleaned_financial_loan.csv')
+    df.to_csv(csv_path, index=False)
+    write_column_cache(df, csv_path)
+
+    # The dashboard serves whatever snapshot it was given and the chart
+    # script keeps its data in a module global; point both at this dataset
+    with quiet():
+        import bank_loan_dashboard as dashboard
+        import simple_charts as charts
+        dashboard.set_data(df, ('benchmark', rows))
+    cube = dashboard.get_data()['cube']
+    daily = dashboard.get_data()['pyramid'].daily_totals
+    bitmaps = dashboard.get_bitmaps(dashboard.get_data())
+    charts.df = df
+
+    def reset_caches():
+        clear_kpi_cache()
+        dashboard.view_cache.clear()
+
+    with quiet():
+        sql = SQLiteBackend(df)
+
+    stages = [
+        ('load.csv', lambda: load_cleaned_data(csv_path, use_cache=False, show_memory=False), None),
+        ('load.column_cache', lambda: load_cleaned_data(csv_path, show_memory=False), None),
+        ('aggregate.build_cube', lambda: build_cube(df), None),
+        # The same cube as a map-reduce over one process per CPU core
+        ('aggregate.build_cube_parallel', lambda: build_cube_parallel(df, 0), None),
+        ('kpis.rows', lambda: compute_kpis(df), None),
+        ('kpis.cube', lambda: compute_cube_kpis(cube), None),
+        ('kpis.calculate_kpis', dashboard.calculate_kpis, reset_caches),
+        # Running daily totals, then every period KPI of one reference date from them
+        ('kpis.daily_totals', lambda: build_daily_totals(df), None),
+        ('kpis.period_lookup', lambda: daily.period_kpis(), None),
+        ('aggregate.time_rollups', lambda: TimePyramid(daily), None),
+        # The chart script's coded frame: every row once, then each breakdown from its cells
+        ('aggregate.coded_frame', lambda: CodedFrame(df, charts.CHART_DIMENSIONS, charts.CHART_MEASURES), None),
+        # A slice on three dimensions and a month range, from the bitsets and by comparing the columns
+        ('filter.bitmap_index', lambda: BitmapIndex(df), None),
+        ('filter.bitmap_select', lambda: bitmaps.count(bitmaps.select(BENCH_FILTERS, *BENCH_MONTHS)), None),
+        ('filter.column_scan', lambda: scan_mask(df, BENCH_FILTERS, *BENCH_MONTHS).sum(), None),
+        # The report's named queries one by one, and as shared scans
+        ('sql.queries', lambda: [sql.run(name) for name in sql.queries], None),
+        ('sql.kpis', lambda: sql.select().kpis(), None),
+        ('sql.batch', lambda: sql.run_batch(sql.queries), None),
+    ]
+    for builder in [dashboard.create_trend_chart, dashboard.create_loan_status_chart,
+                    dashboard.create_geographic_chart, dashboard.create_good_vs_bad_loan_chart,
+                    dashboard.create_categorical_charts]:
+        stages.append((f"dashboard.{builder.__name__}", builder, reset_caches))
+    for builder in charts.CHART_BUILDERS:
+        stages.append((f"charts.{builder.__name__}", builder, None))
+    stages.append(('dashboard.build_layout', dashboard.build_layout, reset_caches))
+    return stages
+
+
+def selected(stage, only):
+    return not only or any(part in stage for part in only)
+
+
+def record(results, stage, rows, seconds, peak_mb=None):
+    results.append({
+        'stage': stage,
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else None,
+        'peak_mb': peak_mb
+    })
+    memory = f"{peak_mb:>9.1f} MB" if peak_mb is not None else ""
+    print(f"  {stage:<45} {seconds * 1000:>10.1f} ms  {memory}")
+
+
+def run_benchmarks(scales, repeat=3, only=None):
+    """Run every stage at every scale and return the list of result records"""
+    results = []
+    original_dir = os.getcwd()
+    for rows in scales:
+        with tempfile.TemporaryDirectory() as workdir:
+            # simple_charts writes its HTML files into the current directory
+            os.chdir(workdir)
+            try:
+                print(f"📏 {rows:,} rows")
+                for name, func, setup in build_stages(rows, workdir):
+                    if not selected(name, only):
+                        continue
+                    seconds, peak_mb = measure(func, setup, repeat)
+                    record(results, name, rows, seconds, peak_mb)
+                if selected('startup.first_byte', only) or selected('startup.dashboard_ready', only):
+                    runs = [measure_startup(workdir) for _ in range(repeat)]
+                    record(results, 'startup.first_byte', rows, min(r[0] for r in runs))
+                    record(results, 'startup.dashboard_ready', rows, min(r[1] for r in runs))
+            finally:
+                os.chdir(original_dir)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print each stage against the baseline and return the regressed ones"""
+    previous = {(r['stage'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'stage':<45} {'rows':>10} {'baseline':>10} {'current':>10} {'change':>8}")
+    for r in results:
+        old = previous.get((r['stage'], r['rows']))
+        if old is None:
+            continue
+        change = (r['seconds'] - old['seconds']) / old['seconds'] if old['seconds'] else 0.0
+        regressed = (change > tolerance
+                     and r['seconds'] - old['seconds'] > NOISE_FLOOR_SECONDS)
+        flag = "  ❌" if regressed else ""
+        print(f"{r['stage']:<45} {r['rows']:>10,} {old['seconds'] * 1000:>8.1f}ms "
+              f"{r['seconds'] * 1000:>8.1f}ms {change:>+7.0%}{flag}")
+        if regressed:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the loan analytics pipeline.")
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated row counts, e.g. 10k,1M,10M")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument('--only', action='append',
+                        help="only run stages whose name contains this text (repeatable)")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file to write")
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help="slowdown fraction that counts as a regression")
+    args = parser.parse_args(argv)
+
+    scales = [parse_scale(s) for s in args.scales.split(',') if s.strip()]
+    print("⏱️  Bank Loan Analytics Benchmarks")
+    print("=" * 50)
+    results = run_benchmarks(scales, args.repeat, args.only)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'process_peak_rss_mb': peak_rss_mb()
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results saved as '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) slower than the baseline by more than "
+                  f"{args.tolerance:.0%}")
+            return 1
+        print("\n🎉 No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# bitmap_index.py
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from agg_engine import factorize
+
+# Dimensions with a bitset per value. issue_month is not a column of the
+# loans; it is the month of their issue_date, like in the loan cube.
+INDEX_DIMENSIONS = ['loan_status', 'address_state', 'term', 'purpose', 'emp_length', 'home_ownership',
+                    'issue_month']
+
+# Set bits of every byte value, to count a bitset's rows without
+# np.bitwise_count (which needs numpy 2)
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def pack(mask):
+    """A boolean array as a bitset: bit i of the uint64 words is element i"""
+    words = np.zeros((len(mask) + 63) // 64, dtype='<u8')
+    packed = np.packbits(mask, bitorder='little')
+    words.view(np.uint8)[:len(packed)] = packed
+    return words
+
+
+def month_codes(df):
+    """Codes (-1 = no issue date) and monthly Periods of every loan's issue month"""
+    # datetime64[M] counts months since 1970-01, which is what a monthly Period's ordinal is
+    months = df['issue_date'].to_numpy().astype('datetime64[M]')
+    ordinals = months.view('int64')
+    ordinals = np.where(np.isnat(months), -1 << 62, ordinals)
+    codes, uniques = pd.factorize(ordinals, sort=True)
+    codes, uniques = codes.astype('int64'), np.asarray(uniques)
+    if len(uniques) and uniques[0] == -1 << 62:
+        codes -= 1
+        uniques = uniques[1:]
+    # Back to Periods through dates, as PeriodIndex.from_ordinals needs pandas 2.2
+    return codes, pd.DatetimeIndex(uniques.astype('datetime64[M]').astype('datetime64[ns]')).to_period('M')
+
+
+class BitmapIndex:
+    """One packed bitset per value of each indexed dimension of the loans.
+
+    A filter is the OR of the bitsets of the values it allows, per
+    dimension, and the AND of those across dimensions: a few passes over
+    n/64 words that never compare a string. The selected rows are then
+    read off the result (rows, mask), and only they are added up (totals).
+    """
+
+    def __init__(self, df, dims=INDEX_DIMENSIONS):
+        self.n_rows = len(df)
+        # dim -> {str(value): bitset}; values are matched as strings, like
+        # the dropdown filters send them ('2021-03' for a month)
+        self.bitsets = {}
+        self.months = pd.PeriodIndex([], freq='M')
+        for dim in dims:
+            if dim == 'issue_month':
+                codes, labels = month_codes(df)
+                self.months = labels
+            else:
+                codes, labels = factorize(df[dim])
+            # Rows sorted by value, so each bitset is set from its own slice
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            self.bitsets[dim] = {}
+            for i, label in enumerate(labels):
+                mask = np.zeros(self.n_rows, dtype=bool)
+                mask[order[bounds[i]:bounds[i + 1]]] = True
+                self.bitsets[dim][str(label)] = pack(mask)
+
+    def all(self):
+        return pack(np.ones(self.n_rows, dtype=bool))
+
+    def any_of(self, dim, values):
+        """Rows whose `dim` is any of `values` (unknown values match nothing)"""
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        result = np.zeros((self.n_rows + 63) // 64, dtype='<u8')
+        for value in values:
+            bitset = self.bitsets[dim].get(str(value))
+            if bitset is not None:
+                result |= bitset
+        return result
+
+    def month_range(self, start_month=None, end_month=None):
+        """Rows issued from `start_month` to `end_month`, both inclusive"""
+        keep = np.ones(len(self.months), dtype=bool)
+        if start_month is not None:
+            keep &= self.months >= pd.Period(start_month, freq='M')
+        if end_month is not None:
+            keep &= self.months <= pd.Period(end_month, freq='M')
+        return self.any_of('issue_month', list(self.months[keep]))
+
+    def select(self, filters=None, start_month=None, end_month=None):
+        """Rows matching every filter (dimension -> allowed values) and the month range"""
+        result = None
+        for dim, values in (filters or {}).items():
+            bitset = self.any_of(dim, values)
+            result = bitset if result is None else np.bitwise_and(result, bitset, out=result)
+        if start_month is not None or end_month is not None:
+            bitset = self.month_range(start_month, end_month)
+            result = bitset if result is None else np.bitwise_and(result, bitset, out=result)
+        return self.all() if result is None else result
+
+    def count(self, bitset):
+        return int(POPCOUNT[bitset.view(np.uint8)].sum(dtype='int64'))
+
+    def mask(self, bitset):
+        """The bitset as one boolean per row"""
+        return np.unpackbits(bitset.view(np.uint8), count=self.n_rows, bitorder='little').view(bool)
+
+    def rows(self, bitset):
+        """Positions of the selected rows"""
+        return np.flatnonzero(self.mask(bitset))
+
+    def totals(self, df, bitset, measures):
+        """Number of selected loans and the sums of `measures` (missing skipped) over only them"""
+        rows = self.rows(bitset)
+        result = {'count': len(rows)}
+        for m in measures:
+            values = df[m].to_numpy(dtype='float64', na_value=np.nan)[rows]
+            result[m] = float(np.nansum(values))
+        return result
+
+
+def scan_mask(df, filters=None, start_month=None, end_month=None):
+    """The rows a selection should match, compared column by column, to check the index against"""
+    mask = np.ones(len(df), dtype=bool)
+    for dim, values in (filters or {}).items():
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        mask &= df[dim].astype(str).isin([str(v) for v in values]).to_numpy()
+    months = df['issue_date'].dt.to_period('M')
+    if start_month is not None:
+        mask &= (months >= pd.Period(start_month, freq='M')).to_numpy()
+    if end_month is not None:
+        mask &= (months <= pd.Period(end_month, freq='M')).to_numpy()
+    return mask
+
+
+def random_selections(index, n, seed=0):
+    """`n` random selections of one to four dimensions, some with a month range"""
+    rng = np.random.default_rng(seed)
+    dims = [dim for dim in index.bitsets if dim != 'issue_month']
+    months = [str(month) for month in index.months]
+    for _ in range(n):
+        filters = {}
+        for dim in rng.choice(dims, size=rng.integers(1, min(4, len(dims)) + 1), replace=False):
+            labels = list(index.bitsets[dim])
+            filters[str(dim)] = list(rng.choice(labels, size=rng.integers(1, len(labels) + 1), replace=False))
+        start = end = None
+        if months and rng.random() < 0.5:
+            start, end = sorted(rng.choice(months, size=2))
+        yield filters, start, end
+
+
+def check_index(df, index, n=100):
+    """Compare `n` random selections with column-by-column scans; returns the mismatches"""
+    mismatches = []
+    for filters, start, end in random_selections(index, n):
+        expected = scan_mask(df, filters, start, end)
+        if not np.array_equal(index.mask(index.select(filters, start, end)), expected):
+            mismatches.append(f"{filters} {start}..{end}")
+    return mismatches
+
+
+def main(argv=None):
+    from loan_data import CLEANED_FILE_PATH, load_cleaned_data
+
+    parser = argparse.ArgumentParser(description="Build the bitmap index of the loans and time filtered selections.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH, help="cleaned loan CSV")
+    parser.add_argument('--check', action='store_true',
+                        help="verify random selections against column-by-column scans")
+    args = parser.parse_args(argv)
+
+    df, _ = load_cleaned_data(args.data, show_memory=False)
+    start = time.perf_counter()
+    index = BitmapIndex(df)
+    n_bitsets = sum(len(bitsets) for bitsets in index.bitsets.values())
+    size_mb = n_bitsets * ((index.n_rows + 63) // 64) * 8 / 1e6
+    print(f"🧮 Bitmap index of {n_bitsets} bitsets ({size_mb:.1f} MB) built in {time.perf_counter() - start:.3f}s")
+    if args.check:
+        mismatches = check_index(df, index)
+        print(f"{'❌' if mismatches else '✅'} {len(mismatches)} mismatches over 100 random selections")
+        for line in mismatches[:20]:
+            print(f"     {line}")
+        return 1 if mismatches else 0
+
+    selections = list(random_selections(index, 100))
+    start = time.perf_counter()
+    for filters, first, last in selections:
+        index.select(filters, first, last)
+    index_ms = (time.perf_counter() - start) * 1000 / len(selections)
+    start = time.perf_counter()
+    for filters, first, last in selections:
+        scan_mask(df, filters, first, last)
+    scan_ms = (time.perf_counter() - start) * 1000 / len(selections)
+    print(f"Average selection: {index_ms:.2f} ms from the bitsets, {scan_ms:.2f} ms scanning the columns")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,46 +1,300 @@
 # clean_data.py
 
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
+from loan_cube import build_cube, combine_cubes, merge_cube, read_cube_cache, write_cube_cache
+from loan_data import (ColumnCacheWriter, DATE_COLUMNS, build_id_index, cache_dir_for,
+                       extend_id_index, find_rows, is_cache_fresh, optimize_dtypes,
+                       read_cache_meta, read_column_cache, read_id_index, read_partitions_meta,
+                       source_signature, write_id_index, write_partitions_meta)
 
 try:
-    # --- Step 1: Load your original CSV file ---
-    # This line reads your 'financial_loan.csv' file into a format
-    # that Python can work with.
-    print("Reading the original file: 'financial_loan.csv'...")
-    df = pd.read_csv('financial_loan.csv')
-    print("File loaded successfully!")
-
-    # --- Step 2: Define the columns that need fixing ---
-    # These are the columns that looked like text but should be dates.
-    date_columns = [
-        'issue_date',
-        'last_credit_pull_date',
-        'last_payment_date',
-        'next_payment_date'
-    ]
-
-    # --- Step 3: Convert the columns to a proper date format ---
-    # This loop goes through each column name in date_columns and converts it.
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAW_FILE_PATH = 'financial_loan.csv'
+CLEANED_FILE_PATH = 'cleaned_financial_loan.csv'
+
+# Rows read, cleaned and written at a time. Peak memory grows with this
+# number, not with the size of the input file.
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Per-chunk cubes are folded into one after this many chunks, so their
+# memory stays bounded by the size of the cube
+CUBES_PER_FOLD = 8
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def clean_chunk(df):
+    """Convert the text date columns of one chunk to proper dates"""
     # The 'errors='coerce'' part is important; it will mark any date
     # that can't be understood as invalid, preventing the script from crashing.
-    print("Fixing date columns...")
-    for col in date_columns:
+    for col in DATE_COLUMNS:
         df[col] = pd.to_datetime(df[col], format='%d-%m-%Y', errors='coerce')
-    print("Date formatting complete.")
-
-    # --- Step 4: Save the cleaned data to a new file ---
-    # This saves all the changes into a new CSV file, so your original
-    # file remains untouched.
-    cleaned_file_path = 'cleaned_financial_loan.csv'
-    df.to_csv(cleaned_file_path, index=False)
-    
-    
-    print("-" * 50)
-    print(f"Success! A new file named '{cleaned_file_path}' has been created.")
-    print("This new file contains the corrected date formats.")
-
-except FileNotFoundError:
-    print("Error: Could not find 'financial_loan.csv'.")
-    print("Please make sure the script is in the same folder as your data file.")
-except Exception as e:
-    print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    return df
+
+
+def clean_file(raw_path=RAW_FILE_PATH, cleaned_path=CLEANED_FILE_PATH,
+               chunksize=DEFAULT_CHUNK_SIZE, write_cache=True):
+    """Stream the raw CSV through clean_chunk() into the cleaned CSV and cache.
+
+    Only one chunk is held in memory at a time. Returns a small report
+    with the row count, throughput and peak memory of the run.
+    """
+    start = time.perf_counter()
+    rows = 0
+
+    # Write to a temporary file first so a failed run never leaves a
+    # half-written cleaned CSV behind
+    tmp_path = cleaned_path + '.tmp'
+    reader = pd.read_csv(raw_path, chunksize=chunksize)
+    cache_dir = cache_dir_for(cleaned_path)
+    cache_writer = ColumnCacheWriter(cache_dir) if write_cache else None
+    cubes = []
+
+    for i, chunk in enumerate(reader):
+        chunk = clean_chunk(chunk)
+        chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        if cache_writer is not None:
+            # The cache stores the compact dtypes so consumers load them directly
+            compact = optimize_dtypes(chunk, report=False)[0]
+            cache_writer.append(compact)
+            cubes.append(build_cube(compact))
+            if len(cubes) >= CUBES_PER_FOLD:
+                cubes = [combine_cubes(cubes)]
+        rows += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        print(f"  chunk {i + 1}: {rows:,} rows cleaned ({rows / elapsed:,.0f} rows/sec)")
+
+    if rows == 0:
+        # Empty input: still produce a cleaned file with the header row
+        pd.read_csv(raw_path, nrows=0).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, cleaned_path)
+    if cache_writer is not None:
+        meta = cache_writer.close(source_path=cleaned_path)
+        # Ready for incremental updates with apply_delta()
+        ids = read_column_cache(cache_dir, meta, mmap=True)['id'].to_numpy() if rows else []
+        write_id_index(build_id_index(ids), cache_dir)
+        if cubes:
+            write_cube_cache(combine_cubes(cubes), cache_dir)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def issue_date_range(cleaned_path):
+    """First and last issue date in a cleaned file, from its column cache when there is one"""
+    meta = read_cache_meta(cache_dir_for(cleaned_path))
+    if is_cache_fresh(cleaned_path, meta):
+        dates = read_column_cache(cache_dir_for(cleaned_path), meta, mmap=True)['issue_date']
+    else:
+        dates = pd.to_datetime(pd.read_csv(cleaned_path, usecols=['issue_date'])['issue_date'], errors='coerce')
+    return dates.min(), dates.max()
+
+
+def clean_partition(raw_path, cleaned_path, chunksize=DEFAULT_CHUNK_SIZE, write_cache=True):
+    """clean_file() one partition and describe it for partitions.json"""
+    report = clean_file(raw_path, cleaned_path, chunksize, write_cache)
+    first, last = issue_date_range(cleaned_path)
+    dated = not pd.isna(first)
+    one_month = dated and first.to_period('M') == last.to_period('M')
+    return {
+        'file': os.path.basename(cleaned_path),
+        'source': source_signature(raw_path),
+        'month': str(first.to_period('M')) if one_month else None,
+        'rows': report['rows'],
+        'min_issue_date': first.strftime('%Y-%m-%d') if dated else None,
+        'max_issue_date': last.strftime('%Y-%m-%d') if dated else None
+    }
+
+
+def clean_partitions(raw_dir, cleaned_dir, chunksize=DEFAULT_CHUNK_SIZE, write_cache=True, workers=0):
+    """Clean a directory of raw partitions (e.g. one CSV per month) into `cleaned_dir`.
+
+    The partitions are cleaned by `workers` processes at once (0 = one per
+    CPU core), each into its own cleaned CSV and column cache. Partitions
+    whose raw file is unchanged since the last run are kept as they are.
+    partitions.json then records every partition's month, row count and
+    first / last issue date, which loaders use to skip the partitions a
+    date range does not need.
+    """
+    start = time.perf_counter()
+    os.makedirs(cleaned_dir, exist_ok=True)
+    previous = {p['source']['path']: p for p in (read_partitions_meta(cleaned_dir) or {}).get('partitions', [])}
+
+    raw_paths = sorted(glob.glob(os.path.join(raw_dir, '*.csv')))
+    partitions, jobs = {}, []
+    for raw_path in raw_paths:
+        cleaned_path = os.path.join(cleaned_dir, f"cleaned_{os.path.basename(raw_path)}")
+        known = previous.get(os.path.abspath(raw_path))
+        if (known and known['source'] == source_signature(raw_path) and os.path.exists(cleaned_path)
+                and (not write_cache or is_cache_fresh(cleaned_path, read_cache_meta(cache_dir_for(cleaned_path))))):
+            partitions[raw_path] = known
+        else:
+            jobs.append((raw_path, cleaned_path))
+
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = {raw_path: pool.submit(clean_partition, raw_path, cleaned_path, chunksize, write_cache)
+                       for raw_path, cleaned_path in jobs}
+            for raw_path, future in futures.items():
+                partitions[raw_path] = future.result()
+                print(f"  {os.path.basename(raw_path)}: {partitions[raw_path]['rows']:,} rows cleaned")
+
+    # In file name order, so monthly files named by month come out in order
+    write_partitions_meta(cleaned_dir, [partitions[raw_path] for raw_path in raw_paths])
+    rows = sum(partition['rows'] for partition in partitions.values())
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'partitions': len(raw_paths),
+        'cleaned': len(jobs),
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def apply_delta(delta_path, cleaned_path=CLEANED_FILE_PATH):
+    """Clean a batch of new or changed loans and merge it into the cleaned data.
+
+    A loan whose id is already known replaces its old version; any other
+    loan is added. The batch is appended to the cleaned CSV, the column
+    cache is updated in place and the loan cube (which holds the monthly,
+    state, status, term, purpose, emp_length and home ownership totals
+    behind every KPI) drops the old versions and adds the new ones. Only
+    the batch is parsed and aggregated, so the cost follows its size
+    rather than the size of the book.
+    """
+    start = time.perf_counter()
+    cache_dir = cache_dir_for(cleaned_path)
+    meta = read_cache_meta(cache_dir)
+    if not os.path.exists(cleaned_path) or not is_cache_fresh(cleaned_path, meta):
+        raise RuntimeError(f"'{cleaned_path}' has no up-to-date column cache; run a full clean first")
+
+    # The last copy of a loan in the batch is its current state
+    batch = clean_chunk(pd.read_csv(delta_path)).drop_duplicates('id', keep='last')
+    batch = batch.reset_index(drop=True)
+    compact = optimize_dtypes(batch, report=False)[0][[c['name'] for c in meta['columns']]]
+
+    book = read_column_cache(cache_dir, meta, mmap=True)
+    index = read_id_index(cache_dir)
+    if index is None:
+        index = build_id_index(book['id'].to_numpy())
+    rows, known = find_rows(index, compact['id'].to_numpy())
+    rows = rows[known]
+
+    cube = read_cube_cache(cache_dir)
+    if cube is None:
+        cube = build_cube(book)
+    cube = merge_cube(cube, added=compact, removed=book.iloc[rows])
+
+    # The CSV keeps every version of a loan; readers use the last one
+    header = pd.read_csv(cleaned_path, nrows=0).columns
+    batch[header].to_csv(cleaned_path, mode='a', header=False, index=False)
+
+    writer = ColumnCacheWriter.resume(cache_dir)
+    writer.update(rows, compact[known])
+    first_new_row = writer.rows
+    writer.append(compact[~known])
+    writer.close(source_path=cleaned_path)
+    write_id_index(extend_id_index(index, compact['id'].to_numpy()[~known], first_new_row), cache_dir)
+    # Written last: a dashboard serving the shared caches reloads when the cube changes
+    write_cube_cache(cube, cache_dir)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': len(batch),
+        'updated': int(known.sum()),
+        'added': int((~known).sum()),
+        'seconds': elapsed,
+        'rows_per_sec': len(batch) / elapsed if elapsed else 0.0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the raw loan export for the dashboard.")
+    parser.add_argument('--input', default=RAW_FILE_PATH,
+                        help="raw CSV export, or a directory of raw partitions (e.g. one CSV per month)")
+    parser.add_argument('--output', default=CLEANED_FILE_PATH,
+                        help="cleaned CSV to write (for a directory input: the directory, without '.csv')")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="partitions cleaned at once (0 = one per CPU core)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows processed at a time (bounds peak memory)")
+    parser.add_argument('--no-cache', action='store_true', help="skip the columnar cache")
+    parser.add_argument('--delta', metavar='BATCH_CSV',
+                        help="merge only this raw batch of new or changed loans into --output")
+    args = parser.parse_args(argv)
+
+    if args.delta:
+        try:
+            report = apply_delta(args.delta, args.output)
+        except FileNotFoundError:
+            print(f"Error: Could not find '{args.delta}'.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            return
+        print(f"Merged '{args.delta}' into '{args.output}': {report['added']:,} new loans, "
+              f"{report['updated']:,} updated, in {report['seconds']:.2f}s")
+        return
+
+    if os.path.isdir(args.input):
+        output_dir = os.path.splitext(args.output)[0]
+        print(f"Cleaning the partitions in '{args.input}' into '{output_dir}'...")
+        report = clean_partitions(args.input, output_dir, args.chunksize, not args.no_cache, args.workers)
+        print(f"Cleaned {report['cleaned']} of {report['partitions']} partitions "
+              f"({report['partitions'] - report['cleaned']} unchanged), {report['rows']:,} rows "
+              f"in {report['seconds']:.1f}s")
+        return
+
+    try:
+        # --- Step 1: Stream the original CSV file in chunks ---
+        # --- Step 2: Convert the date columns of each chunk ---
+        # --- Step 3: Append each chunk to the cleaned CSV (and the columnar cache) ---
+        # Your original file remains untouched.
+        print(f"Reading the original file: '{args.input}' ({args.chunksize:,} rows per chunk)...")
+        report = clean_file(args.input, args.output, args.chunksize, write_cache=not args.no_cache)
+
+        print("-" * 50)
+        print(f"Success! A new file named '{args.output}' has been created.")
+        print("This new file contains the corrected date formats.")
+        if not args.no_cache:
+            print(f"A fast-loading copy was saved in '{cache_dir_for(args.output)}'.")
+        peak = report['peak_rss_mb']
+        print(f"Cleaned {report['rows']:,} rows in {report['seconds']:.1f}s "
+              f"({report['rows_per_sec']:,.0f} rows/sec), "
+              f"peak memory {f'{peak:,.0f} MB' if peak is not None else 'n/a'}")
+
+    except FileNotFoundError:
+        print(f"Error: Could not find '{args.input}'.")
+        print("Please make sure the script is in the same folder as your data file.")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+# generate_loan_data.py
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from loan_data import CLEANED_FILE_PATH, ColumnCacheWriter, DATE_COLUMNS, cache_dir_for, optimize_dtypes
+
+RAW_FILE_PATH = 'financial_loan.csv'
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# Column order of the raw export that clean_data.py expects
+COLUMNS = [
+    'id', 'address_state', 'application_type', 'emp_length', 'emp_title', 'grade',
+    'home_ownership', 'issue_date', 'last_credit_pull_date', 'last_payment_date',
+    'loan_status', 'next_payment_date', 'member_id', 'purpose', 'sub_grade', 'term',
+    'verification_status', 'annual_income', 'dti', 'installment', 'int_rate',
+    'loan_amount', 'total_acc', 'total_payment'
+]
+
+# Category weights, roughly following a consumer lending book
+LOAN_STATUSES = {'Fully Paid': 0.833, 'Charged Off': 0.138, 'Current': 0.029}
+TERMS = {'36 months': 0.73, '60 months': 0.27}
+HOME_OWNERSHIP = {'RENT': 0.48, 'MORTGAGE': 0.44, 'OWN': 0.075, 'OTHER': 0.005}
+VERIFICATION = {'Not Verified': 0.43, 'Verified': 0.32, 'Source Verified': 0.25}
+EMP_LENGTHS = {
+    '< 1 year': 0.12, '1 year': 0.08, '2 years': 0.11, '3 years': 0.10, '4 years': 0.09,
+    '5 years': 0.08, '6 years': 0.06, '7 years': 0.05, '8 years': 0.04, '9 years': 0.03,
+    '10+ years': 0.24
+}
+PURPOSES = {
+    'Debt consolidation': 0.47, 'credit card': 0.13, 'other': 0.10, 'home improvement': 0.075,
+    'major purchase': 0.055, 'small business': 0.045, 'car': 0.04, 'wedding': 0.025,
+    'medical': 0.018, 'moving': 0.015, 'house': 0.01, 'vacation': 0.01,
+    'educational': 0.008, 'renewable_energy': 0.004
+}
+STATES = {
+    'CA': 0.18, 'NY': 0.095, 'FL': 0.072, 'TX': 0.069, 'NJ': 0.047, 'IL': 0.039,
+    'PA': 0.038, 'VA': 0.035, 'GA': 0.035, 'MA': 0.034, 'OH': 0.031, 'MD': 0.027,
+    'AZ': 0.022, 'WA': 0.021, 'CO': 0.020, 'NC': 0.020, 'CT': 0.019, 'MI': 0.018,
+    'MO': 0.017, 'MN': 0.016, 'NV': 0.013, 'SC': 0.012, 'WI': 0.012, 'OR': 0.011,
+    'AL': 0.011, 'LA': 0.011, 'KY': 0.008, 'OK': 0.008, 'KS': 0.007, 'UT': 0.007,
+    'AR': 0.006, 'DC': 0.005, 'RI': 0.005, 'NM': 0.005, 'WV': 0.005, 'HI': 0.004,
+    'NH': 0.004, 'DE': 0.003, 'MT': 0.002, 'WY': 0.002, 'AK': 0.002, 'SD': 0.002,
+    'VT': 0.001, 'MS': 0.001, 'TN': 0.001, 'ID': 0.001, 'IA': 0.001, 'NE': 0.001,
+    'ME': 0.001
+}
+EMP_TITLES = [
+    'Teacher', 'Manager', 'Registered Nurse', 'US Army', 'Supervisor', 'Sales',
+    'Project Manager', 'Owner', 'Office Manager', 'Engineer', 'Driver', 'Accountant',
+    'Software Engineer', 'Director', 'Bank of America', 'Walmart', 'Police Officer',
+    'Administrative Assistant', 'Analyst', 'Consultant'
+]
+EMP_TITLE_MISSING = 0.06
+
+# Interest rate by grade; each sub-grade step (1-5) adds SUB_GRADE_STEP
+GRADES = {'A': 0.26, 'B': 0.30, 'C': 0.20, 'D': 0.13, 'E': 0.07, 'F': 0.03, 'G': 0.01}
+GRADE_BASE_RATE = np.array([0.060, 0.095, 0.125, 0.145, 0.165, 0.185, 0.205])
+SUB_GRADE_STEP = 0.006
+
+DEFAULT_START_DATE = '2021-01-01'
+DEFAULT_END_DATE = '2021-12-31'
+
+
+def _choice(rng, weights, n):
+    """Draw `n` labels from a {label: weight} dict, as a Categorical"""
+    p = np.array(list(weights.values()), dtype='float64')
+    codes = rng.choice(len(p), size=n, p=p / p.sum())
+    return pd.Categorical.from_codes(codes, categories=list(weights))
+
+
+def generate_chunk(n, rng, first_id=1, start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE):
+    """Generate `n` synthetic loans with the cleaned dtypes (dates as datetime64).
+
+    Every column is drawn with vectorized NumPy calls and text columns
+    are built as Categoricals from integer codes, so no per-row Python
+    work is done.
+    """
+    start = np.datetime64(start_date, 'D')
+    span = int((np.datetime64(end_date, 'D') - start).astype(int)) + 1
+
+    # Issuance grows over the period: later days are more likely
+    issue_offset = np.floor(np.sqrt(rng.random(n)) * span).astype('int64')
+    issue_date = start + issue_offset.astype('timedelta64[D]')
+
+    grade_idx = rng.choice(len(GRADES), size=n, p=np.array(list(GRADES.values())))
+    sub_step = rng.integers(1, 6, size=n)
+    grades = pd.Categorical.from_codes(grade_idx, categories=list(GRADES))
+    sub_grades = pd.Categorical.from_codes(
+        grade_idx * 5 + sub_step - 1, categories=[f"{g}{k}" for g in GRADES for k in range(1, 6)])
+    int_rate = np.round(GRADE_BASE_RATE[grade_idx] + SUB_GRADE_STEP * sub_step
+                        + rng.normal(0, 0.004, n), 4).clip(0.05, 0.25)
+
+    term = _choice(rng, TERMS, n)
+    months = np.where(np.asarray(term) == '60 months', 60, 36)
+
+    loan_amount = (np.round(rng.lognormal(9.2, 0.65, n).clip(500, 35000) / 25) * 25).astype('int64')
+    annual_income = np.round(rng.lognormal(11.0, 0.55, n).clip(4000, 6_000_000), -2)
+    dti = np.round(rng.beta(2.2, 5.0, n) * 0.30, 4)
+
+    # Standard amortized monthly payment
+    monthly_rate = int_rate / 12
+    installment = np.round(loan_amount * monthly_rate / (1 - (1 + monthly_rate) ** -months), 2)
+
+    loan_status = _choice(rng, LOAN_STATUSES, n)
+    status = np.asarray(loan_status)
+    full_cost = installment * months
+    paid_share = np.select(
+        [status == 'Fully Paid', status == 'Charged Off'],
+        [rng.uniform(0.85, 1.0, n), rng.uniform(0.15, 0.7, n)],
+        rng.uniform(0.2, 0.8, n))
+    # Fully paid loans repay at least the principal, even when prepaid early
+    total_payment = np.round(np.maximum(full_cost * paid_share,
+                                        np.where(status == 'Fully Paid', loan_amount, 0)))
+    months_paid = np.maximum(1, np.round(months * paid_share)).astype('int64')
+
+    last_payment_date = (issue_date.astype('datetime64[M]') + months_paid).astype('datetime64[D]')
+    next_payment_date = (last_payment_date.astype('datetime64[M]') + 1).astype('datetime64[D]')
+    last_credit_pull_date = last_payment_date + rng.integers(0, 90, n).astype('timedelta64[D]')
+
+    emp_title = np.array(EMP_TITLES, dtype=object)[rng.integers(0, len(EMP_TITLES), n)]
+    emp_title[rng.random(n) < EMP_TITLE_MISSING] = None
+
+    ids = np.arange(first_id, first_id + n, dtype='int64')
+    data = {
+        'id': ids,
+        'address_state': _choice(rng, STATES, n),
+        'application_type': pd.Categorical.from_codes(np.zeros(n, dtype='int8'), ['INDIVIDUAL']),
+        'emp_length': _choice(rng, EMP_LENGTHS, n),
+        'emp_title': emp_title,
+        'grade': grades,
+        'home_ownership': _choice(rng, HOME_OWNERSHIP, n),
+        'issue_date': issue_date,
+        'last_credit_pull_date': last_credit_pull_date,
+        'last_payment_date': last_payment_date,
+        'loan_status': loan_status,
+        'next_payment_date': next_payment_date,
+        'member_id': ids * 7 + 1_000_000,
+        'purpose': _choice(rng, PURPOSES, n),
+        'sub_grade': sub_grades,
+        'term': term,
+        'verification_status': _choice(rng, VERIFICATION, n),
+        'annual_income': annual_income,
+        'dti': dti,
+        'installment': installment,
+        'int_rate': int_rate,
+        'loan_amount': loan_amount,
+        'total_acc': rng.poisson(22, n).clip(2, 90),
+        'total_payment': total_payment.astype('int64')
+    }
+    df = pd.DataFrame(data, columns=COLUMNS)
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def to_raw_format(df):
+    """Render the date columns as the DD-MM-YYYY text of the raw export"""
+    df = df.copy()
+    for col in DATE_COLUMNS:
+        days = df[col].to_numpy().astype('datetime64[D]')
+        first = days.min()
+        # Format each distinct day once, then look the text up per row
+        labels = pd.date_range(first, days.max(), freq='D').strftime('%d-%m-%Y').to_numpy(dtype=object)
+        df[col] = labels[(days - first).astype('int64')]
+    return df
+
+
+def _chunk_specs(rows, chunksize):
+    """(chunk index, first row, row count) for every chunk of a dataset"""
+    return [(i, first, min(chunksize, rows - first))
+            for i, first in enumerate(range(0, rows, chunksize))]
+
+
+def _make_chunk(seed, i, first, n, start_date, end_date):
+    # Chunk i is drawn from its own generator seeded with (seed, i)
+    return generate_chunk(n, np.random.default_rng([seed, i]), first_id=first + 1,
+                          start_date=start_date, end_date=end_date)
+
+
+def generate_loans(rows, seed=42, chunksize=DEFAULT_CHUNK_SIZE,
+                   start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE):
+    """Yield `rows` synthetic loans in chunks of at most `chunksize`.
+
+    The same seed and chunk size always produce the same data.
+    """
+    for i, first, n in _chunk_specs(rows, chunksize):
+        yield _make_chunk(seed, i, first, n, start_date, end_date)
+
+
+def _render_chunk(seed, i, first, n, start_date, end_date, raw, columnar):
+    """Generate one chunk and render it for output (runs in a worker process)"""
+    chunk = _make_chunk(seed, i, first, n, start_date, end_date)
+    # Text for the raw CSV; only the first chunk carries the header row
+    text = to_raw_format(chunk).to_csv(header=(i == 0), index=False) if raw else None
+    compact = optimize_dtypes(chunk, report=False)[0] if columnar else None
+    return n, text, compact
+
+
+def generate_sample_data(rows=1000, seed=42):
+    """A small in-memory dataset for running the dashboard without real data"""
+    df = generate_chunk(rows, np.random.default_rng(seed))
+    return optimize_dtypes(df)[0]
+
+
+def write_dataset(rows, seed=42, chunksize=DEFAULT_CHUNK_SIZE, raw_path=RAW_FILE_PATH,
+                  columnar_path=None, start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE,
+                  workers=1):
+    """Write synthetic loans as a raw CSV and/or a cleaned columnar cache.
+
+    `raw_path` gets the raw DD-MM-YYYY export that clean_data.py reads;
+    `columnar_path` names a cleaned CSV whose column cache is written
+    directly (the loaders use it as long as that CSV doesn't exist).
+    Either may be None to skip it. With `workers` > 1, chunks are
+    generated and rendered in parallel and written in order, so the
+    output is identical to a single-process run.
+    """
+    start = time.perf_counter()
+    specs = _chunk_specs(rows, chunksize)
+    args = [(seed, i, first, n, start_date, end_date, bool(raw_path), bool(columnar_path))
+            for i, first, n in specs]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    rendered = pool.map(_render_chunk, *zip(*args)) if pool else (_render_chunk(*a) for a in args)
+
+    cache_writer = ColumnCacheWriter(cache_dir_for(columnar_path)) if columnar_path else None
+    raw_file = open(raw_path, 'w', newline='', encoding='utf-8') if raw_path else None
+    written = 0
+    try:
+        for n, text, compact in rendered:
+            if raw_file is not None:
+                raw_file.write(text)
+            if cache_writer is not None:
+                cache_writer.append(compact)
+            written += n
+            elapsed = time.perf_counter() - start
+            print(f"  {written:,} / {rows:,} rows ({written / elapsed:,.0f} rows/sec)")
+    finally:
+        if raw_file is not None:
+            raw_file.close()
+        if pool is not None:
+            pool.shutdown()
+
+    if cache_writer is not None:
+        cache_writer.close()
+    return written, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic loan data for load testing.")
+    parser.add_argument('--rows', type=int, default=100_000, help="number of loans to generate")
+    parser.add_argument('--seed', type=int, default=42, help="random seed (same seed, same data)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="rows generated and written at a time")
+    parser.add_argument('--format', choices=['csv', 'columnar', 'both'], default='csv',
+                        help="raw CSV for clean_data.py, a cleaned columnar cache, or both")
+    parser.add_argument('--output', default=RAW_FILE_PATH, help="raw CSV to write")
+    parser.add_argument('--columnar-output', default=CLEANED_FILE_PATH,
+                        help="cleaned CSV path whose column cache is written")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="chunks generated in parallel (0 = one per CPU core)")
+    parser.add_argument('--start-date', default=DEFAULT_START_DATE, help="first issue date")
+    parser.add_argument('--end-date', default=DEFAULT_END_DATE, help="last issue date")
+    args = parser.parse_args(argv)
+
+    raw_path = args.output if args.format in ('csv', 'both') else None
+    columnar_path = args.columnar_output if args.format in ('columnar', 'both') else None
+    if columnar_path and os.path.exists(columnar_path):
+        print(f"⚠️  '{columnar_path}' exists, so loaders will treat the generated cache as stale")
+
+    print(f"🎲 Generating {args.rows:,} synthetic loans (seed {args.seed})...")
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    written, seconds = write_dataset(args.rows, args.seed, args.chunksize, raw_path, columnar_path,
+                                     args.start_date, args.end_date, workers)
+    print("-" * 50)
+    print(f"✅ Generated {written:,} loans in {seconds:.1f}s")
+    if raw_path:
+        print(f"   Raw CSV: '{raw_path}' (run clean_data.py next)")
+    if columnar_path:
+        print(f"   Columnar cache: '{cache_dir_for(columnar_path)}'")
+
+
+if __name__ == '__main__':
+    main()
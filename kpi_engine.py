@@ -0,0 +1,138 @@
+# kpi_engine.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Loan status groups used by the "Good Loan" / "Bad Loan" KPIs
+GOOD_LOAN_STATUSES = ['Fully Paid', 'Current']
+BAD_LOAN_STATUSES = ['Charged Off']
+
+# Month numbers used for the MTD / PMTD KPIs (same as the SQL queries, so
+# every year's December counts). The dashboard's period tiles come from
+# period_kpis instead, which keeps the years apart and takes any reference date.
+CURRENT_MONTH = 12
+PREVIOUS_MONTH = 11
+
+# Cached KPI results, keyed on (source, data_version, current_month, previous_month).
+# Least recently used first, and bounded, so the results of data versions
+# replaced by a reload (and of month pairs no longer asked for) drop out.
+KPI_CACHE_SIZE = 32
+_kpi_cache = OrderedDict()
+_kpi_cache_lock = threading.Lock()
+
+
+def _kpis_from_cells(month, status, count, sums, present, current_month, previous_month):
+    """Fold (month, status) cells into every KPI with one bincount per measure.
+
+    `count` is the number of loans behind each cell, `sums` maps each
+    measure to its per-cell total and `present` to its per-cell number of
+    non-missing values. Row-level data is just cells of one loan each.
+    """
+    # Every cell falls into one (period, loan class) bucket:
+    #   period: 0 = other months, 1 = current month, 2 = previous month
+    #   class:  0 = other status, 1 = good loan,     2 = bad loan
+    period = np.where(month == current_month, 1, np.where(month == previous_month, 2, 0))
+    loan_class = (status.isin(GOOD_LOAN_STATUSES).to_numpy(dtype='int64')
+                  + 2 * status.isin(BAD_LOAN_STATUSES).to_numpy(dtype='int64'))
+    buckets = period * 3 + loan_class
+
+    def table(weights):
+        return np.bincount(buckets, weights=weights, minlength=9).reshape(3, 3)
+
+    # 3x3 (period x class) tables of totals
+    counts = table(count)
+    funded = table(sums['loan_amount'])
+    received = table(sums['total_payment'])
+
+    total_applications = int(counts.sum())
+    good_count = int(counts[:, 1].sum())
+    bad_count = int(counts[:, 2].sum())
+
+    def pct(part):
+        return (part / total_applications) * 100 if total_applications else 0.0
+
+    def mean(measure):
+        n = present[measure].sum()
+        return float(sums[measure].sum() / n * 100) if n else np.nan
+
+    return {
+        'total_applications': total_applications,
+        'total_funded': float(funded.sum()),
+        'total_received': float(received.sum()),
+        'avg_interest_rate': mean('int_rate'),
+        'avg_dti': mean('dti'),
+        'good_loan_percentage': pct(good_count),
+        'bad_loan_percentage': pct(bad_count),
+        'good_loan_applications': good_count,
+        'bad_loan_applications': bad_count,
+        'good_loan_amount': float(funded[:, 1].sum()),
+        'bad_loan_amount': float(funded[:, 2].sum()),
+        'good_loan_received': float(received[:, 1].sum()),
+        'bad_loan_received': float(received[:, 2].sum()),
+        'mtd_applications': int(counts[1].sum()),
+        'pmtd_applications': int(counts[2].sum()),
+        'mtd_funded': float(funded[1].sum()),
+        'pmtd_funded': float(funded[2].sum()),
+        'mtd_received': float(received[1].sum()),
+        'pmtd_received': float(received[2].sum())
+    }
+
+
+def compute_kpis(df, current_month=CURRENT_MONTH, previous_month=PREVIOUS_MONTH):
+    """Compute every dashboard KPI in a single pass over loan-level rows"""
+    month = df['issue_date'].dt.month.to_numpy(dtype='float64', na_value=np.nan)
+    sums, present = {}, {}
+    for measure in ['loan_amount', 'total_payment', 'int_rate', 'dti']:
+        values = df[measure].to_numpy(dtype='float64', na_value=np.nan)
+        present[measure] = ~np.isnan(values)
+        sums[measure] = np.where(present[measure], values, 0.0)
+    return _kpis_from_cells(month, df['loan_status'], np.ones(len(df)), sums, present,
+                            current_month, previous_month)
+
+
+def compute_cube_kpis(cube, current_month=CURRENT_MONTH, previous_month=PREVIOUS_MONTH):
+    """Compute every dashboard KPI from a loan cube (see loan_cube.build_cube)"""
+    month = cube['issue_month'].dt.month.to_numpy(dtype='float64', na_value=np.nan)
+    sums = {
+        'loan_amount': cube['loan_amount'].to_numpy(dtype='float64'),
+        'total_payment': cube['total_payment'].to_numpy(dtype='float64'),
+        'int_rate': cube['int_rate_sum'].to_numpy(dtype='float64'),
+        'dti': cube['dti_sum'].to_numpy(dtype='float64')
+    }
+    present = {'int_rate': cube['int_rate_n'].to_numpy(), 'dti': cube['dti_n'].to_numpy()}
+    return _kpis_from_cells(month, cube['loan_status'], cube['count'].to_numpy(dtype='float64'),
+                            sums, present, current_month, previous_month)
+
+
+def _cached(key, compute):
+    with _kpi_cache_lock:
+        if key in _kpi_cache:
+            _kpi_cache.move_to_end(key)
+            return _kpi_cache[key]
+    # Computed outside the lock, like view_cache does
+    kpis = compute()
+    with _kpi_cache_lock:
+        _kpi_cache[key] = kpis
+        while len(_kpi_cache) > KPI_CACHE_SIZE:
+            _kpi_cache.popitem(last=False)
+    return kpis
+
+
+def get_kpis(df, data_version, current_month=CURRENT_MONTH, previous_month=PREVIOUS_MONTH):
+    """Return the KPIs for `df`, computing them only once per data version"""
+    return _cached(('rows', data_version, current_month, previous_month),
+                   lambda: compute_kpis(df, current_month, previous_month))
+
+
+def get_cube_kpis(cube, data_version, current_month=CURRENT_MONTH, previous_month=PREVIOUS_MONTH):
+    """Return the KPIs for a loan cube, computing them only once per data version"""
+    return _cached(('cube', data_version, current_month, previous_month),
+                   lambda: compute_cube_kpis(cube, current_month, previous_month))
+
+
+def clear_kpi_cache():
+    """Forget all cached KPI results (e.g. after the data has been reloaded)"""
+    with _kpi_cache_lock:
+        _kpi_cache.clear()
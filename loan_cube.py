@@ -0,0 +1,160 @@
+# loan_cube.py
+
+import os
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from agg_engine import CodedFrame
+from loan_data import (cache_dir_for, prune_partitions, read_derived_cache, read_partitions_meta,
+                       write_derived_cache)
+
+# Dimensions every chart and KPI can be broken down or filtered by
+CUBE_DIMENSIONS = [
+    'issue_month',
+    'address_state',
+    'loan_status',
+    'term',
+    'purpose',
+    'emp_length',
+    'home_ownership'
+]
+
+# Additive measures stored per cell. Averages are kept as a sum plus the
+# number of non-missing values, so they stay correct after rolling up.
+SUM_MEASURES = ['loan_amount', 'total_payment']
+MEAN_MEASURES = ['int_rate', 'dti']
+CUBE_MEASURES = (['count'] + SUM_MEASURES
+                 + [f"{m}_sum" for m in MEAN_MEASURES] + [f"{m}_n" for m in MEAN_MEASURES])
+
+# Sub-directory of a loan column cache that holds the cube built from it
+CUBE_CACHE_DIR = 'cube'
+
+
+def build_cube(df):
+    """Aggregate loan-level rows into one row per observed dimension combination.
+
+    Missing dimension values (e.g. an unparseable issue date) get their
+    own cells, so the cube's totals always match the row data.
+    """
+    keys = df[CUBE_DIMENSIONS[1:]].copy()
+    keys.insert(0, 'issue_month', df['issue_date'].dt.to_period('M'))
+
+    measures = pd.DataFrame({'count': 1}, index=df.index)
+    for m in SUM_MEASURES:
+        measures[m] = df[m].astype('float64')
+    for m in MEAN_MEASURES:
+        measures[f"{m}_sum"] = df[m].astype('float64')
+        measures[f"{m}_n"] = df[m].notna().astype('int64')
+
+    grouped = pd.concat([keys, measures], axis=1).groupby(
+        CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)
+    return grouped[CUBE_MEASURES].sum().reset_index()
+
+
+def slice_cube(cube, filters=None, start_month=None, end_month=None):
+    """Keep only the cells matching `filters` and the issue-month range.
+
+    `filters` maps a dimension to a value or list of values. `start_month`
+    and `end_month` are inclusive and accept anything pandas.Period
+    understands, e.g. '2021-03'.
+    """
+    if not filters and start_month is None and end_month is None:
+        return cube
+    mask = pd.Series(True, index=cube.index)
+    for dim, value in (filters or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= cube[dim].isin(values)
+    if start_month is not None:
+        mask &= cube['issue_month'] >= pd.Period(start_month, freq='M')
+    if end_month is not None:
+        mask &= cube['issue_month'] <= pd.Period(end_month, freq='M')
+    return cube[mask]
+
+
+def code_cube(cube, dims=CUBE_DIMENSIONS):
+    """The cube with `dims` factorized once, for any number of rollups (see rollup_coded)"""
+    return CodedFrame(cube, dims, CUBE_MEASURES)
+
+
+def rollup(cube, dims, filters=None):
+    """Sum the cube over every dimension not in `dims`.
+
+    Returns one row per combination of `dims` with the additive measures
+    plus the int_rate / dti averages, ready for the figure builders.
+    Cells with a missing value in one of `dims` are left out, like a
+    pandas groupby over the row data would.
+    """
+    cube = slice_cube(cube, filters)
+    if dims:
+        return rollup_coded(code_cube(cube, dims), dims)
+    result = cube[CUBE_MEASURES].sum().to_frame().T
+    return _add_means(result)
+
+
+def rollup_coded(coded, dims):
+    """rollup() of a cube already factorized by code_cube"""
+    return _add_means(coded.aggregate(dims, sums=CUBE_MEASURES))
+
+
+def _add_means(result):
+    for m in MEAN_MEASURES:
+        result[m] = result[f"{m}_sum"] / result[f"{m}_n"]
+    return result
+
+
+def combine_cubes(cubes):
+    """Add cubes together cell by cell, dropping cells that are left without loans"""
+    cubes = list(cubes)
+    for dim in CUBE_DIMENSIONS[1:]:
+        # Give every part the same categories, so the dimension stays categorical
+        if len(cubes) > 1 and all(isinstance(c[dim].dtype, pd.CategoricalDtype) for c in cubes):
+            categories = union_categoricals([c[dim] for c in cubes]).categories
+            cubes = [c.assign(**{dim: c[dim].cat.set_categories(categories)}) for c in cubes]
+    combined = pd.concat(cubes, ignore_index=True)
+    cube = combined.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=False)[
+        CUBE_MEASURES].sum().reset_index()
+    return cube[cube['count'] != 0].reset_index(drop=True)
+
+
+def merge_cube(cube, added=None, removed=None):
+    """Update a cube for loans added to and/or removed from the data it was built from.
+
+    A changed loan is removed in its old state and added in its new one.
+    The cost grows with the cube and the changed loans, not with the data.
+    """
+    parts = [cube]
+    if added is not None and len(added):
+        parts.append(build_cube(added))
+    if removed is not None and len(removed):
+        retracted = build_cube(removed)
+        retracted[CUBE_MEASURES] = -retracted[CUBE_MEASURES]
+        parts.append(retracted)
+    return combine_cubes(parts)
+
+
+def write_cube_cache(cube, cache_dir):
+    """Store a cube next to the column cache (in `cache_dir`) it was built from"""
+    return write_derived_cache(cube, cache_dir, CUBE_CACHE_DIR)
+
+
+def read_cube_cache(cache_dir, mmap=False):
+    """Return the cube stored with a column cache, or None if missing or out of date"""
+    return read_derived_cache(cache_dir, CUBE_CACHE_DIR, mmap=mmap)
+
+
+def read_source_cube(path, mmap=False, start=None, end=None):
+    """The stored cube of a cleaned CSV, or of the partitions of a directory added up.
+
+    For a directory only the partitions with loans from `start` to `end`
+    are read (see loan_data.load_partitioned_data). None if any cube is
+    missing or out of date.
+    """
+    if not os.path.isdir(path):
+        return read_cube_cache(cache_dir_for(path), mmap=mmap)
+    meta = read_partitions_meta(path)
+    partitions = prune_partitions(meta['partitions'], start, end) if meta else []
+    cubes = [read_cube_cache(cache_dir_for(os.path.join(path, p['file'])), mmap=mmap) for p in partitions]
+    if not cubes or any(cube is None for cube in cubes):
+        return None
+    return combine_cubes(cubes)
@@ -0,0 +1,627 @@
+# loan_data.py
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from stage_metrics import registry
+
+# File written by clean_data.py and read by the dashboard and chart scripts
+CLEANED_FILE_PATH = 'cleaned_financial_loan.csv'
+
+# Columns that hold dates (stored as DD-MM-YYYY text in the raw export)
+DATE_COLUMNS = [
+    'issue_date',
+    'last_credit_pull_date',
+    'last_payment_date',
+    'next_payment_date'
+]
+
+# Declared storage type for each column of the loan table:
+#   category - low-cardinality text, stored as a pandas Categorical
+#   id       - whole numbers, stored in the narrowest integer type that fits
+#   money    - amounts, stored as narrow signed integers when every value is whole
+#              (cents would not survive a float32, so fractional amounts stay float64)
+#   rate     - ratios such as 0.1527, where float32 keeps all reported digits
+LOAN_SCHEMA = {
+    'id': 'id',
+    'member_id': 'id',
+    'total_acc': 'id',
+    'loan_amount': 'money',
+    'total_payment': 'money',
+    'installment': 'money',
+    'annual_income': 'money',
+    'int_rate': 'rate',
+    'dti': 'rate',
+    'loan_status': 'category',
+    'address_state': 'category',
+    'term': 'category',
+    'emp_length': 'category',
+    'purpose': 'category',
+    'home_ownership': 'category',
+    'grade': 'category',
+    'sub_grade': 'category',
+    'verification_status': 'category',
+    'application_type': 'category'
+}
+
+# Bump this whenever the on-disk cache layout changes
+CACHE_FORMAT_VERSION = 1
+CACHE_META_FILE = 'meta.json'
+
+# Written by clean_data.py into a directory of cleaned monthly partitions:
+# the file, month, row count and first / last issue date of each partition
+PARTITIONS_META_FILE = 'partitions.json'
+
+# Partitions read at the same time. Reading a column cache is mostly I/O,
+# which threads overlap without copying the frames between processes.
+DEFAULT_LOAD_THREADS = 4
+
+# Sub-directory of a column cache holding the loan ids in sorted order with
+# their row numbers, used to find existing loans when a batch updates them
+ID_INDEX_DIR = 'id_index'
+
+
+def cache_dir_for(csv_path):
+    """Return the columnar cache directory that belongs to a cleaned CSV"""
+    return os.path.splitext(csv_path)[0] + '.cache'
+
+
+def source_signature(path):
+    """Identify one exact copy of a file by its size and modification time"""
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def file_state(path):
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def watch_for_changes(get_state, on_change, interval, initial=None, stop=None):
+    """Call `on_change(state)` each time `get_state()` settles on a new value.
+
+    Polls every `interval` seconds until `stop` (a threading.Event) is set.
+    A new state must be seen on two checks in a row before it counts, so
+    a file that is still being written is not picked up half-way. If
+    `on_change` itself touches the watched files, it can return the state
+    it left behind so that does not count as a change. Errors from
+    `on_change` are reported and the next change is waited for.
+    """
+    stop = stop or threading.Event()
+    seen, pending = initial, None
+    while not stop.wait(interval):
+        state = get_state()
+        if state is None or state == seen:
+            pending = None
+            continue
+        if state != pending:
+            pending = state
+            continue
+        pending, seen = None, state
+        try:
+            seen = on_change(state) or state
+        except Exception as e:
+            print(f"⚠️  Reload failed, keeping the current data: {e}")
+
+
+class ColumnCacheWriter:
+    """Write a DataFrame, possibly in several chunks, as one binary file per column.
+
+    Numbers and dates are stored as raw NumPy arrays. Text and categorical
+    columns are dictionary-encoded: the file holds integer codes and the
+    distinct values are kept in meta.json. Call close() once all chunks
+    have been appended; until then the cache has no meta.json and is
+    ignored by readers. resume() reopens a finished cache to update rows
+    or append more of them.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.rows = 0
+        self.columns = None
+        self._lookups = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        # Invalidate whatever was there before we start overwriting columns
+        meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+    def _column_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.bin")
+
+    def _describe(self, series):
+        """Decide how a column is stored, based on the first chunk we see"""
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Codes start narrow and are widened as categories are added
+            return {'name': series.name, 'kind': 'category', 'dtype': '|i1',
+                    'categories': [], 'ordered': bool(dtype.ordered),
+                    'category_dtype': str(dtype.categories.dtype)}
+        if isinstance(dtype, pd.PeriodDtype):
+            # Stored as period ordinals, NaT as the smallest int64
+            return {'name': series.name, 'kind': 'period', 'dtype': '<i8',
+                    'period_dtype': str(dtype)}
+        if pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+            if not isinstance(dtype, np.dtype):
+                # Nullable extension dtypes (Int64, boolean, ...) are stored as float
+                dtype = np.dtype('float64')
+            return {'name': series.name, 'kind': 'array', 'dtype': dtype.str}
+        return {'name': series.name, 'kind': 'string', 'dtype': '<i4',
+                'categories': [], 'pandas_dtype': str(dtype)}
+
+    def _encode(self, column, series):
+        """Turn one chunk of a column into the array that goes on disk"""
+        if column['kind'] == 'period':
+            return series.array.asi8
+        if column['kind'] == 'array':
+            values = series.to_numpy()
+            if values.dtype == object:
+                # Nullable extension dtype with missing values
+                values = series.to_numpy(dtype='float64', na_value=np.nan)
+            return values
+
+        # Dictionary encoding shared by every chunk of the column
+        lookup = self._lookups.setdefault(column['name'], {})
+        if column['kind'] == 'category':
+            local_codes = series.cat.codes.to_numpy()
+            uniques = series.cat.categories
+        else:
+            local_codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        mapping = np.empty(len(uniques) + 1, dtype='int32')
+        mapping[-1] = -1
+        for i, value in enumerate(uniques):
+            value = value.item() if hasattr(value, 'item') else value
+            if value not in lookup:
+                lookup[value] = len(column['categories'])
+                column['categories'].append(value)
+            mapping[i] = lookup[value]
+        return mapping[local_codes]
+
+    def _replace_file(self, column, values):
+        """Swap in a new version of a column file without touching the old one"""
+        path = self._column_path(column['name'])
+        values.tofile(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def _rewrite_as(self, column, dtype):
+        """Rewrite a stored column with another type, e.g. a wider one for a later chunk"""
+        old = np.fromfile(self._column_path(column['name']), dtype=np.dtype(column['dtype']))
+        self._replace_file(column, old.astype(dtype))
+        column['dtype'] = dtype.str
+
+    def _fit(self, column, series):
+        """Encode a column's new values, widening the stored type first if they need it"""
+        values = self._encode(column, series)
+        stored = np.dtype(column['dtype'])
+        if column['kind'] == 'array':
+            wider = np.result_type(stored, values.dtype)
+        elif column['kind'] == 'category':
+            # Codes are kept exactly as pandas holds them, so memory-mapped
+            # reads can use the file without converting (and copying) it
+            wider = max(stored, _codes_dtype(len(column['categories'])), key=lambda d: d.itemsize)
+        else:
+            wider = stored
+        if wider != stored:
+            self._rewrite_as(column, wider)
+            stored = wider
+        return values.astype(stored, copy=False)
+
+    @classmethod
+    def resume(cls, cache_dir):
+        """Reopen a complete cache; close() it again to publish the changes"""
+        meta = read_cache_meta(cache_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No complete column cache in '{cache_dir}'")
+        writer = cls.__new__(cls)
+        writer.cache_dir = cache_dir
+        writer.rows = meta['rows']
+        writer.columns = meta['columns']
+        writer._lookups = {column['name']: {value: i for i, value in enumerate(column['categories'])}
+                           for column in writer.columns if 'categories' in column}
+        return writer
+
+    def update(self, positions, df):
+        """Overwrite the rows at `positions` (row numbers) with the rows of `df`.
+
+        Only columns where a value actually changes are rewritten, each into
+        a new file, so readers that mapped the old one are not affected.
+        """
+        if list(df.columns) != [column['name'] for column in self.columns]:
+            raise ValueError("Updated rows must have the cache's columns")
+        for column in self.columns:
+            values = self._fit(column, df[column['name']])
+            path = self._column_path(column['name'])
+            stored = np.fromfile(path, dtype=np.dtype(column['dtype']), count=self.rows)
+            equal_nan = stored.dtype.kind in 'fcmM'
+            if np.array_equal(stored[positions], values, equal_nan=equal_nan):
+                continue
+            stored[positions] = values
+            self._replace_file(column, stored)
+
+    def append(self, df):
+        """Append one chunk of rows to the cache"""
+        if self.columns is None:
+            self.columns = [self._describe(df[name]) for name in df.columns]
+            for column in self.columns:
+                # Replace rather than truncate: processes that memory-mapped the
+                # previous files keep reading them until they switch over
+                path = self._column_path(column['name'])
+                if os.path.exists(path):
+                    os.remove(path)
+                open(path, 'wb').close()
+        elif list(df.columns) != [column['name'] for column in self.columns]:
+            raise ValueError("Every chunk written to the cache must have the same columns")
+
+        for column in self.columns:
+            values = self._fit(column, df[column['name']])
+            with open(self._column_path(column['name']), 'ab') as f:
+                values.tofile(f)
+        self.rows += len(df)
+
+    def close(self, source_path=None):
+        """Write meta.json, which marks the cache as complete"""
+        meta = {
+            'format_version': CACHE_FORMAT_VERSION,
+            'rows': self.rows,
+            'source': source_signature(source_path) if source_path else None,
+            'columns': self.columns or []
+        }
+        meta_path = os.path.join(self.cache_dir, CACHE_META_FILE)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+        return meta
+
+
+def write_column_cache(df, csv_path):
+    """Write the columnar cache for a cleaned CSV that was just saved"""
+    writer = ColumnCacheWriter(cache_dir_for(csv_path))
+    writer.append(df)
+    return writer.close(source_path=csv_path)
+
+
+def write_derived_cache(df, cache_dir, name):
+    """Store a table derived from a column cache (e.g. the loan cube) in a sub-directory of it"""
+    writer = ColumnCacheWriter(os.path.join(cache_dir, name))
+    writer.append(df)
+    # Tied to the column cache's meta.json, which is rewritten whenever the data is
+    return writer.close(source_path=os.path.join(cache_dir, CACHE_META_FILE))
+
+
+def read_derived_cache(cache_dir, name, mmap=False):
+    """Return a table stored with write_derived_cache, or None if missing or out of date"""
+    data_meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+    meta = read_cache_meta(os.path.join(cache_dir, name))
+    if not os.path.exists(data_meta_path) or not is_cache_fresh(data_meta_path, meta):
+        return None
+    return read_column_cache(os.path.join(cache_dir, name), meta, mmap=mmap)
+
+
+def read_cache_meta(cache_dir):
+    """Return the cache's meta.json contents, or None if there is no complete cache"""
+    try:
+        with open(os.path.join(cache_dir, CACHE_META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format_version') != CACHE_FORMAT_VERSION:
+        return None
+    return meta
+
+
+def is_cache_fresh(csv_path, meta):
+    """A cache is fresh when it was written from the CSV exactly as it is now"""
+    if meta is None:
+        return False
+    if not os.path.exists(csv_path):
+        # Nothing newer to compare against, so the cache is the best copy we have
+        return True
+    source = meta.get('source') or {}
+    current = source_signature(csv_path)
+    return source.get('mtime_ns') == current['mtime_ns'] and source.get('size') == current['size']
+
+
+def read_column_cache(cache_dir, meta=None, mmap=False):
+    """Load a columnar cache back into a DataFrame with its original dtypes"""
+    meta = meta or read_cache_meta(cache_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No complete column cache in '{cache_dir}'")
+
+    data = {}
+    for column in meta['columns']:
+        path = os.path.join(cache_dir, f"{column['name']}.bin")
+        dtype = np.dtype(column['dtype'])
+        if mmap and meta['rows']:
+            # A plain ndarray view of the mapping, so the memmap subclass never leaks out
+            values = np.asarray(np.memmap(path, dtype=dtype, mode='r', shape=(meta['rows'],)))
+        else:
+            values = np.fromfile(path, dtype=dtype, count=meta['rows'])
+
+        if column['kind'] == 'category':
+            categories = pd.Index(column['categories'])
+            if column.get('category_dtype', 'object') != 'object':
+                categories = categories.astype(column['category_dtype'])
+            data[column['name']] = pd.Categorical.from_codes(
+                np.asarray(values), categories=categories, ordered=column['ordered'])
+        elif column['kind'] == 'period':
+            data[column['name']] = pd.arrays.PeriodArray(
+                values, dtype=pd.api.types.pandas_dtype(column['period_dtype']))
+        elif column['kind'] == 'string':
+            lookup = np.array(column['categories'] + [None], dtype=object)
+            series = pd.Series(lookup[np.asarray(values)], name=column['name'])
+            if column['pandas_dtype'] != 'object':
+                series = series.astype(column['pandas_dtype'])
+            data[column['name']] = series
+        else:
+            data[column['name']] = values
+
+    # copy=False keeps memory-mapped columns backed by the files, so every
+    # process reading the same cache shares one copy in the OS page cache
+    return pd.DataFrame(data, columns=[column['name'] for column in meta['columns']], copy=False)
+
+
+def build_id_index(ids, first_row=0):
+    """Sorted loan ids with the row number each one is stored at"""
+    ids = np.asarray(ids)
+    order = np.argsort(ids, kind='stable')
+    return ids[order], order.astype('int64') + first_row
+
+
+def extend_id_index(index, ids, first_row):
+    """Add the ids stored from row `first_row` onwards to an id index"""
+    sorted_ids, rows = index
+    new_ids, new_rows = build_id_index(ids, first_row)
+    sorted_ids = sorted_ids.astype(np.result_type(sorted_ids, new_ids), copy=False)
+    at = np.searchsorted(sorted_ids, new_ids)
+    return np.insert(sorted_ids, at, new_ids), np.insert(rows, at, new_rows)
+
+
+def find_rows(index, ids):
+    """Row numbers of `ids` in an id index, and a mask of the ids that were found"""
+    sorted_ids, rows = index
+    ids = np.asarray(ids)
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype='int64'), np.zeros(len(ids), dtype=bool)
+    at = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return rows[at], sorted_ids[at] == ids
+
+
+def write_id_index(index, cache_dir):
+    write_derived_cache(pd.DataFrame({'id': index[0], 'row': index[1]}), cache_dir, ID_INDEX_DIR)
+
+
+def read_id_index(cache_dir):
+    """The id index stored with a column cache, or None if missing or out of date"""
+    df = read_derived_cache(cache_dir, ID_INDEX_DIR)
+    return None if df is None else (df['id'].to_numpy(), df['row'].to_numpy())
+
+
+def _codes_dtype(n_categories):
+    """Integer type pandas uses for the codes of a Categorical with this many categories"""
+    for dtype in ['int8', 'int16', 'int32']:
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype('int64')
+
+
+def _narrowest_integer(series, unsigned):
+    """Downcast whole numbers to the smallest integer type, or return None"""
+    values = series.to_numpy()
+    if not np.issubdtype(values.dtype, np.number) or len(values) == 0:
+        return None
+    if np.issubdtype(values.dtype, np.floating):
+        if not np.isfinite(values).all() or (values != np.round(values)).any():
+            return None
+        values = values.astype('int64')
+    downcast = 'unsigned' if unsigned and values.min() >= 0 else 'integer'
+    return pd.to_numeric(pd.Series(values, index=series.index, name=series.name),
+                         downcast=downcast)
+
+
+def optimize_dtypes(df, schema=LOAN_SCHEMA, report=True):
+    """Convert columns to the compact types declared in `schema`.
+
+    Returns the converted DataFrame and a per-column memory report (None
+    with `report=False`, which skips the slow deep memory measurement).
+    Columns not in the schema, or whose values don't fit the declared
+    type, are left as they are.
+    """
+    if report:
+        before = df.memory_usage(deep=True, index=False)
+        before_dtypes = df.dtypes.astype(str)
+    df = df.copy()
+
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == 'category':
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif kind in ('id', 'money'):
+            # Amounts stay signed so differences between them can't wrap around
+            narrowed = _narrowest_integer(df[col], unsigned=(kind == 'id'))
+            if narrowed is not None:
+                df[col] = narrowed
+        elif kind == 'rate':
+            if pd.api.types.is_float_dtype(df[col].dtype):
+                df[col] = df[col].astype('float32')
+
+    if not report:
+        return df, None
+    after = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'dtype_before': before_dtypes,
+        'dtype_after': df.dtypes.astype(str),
+        'mb_before': before / 1e6,
+        'mb_after': after / 1e6
+    })
+    return df, report
+
+
+def print_memory_report(report):
+    """Print the before/after memory breakdown from optimize_dtypes()"""
+    total_before = report['mb_before'].sum()
+    total_after = report['mb_after'].sum()
+    changed = report[report['dtype_before'] != report['dtype_after']]
+    print(f"Memory usage: {total_before:,.1f} MB -> {total_after:,.1f} MB")
+    if len(changed):
+        print(changed.round(2).to_string())
+
+
+def read_cleaned_csv(csv_path):
+    """Parse the cleaned CSV the slow way, converting the date columns"""
+    with registry.stage('load.read_csv'):
+        df = pd.read_csv(csv_path)
+    with registry.stage('load.parse_dates'):
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+    # Batches applied with `clean_data.py --delta` append changed loans again;
+    # the last copy of an id is the current one, kept where the loan first appeared
+    if 'id' in df.columns and df['id'].duplicated().any():
+        latest = df.drop_duplicates('id', keep='last').set_index('id')
+        df = latest.loc[df['id'].drop_duplicates()].reset_index()[df.columns]
+    return df
+
+
+def read_partitions_meta(data_dir):
+    """The partition list of a directory of cleaned partitions, or None if it has none"""
+    try:
+        with open(os.path.join(data_dir, PARTITIONS_META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format_version') != CACHE_FORMAT_VERSION:
+        return None
+    return meta
+
+
+def write_partitions_meta(data_dir, partitions):
+    meta = {'format_version': CACHE_FORMAT_VERSION, 'partitions': partitions}
+    meta_path = os.path.join(data_dir, PARTITIONS_META_FILE)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+
+def prune_partitions(partitions, start=None, end=None):
+    """The partitions that can hold loans issued from `start` to `end` (both inclusive).
+
+    Decided from the first / last issue dates in the metadata alone, so
+    the partitions left out are never opened.
+    """
+    if start is None and end is None:
+        return list(partitions)
+    first = pd.Timestamp(start).normalize() if start is not None else None
+    last = pd.Timestamp(end).normalize() if end is not None else None
+    kept = []
+    for partition in partitions:
+        if partition['min_issue_date'] is None:
+            continue  # no loan with an issue date, so none in any range
+        if last is not None and pd.Timestamp(partition['min_issue_date']) > last:
+            continue
+        if first is not None and pd.Timestamp(partition['max_issue_date']) < first:
+            continue
+        kept.append(partition)
+    return kept
+
+
+def concat_partitions(frames):
+    """Stack partitions, keeping the columns that are categorical in each of them categorical"""
+    frames = list(frames)
+    if len(frames) > 1:
+        for name in frames[0].columns:
+            if all(isinstance(df[name].dtype, pd.CategoricalDtype) for df in frames):
+                categories = union_categoricals([df[name] for df in frames], sort_categories=True).categories
+                frames = [df.assign(**{name: df[name].cat.set_categories(categories)}) for df in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_partitioned_data(data_dir, start=None, end=None, mmap=False, write_cache=True,
+                          threads=DEFAULT_LOAD_THREADS):
+    """Load the cleaned partitions in `data_dir`, only those with loans issued from `start` to `end`.
+
+    The partitions are read concurrently, each from its own column cache
+    when that is fresh. Returns the loans of the kept partitions (whole
+    partitions: rows outside the range are the caller's to filter) and a
+    data version covering exactly those partitions.
+    """
+    meta = read_partitions_meta(data_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No {PARTITIONS_META_FILE} in '{data_dir}'; run clean_data.py on the raw partitions")
+    partitions = meta['partitions']
+    kept = prune_partitions(partitions, start, end)
+    # Nothing in range still needs the columns; take them from one partition
+    to_read = kept or partitions[:1]
+
+    def load(partition):
+        return load_cleaned_data(os.path.join(data_dir, partition['file']), show_memory=False,
+                                 mmap=mmap, write_cache=write_cache)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(to_read)))) as pool:
+        loaded = list(pool.map(load, to_read))
+    df = concat_partitions(df for df, _ in loaded)
+    if not kept:
+        df = df.iloc[:0]
+    print(f"Read {len(kept)} of {len(partitions)} partitions from '{data_dir}' ({len(df):,} rows)")
+    data_version = (os.path.abspath(data_dir),) + tuple(version for _, version in loaded[:len(kept)])
+    return df, data_version
+
+
+def load_cleaned_data(csv_path=CLEANED_FILE_PATH, use_cache=True, optimize=True,
+                      show_memory=True, mmap=False, write_cache=True):
+    """Load the cleaned loan data, preferring the columnar cache when it is fresh.
+
+    With `optimize`, columns are converted to the compact LOAN_SCHEMA
+    types (the cache already stores them that way). With `mmap`, a fresh
+    cache is memory-mapped read-only instead of read. A stale cache is
+    rewritten unless `write_cache` is off. Returns the DataFrame
+    together with a data version that changes whenever the underlying
+    file does. `csv_path` may also be a directory of cleaned partitions
+    (see load_partitioned_data), which are all loaded.
+    """
+    if os.path.isdir(csv_path):
+        return load_partitioned_data(csv_path, mmap=mmap, write_cache=write_cache)
+    cache_dir = cache_dir_for(csv_path)
+    meta = read_cache_meta(cache_dir) if use_cache else None
+
+    if is_cache_fresh(csv_path, meta):
+        with registry.stage('load.column_cache'):
+            df = read_column_cache(cache_dir, meta, mmap=mmap)
+        # A cache written without a CSV (e.g. by generate_loan_data.py) is
+        # versioned by its own meta.json instead
+        source = meta.get('source') or source_signature(os.path.join(cache_dir, CACHE_META_FILE))
+        print(f"{'Mapped' if mmap else 'Loaded'} {len(df):,} rows from column cache '{cache_dir}'")
+        if show_memory:
+            print(f"Memory usage: {df.memory_usage(deep=True).sum() / 1e6:,.1f} MB "
+                  f"(compact dtypes from the cache)")
+    else:
+        df = read_cleaned_csv(csv_path)
+        source = source_signature(csv_path)
+        print(f"Loaded {len(df):,} rows from '{csv_path}'")
+        if optimize:
+            with registry.stage('load.optimize_dtypes'):
+                df, report = optimize_dtypes(df, report=show_memory)
+            if show_memory:
+                print_memory_report(report)
+        if use_cache and write_cache:
+            # Refresh the stale cache so the next start is fast again
+            try:
+                write_column_cache(df, csv_path)
+            except OSError as e:
+                print(f"Could not write column cache: {e}")
+
+    data_version = (os.path.abspath(csv_path), source.get('mtime_ns'), source.get('size'))
+    return df, data_version
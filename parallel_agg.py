@@ -0,0 +1,189 @@
+# parallel_agg.py
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from kpi_engine import compute_cube_kpis, compute_kpis
+from loan_cube import CUBE_DIMENSIONS, build_cube, combine_cubes, rollup
+
+# Processes building the loan cube (1 = in this process, 0 = one per CPU core)
+DEFAULT_WORKERS = int(os.environ.get('DASHBOARD_AGG_WORKERS', 1))
+
+# How the loans are split between the processes: into contiguous row
+# ranges, or into runs of whole issue months (so no cell is in two parts)
+PARTITION_BY = ('rows', 'month')
+
+# How processes that already run other threads (the dashboard's request,
+# metrics and job threads) start their workers: forking such a process can
+# copy a lock another thread holds into the child, which then never gets it
+THREADED_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# The frame forked workers aggregate, inherited from the parent instead of pickled
+_frame = None
+
+
+def resolve_workers(workers):
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _issue_months(df):
+    months = df['issue_date'].to_numpy().astype('datetime64[M]')
+    return months.view('int64'), np.isnat(months)
+
+
+def row_partitions(df, parts):
+    """('rows', start, stop) ranges of about equal size"""
+    bounds = np.linspace(0, len(df), parts + 1).round().astype('int64')
+    return [('rows', int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def month_partitions(df, parts):
+    """('month', first, last) runs of issue months (as ordinals) with about equal numbers of loans.
+
+    The first run also takes the loans without an issue date.
+    """
+    ordinals, missing = _issue_months(df)
+    months, counts = np.unique(ordinals[~missing], return_counts=True)
+    if not len(months):
+        return [('month', 0, -1)]
+    # Cut where the running count passes each equal share
+    cuts = np.searchsorted(np.cumsum(counts), np.linspace(0, counts.sum(), parts + 1)[1:-1], side='right')
+    bounds = sorted(set(cuts.tolist()) | {0, len(months)})
+    return [('month', int(months[a]), int(months[b - 1])) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def partitions(df, parts, by='rows'):
+    if by not in PARTITION_BY:
+        raise ValueError(f"unknown partitioning '{by}', expected one of {PARTITION_BY}")
+    return row_partitions(df, parts) if by == 'rows' else month_partitions(df, parts)
+
+
+def partition_rows(df, spec, first_part=False):
+    """The loans of one partition"""
+    kind, first, last = spec
+    if kind == 'rows':
+        return df.iloc[first:last]
+    ordinals, missing = _issue_months(df)
+    mask = (ordinals >= first) & (ordinals <= last) & ~missing
+    return df[mask | missing] if first_part else df[mask]
+
+
+def _partial_cube(spec, first_part):
+    """Map step, run in a worker: the cube of one partition of the inherited frame"""
+    return build_cube(partition_rows(_frame, spec, first_part))
+
+
+def build_cube_parallel(df, workers=DEFAULT_WORKERS, by='rows', start_method='fork'):
+    """build_cube() as a map-reduce over `workers` processes.
+
+    The loans are split into one partition per worker, each worker builds
+    the cube of its partition, and combine_cubes adds the partial cubes up
+    cell by cell, as clean_data.py does with the cubes of its chunks.
+    Workers are forked, so they read the parent's frame (memory-mapped or
+    not) without copying it. With another `start_method` (such as
+    THREADED_START_METHOD, for callers with threads of their own), or
+    where fork is not available, the partitions are sent to them instead.
+    """
+    global _frame
+    workers = resolve_workers(workers)
+    specs = partitions(df, workers, by)
+    if workers <= 1 or len(specs) <= 1:
+        return build_cube(df)
+
+    first_parts = [i == 0 for i in range(len(specs))]
+    if start_method == 'fork' and 'fork' in multiprocessing.get_all_start_methods():
+        _frame = df
+        try:
+            with ProcessPoolExecutor(max_workers=len(specs), mp_context=multiprocessing.get_context('fork')) as pool:
+                partials = list(pool.map(_partial_cube, specs, first_parts))
+        finally:
+            _frame = None
+    else:
+        if start_method == 'fork':
+            start_method = 'spawn'
+        with ProcessPoolExecutor(max_workers=len(specs), mp_context=multiprocessing.get_context(start_method)) as pool:
+            partials = list(pool.map(build_cube, [partition_rows(df, spec, first)
+                                                  for spec, first in zip(specs, first_parts)]))
+    return combine_cubes(partials)
+
+
+def _sorted_cells(cube):
+    return cube.sort_values(CUBE_DIMENSIONS, na_position='first').reset_index(drop=True)
+
+
+def check_parallel(df, cube, rtol=1e-9):
+    """Compare a parallel-built cube, and what the dashboard reads off it, with the serial results.
+
+    Checks the cells against build_cube, the KPIs against the row-level
+    compute_kpis, and the monthly and categorical rollups against pandas
+    groupbys over the rows. Returns the mismatches.
+    """
+    mismatches = []
+
+    def compare(name, expected, actual):
+        try:
+            pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_categorical=False, rtol=rtol)
+        except AssertionError as e:
+            mismatches.append(f"{name}: {str(e).splitlines()[0]}")
+
+    compare('cube cells', _sorted_cells(build_cube(df)), _sorted_cells(cube))
+
+    expected, actual = compute_kpis(df), compute_cube_kpis(cube)
+    for key in expected:
+        if not np.isclose(expected[key], actual[key], rtol=rtol, equal_nan=True):
+            mismatches.append(f"KPI {key}: {expected[key]!r} != {actual[key]!r}")
+
+    rows = df.assign(issue_month=df['issue_date'].dt.to_period('M'))
+    for dim in CUBE_DIMENSIONS:
+        grouped = rows.groupby(dim, observed=True)
+        expected = pd.DataFrame({
+            'count': grouped.size(),
+            'loan_amount': grouped['loan_amount'].sum(),
+            'total_payment': grouped['total_payment'].sum(),
+            'int_rate': grouped['int_rate'].apply(lambda s: s.astype('float64').mean()),
+            'dti': grouped['dti'].apply(lambda s: s.astype('float64').mean())
+        }).reset_index()
+        compare(f"by {dim}", expected, rollup(cube, [dim])[list(expected.columns)])
+    return mismatches
+
+
+def main(argv=None):
+    from loan_data import CLEANED_FILE_PATH, load_cleaned_data
+
+    parser = argparse.ArgumentParser(description="Build the loan cube in parallel and compare it with the serial build.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH, help="cleaned loan CSV")
+    parser.add_argument('--workers', type=int, default=0, help="processes (0 = one per CPU core)")
+    parser.add_argument('--by', choices=PARTITION_BY, default='rows',
+                        help="partition into row ranges or runs of issue months")
+    parser.add_argument('--check', action='store_true',
+                        help="verify the cube, KPIs and rollups against the serial results")
+    args = parser.parse_args(argv)
+    workers = resolve_workers(args.workers)
+
+    df, _ = load_cleaned_data(args.data, show_memory=False)
+    start = time.perf_counter()
+    build_cube(df)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    cube = build_cube_parallel(df, workers, args.by)
+    parallel = time.perf_counter() - start
+    print(f"🧊 Cube of {len(cube):,} cells: {serial:.2f}s serial, {parallel:.2f}s with {workers} "
+          f"worker(s) by {args.by} ({serial / parallel:.1f}x)")
+    if args.check:
+        mismatches = check_parallel(df, cube)
+        print(f"{'❌' if mismatches else '✅'} {len(mismatches)} mismatches with the serial results")
+        for line in mismatches:
+            print(f"     {line}")
+        return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
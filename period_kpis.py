@@ -0,0 +1,229 @@
+# period_kpis.py
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from loan_cube import CUBE_MEASURES, MEAN_MEASURES, SUM_MEASURES
+
+# Reporting periods ending on the reference date: name -> function giving
+# the (first, last) day of the period for that date. The previous-month and
+# last-year periods stop on the same day of their month (clipped to the
+# month's end), so they compare like with like.
+PERIODS = {
+    'mtd': lambda ref: (ref.to_period('M').start_time, ref),
+    'pmtd': lambda ref: _shifted(ref, months=1),
+    'qtd': lambda ref: (ref.to_period('Q').start_time, ref),
+    'ytd': lambda ref: (ref.to_period('Y').start_time, ref),
+    'lymtd': lambda ref: _shifted(ref, years=1)
+}
+
+# Growth KPIs: name -> (period, period it is compared with)
+GROWTH = {
+    'mom': ('mtd', 'pmtd'),
+    'yoy': ('mtd', 'lymtd')
+}
+
+
+def _shifted(ref, **offset):
+    """Month-to-date period of the same day `offset` earlier"""
+    day = ref - pd.DateOffset(**offset)
+    return day.to_period('M').start_time, day
+
+
+def _day(date):
+    return np.datetime64(pd.Timestamp(date).normalize(), 'D')
+
+
+class DailyTotals:
+    """Running totals of the cube measures over every day of the loan book.
+
+    Row `i` of `cumulative` holds the totals of all loans issued before
+    `first_day + i` days, so the totals of any date range are one
+    subtraction of two rows, however long the range. Built once per data
+    version (and filter selection); moving the reference date afterwards
+    never touches the loans again.
+    """
+
+    def __init__(self, first_day, cumulative):
+        self.first_day = first_day
+        self.cumulative = cumulative
+
+    @property
+    def last_day(self):
+        return self.first_day + (len(self.cumulative) - 2)
+
+    def range_totals(self, start, end):
+        """Measure totals of the loans issued from `start` to `end`, both inclusive"""
+        if len(self.cumulative) < 2:
+            return dict.fromkeys(CUBE_MEASURES, 0.0)
+        days = len(self.cumulative) - 1
+        first = min(max(int((_day(start) - self.first_day).astype(int)), 0), days)
+        last = min(max(int((_day(end) - self.first_day).astype(int)) + 1, 0), days)
+        totals = self.cumulative[max(last, first)] - self.cumulative[first]
+        return dict(zip(CUBE_MEASURES, totals.tolist()))
+
+    def range_kpis(self, start, end):
+        """Applications, amounts and average rates of the loans issued from `start` to `end`"""
+        totals = self.range_totals(start, end)
+
+        def mean(measure):
+            n = totals[f"{measure}_n"]
+            return totals[f"{measure}_sum"] / n * 100 if n else np.nan
+
+        return {
+            'applications': int(round(totals['count'])),
+            'funded': totals['loan_amount'],
+            'received': totals['total_payment'],
+            'avg_interest_rate': mean('int_rate'),
+            'avg_dti': mean('dti')
+        }
+
+    def period_kpis(self, reference_date=None, periods=None):
+        """Every period KPI for `reference_date` (default: the last issue date).
+
+        Keys are `<period>_<kpi>` for the PERIODS (or only `periods`) and
+        range_kpis, plus `<growth>_<kpi>` percentage changes (NaN when the
+        base is zero) for the growths whose periods are both included.
+        """
+        if reference_date is None:
+            reference_date = self.last_day if len(self.cumulative) > 1 else pd.Timestamp.today()
+        ref = pd.Timestamp(reference_date).normalize()
+        kpis, by_period = {'reference_date': ref}, {}
+        for period in periods or PERIODS:
+            by_period[period] = self.range_kpis(*PERIODS[period](ref))
+            kpis.update({f"{period}_{key}": value for key, value in by_period[period].items()})
+        for growth, (period, base) in GROWTH.items():
+            if period not in by_period or base not in by_period:
+                continue
+            for key in ['applications', 'funded', 'received']:
+                now, before = by_period[period][key], by_period[base][key]
+                kpis[f"{growth}_{key}"] = (now - before) / before * 100 if before else np.nan
+        return kpis
+
+
+def periods_span(reference_date, periods=None):
+    """First and last day the `periods` (default: all PERIODS) of `reference_date` cover"""
+    ref = pd.Timestamp(reference_date).normalize()
+    bounds = [PERIODS[period](ref) for period in periods or PERIODS]
+    return min(first for first, _ in bounds), max(last for _, last in bounds)
+
+
+def build_daily_totals(df, filters=None, index=None):
+    """Build the DailyTotals of the loans matching `filters` (dimension -> values).
+
+    One pass over the rows: a bincount per measure over the issue day,
+    then a running sum. Loans without an issue date are left out. With a
+    bitmap_index.BitmapIndex of `df`, the filters are resolved from its
+    bitsets instead of comparing the columns.
+    """
+    mask = df['issue_date'].notna().to_numpy()
+    if filters and index is not None:
+        mask = mask & index.mask(index.select(filters))
+    else:
+        for dim, values in (filters or {}).items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            mask = mask & df[dim].astype(str).isin([str(v) for v in values]).to_numpy()
+
+    days = df['issue_date'].to_numpy()[mask].astype('datetime64[D]')
+    if not len(days):
+        return DailyTotals(np.datetime64('NaT', 'D'), np.zeros((1, len(CUBE_MEASURES))))
+    first_day = days.min()
+    offsets = (days - first_day).astype('int64')
+    n_days = int(offsets.max()) + 1
+
+    def per_day(values):
+        return np.bincount(offsets, weights=values, minlength=n_days)
+
+    columns = [per_day(None).astype('float64')]
+    for m in SUM_MEASURES:
+        columns.append(per_day(np.nan_to_num(df[m].to_numpy(dtype='float64', na_value=np.nan)[mask])))
+    sums, counts = [], []
+    for m in MEAN_MEASURES:
+        values = df[m].to_numpy(dtype='float64', na_value=np.nan)[mask]
+        present = ~np.isnan(values)
+        sums.append(per_day(np.where(present, values, 0.0)))
+        counts.append(per_day(present.astype('float64')))
+    # Same column order as CUBE_MEASURES
+    daily = np.column_stack(columns + sums + counts)
+    cumulative = np.vstack([np.zeros((1, daily.shape[1])), np.cumsum(daily, axis=0)])
+    return DailyTotals(first_day, cumulative)
+
+
+def scan_range_kpis(df, start, end):
+    """range_kpis computed straight from the rows, to check the lookups against"""
+    dates = df['issue_date']
+    rows = df[(dates >= pd.Timestamp(start).normalize()) & (dates <= pd.Timestamp(end).normalize())]
+    return {
+        'applications': len(rows),
+        'funded': float(rows['loan_amount'].sum()),
+        'received': float(rows['total_payment'].sum()),
+        'avg_interest_rate': rows['int_rate'].astype('float64').mean() * 100,
+        'avg_dti': rows['dti'].astype('float64').mean() * 100
+    }
+
+
+def check_daily_totals(df, daily, n=200, seed=0):
+    """Compare the lookups of `n` random date ranges with a scan of the rows; returns the mismatches"""
+    rng = np.random.default_rng(seed)
+    span = int((daily.last_day - daily.first_day).astype(int))
+    mismatches = []
+    for _ in range(n):
+        # Reach a little past both ends, which must be clipped
+        a, b = np.sort(rng.integers(-10, span + 10, 2))
+        start, end = daily.first_day + int(a), daily.first_day + int(b)
+        expected, actual = scan_range_kpis(df, start, end), daily.range_kpis(start, end)
+        for key in expected:
+            if not np.isclose(expected[key], actual[key], rtol=1e-9, equal_nan=True):
+                mismatches.append(f"{start}..{end} {key}: {expected[key]!r} != {actual[key]!r}")
+    return mismatches
+
+
+def main(argv=None):
+    from loan_data import CLEANED_FILE_PATH, load_cleaned_data, load_partitioned_data
+
+    parser = argparse.ArgumentParser(description="Show the period KPIs for a reference date.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH,
+                        help="cleaned loan CSV, or a directory of cleaned partitions")
+    parser.add_argument('--date', default=None, help="reference date (default: last issue date)")
+    parser.add_argument('--periods', default=','.join(PERIODS),
+                        help=f"comma-separated periods to show, of {', '.join(PERIODS)}")
+    parser.add_argument('--check', action='store_true',
+                        help="verify the running-total lookups against scans of the rows")
+    args = parser.parse_args(argv)
+    periods = [period.strip() for period in args.periods.split(',') if period.strip()]
+    unknown = [period for period in periods if period not in PERIODS]
+    if unknown:
+        parser.error(f"unknown periods {unknown}, expected some of {list(PERIODS)}")
+
+    if os.path.isdir(args.data) and args.date and not args.check:
+        # Only the partitions the periods of that date reach are read
+        df, _ = load_partitioned_data(args.data, *periods_span(args.date, periods))
+    else:
+        df, _ = load_cleaned_data(args.data, show_memory=False)
+    start = time.perf_counter()
+    daily = build_daily_totals(df)
+    print(f"📅 Daily totals for {len(daily.cumulative) - 1:,} days built in "
+          f"{time.perf_counter() - start:.3f}s")
+    if args.check:
+        mismatches = check_daily_totals(df, daily)
+        print(f"{'❌' if mismatches else '✅'} {len(mismatches)} mismatches over 200 random date ranges")
+        for line in mismatches[:20]:
+            print(f"     {line}")
+        return 1 if mismatches else 0
+
+    start = time.perf_counter()
+    kpis = daily.period_kpis(args.date, periods)
+    print(f"Period KPIs for {kpis.pop('reference_date').date()} "
+          f"({(time.perf_counter() - start) * 1000:.2f} ms)")
+    for key, value in kpis.items():
+        print(f"  {key:<28} {value:,.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,582 @@
+# query_backend.py
+
+import argparse
+import calendar
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from kpi_engine import compute_cube_kpis, get_cube_kpis
+from loan_cube import build_cube, code_cube, rollup, rollup_coded, slice_cube
+from query_batch import compile_batch
+
+# The MySQL queries behind every KPI and breakdown of the report
+QUERY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Query MySql File.sql')
+
+# Table name used by the queries, and the SQLite table that really holds the
+# loans. Each query runs against a CTE of that name over the real table, so
+# the same text serves both the whole book and any filtered slice of it.
+QUERY_TABLE = 'bank_loan_data'
+SQL_TABLE = 'loan_rows'
+# Which copy of the loans (data version) a database file holds, so a file
+# that is still up to date is reused instead of loaded again
+SQL_META_TABLE = 'loan_rows_meta'
+# Rows of the CSV (or frame) streamed into a database at a time
+SQL_LOAD_CHUNKSIZE = 100_000
+# Sub-directory of the column cache with one database file per data version,
+# which the dashboard's processes open instead of each copying the loans
+SQL_DATABASE_DIR = 'sql'
+
+# Columns the queries and the dashboard filters need
+SQL_COLUMNS = ['id', 'issue_date', 'loan_amount', 'total_payment', 'int_rate', 'dti',
+               'loan_status', 'address_state', 'term', 'purpose', 'emp_length', 'home_ownership']
+INDEXED_COLUMNS = ['loan_status', 'address_state', 'term', 'purpose', 'emp_length', 'home_ownership']
+
+# KPI key -> (query name in QUERY_FILE, factor applied to its single value).
+# The dashboard shows the average interest rate in percent; the query returns the rate.
+KPI_QUERIES = {
+    'total_applications': ('Total Loan Applications', 1),
+    'mtd_applications': ('MTD(Month to data) Loan Applications', 1),
+    'pmtd_applications': ('PMTD Loan Applications', 1),
+    'total_funded': ('Total Funded Amount', 1),
+    'mtd_funded': ('MTD Total Amount', 1),
+    'pmtd_funded': ('PMTD Total Amount', 1),
+    'total_received': ('Total Amount Recieved', 1),
+    'mtd_received': ('MTD Total Amount Recieved', 1),
+    'pmtd_received': ('PMTD Total Amount Recieved', 1),
+    'avg_interest_rate': ('AVG Interest Rate', 100),
+    'avg_dti': ('Avg DTI', 1),
+    'good_loan_percentage': ('Good Loan Percentage', 1),
+    'good_loan_applications': ('Good Loan Applications', 1),
+    'good_loan_amount': ('Good Loan Funded Amount', 1),
+    'good_loan_received': ('Good Loan Amount Received', 1),
+    'bad_loan_percentage': ('Bad Loan Percentage', 1),
+    'bad_loan_applications': ('Bad Loan Applications', 1),
+    'bad_loan_amount': ('Bad Loan Funded Amount', 1),
+    'bad_loan_received': ('Bad Loan Amount Received', 1)
+}
+COUNT_KPIS = ['total_applications', 'mtd_applications', 'pmtd_applications',
+              'good_loan_applications', 'bad_loan_applications']
+MEAN_KPIS = ['avg_interest_rate', 'avg_dti']
+
+# Breakdown dimension -> query name; the first column of each result is the dimension
+ROLLUP_QUERIES = {
+    'issue_month': 'Month by Year',
+    'loan_status': 'LOAN STATUS',
+    'address_state': 'STATE',
+    'term': 'TERM',
+    'purpose': 'PURPOSE',
+    'emp_length': 'EMPLOYEE LENGTH',
+    'home_ownership': 'HOME OWNERSHIP'
+}
+
+# Result column alias (lower case) -> cube measure name and factor
+RESULT_COLUMNS = {
+    'total_loan_applications': ('count', 1),
+    'loan_count': ('count', 1),
+    'total_funded_amount': ('loan_amount', 1),
+    'total_amount_funded': ('loan_amount', 1),
+    'total_amount_received': ('total_payment', 1),
+    'interest_rate': ('int_rate', 0.01),
+    'dti': ('dti', 0.01)
+}
+
+# MySQL functions SQLite lacks, rewritten into built-in date functions
+MONTH_NAMES = " ".join(f"WHEN {m} THEN '{calendar.month_name[m]}'" for m in range(1, 13))
+DIALECT_SHIMS = {
+    'MONTH': "CAST(strftime('%m', {0}) AS INTEGER)",
+    'YEAR': "CAST(strftime('%Y', {0}) AS INTEGER)",
+    'MONTHNAME': "(CASE CAST(strftime('%m', {0}) AS INTEGER) " + MONTH_NAMES + " END)"
+}
+# Date columns whose month and year are stored next to them at load, so
+# MONTH() and YEAR() read an indexed integer instead of parsing the date
+# text on every row
+DATE_PART_COLUMNS = ['issue_date']
+STORED_DATE_SHIMS = {
+    'MONTH': "{0}_month",
+    'YEAR': "{0}_year",
+    'MONTHNAME': "(CASE {0}_month " + MONTH_NAMES + " END)"
+}
+SHIM_PATTERN = re.compile(r"\b(MONTHNAME|MONTH|YEAR)\s*\(\s*([\w.]+)\s*\)", re.IGNORECASE)
+
+
+def to_sqlite(query, stored_parts=()):
+    """Translate the MySQL-only functions of a query into SQLite.
+
+    The date parts of the columns in `stored_parts` are read from their
+    stored `<column>_month` / `<column>_year` columns.
+    """
+    def shim(match):
+        function, column = match.group(1).upper(), match.group(2)
+        shims = STORED_DATE_SHIMS if column in stored_parts else DIALECT_SHIMS
+        return shims[function].format(column)
+
+    return SHIM_PATTERN.sub(shim, query)
+
+
+def load_named_queries(path=QUERY_FILE):
+    """Read the .sql file into {name: statement}.
+
+    A statement is named after the last comment line above it, e.g.
+    '-- Total Funded Amount'; separator lines of dashes are skipped.
+    """
+    queries, name, lines = {}, None, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            text = line.strip()
+            if text.startswith('--'):
+                title = text.lstrip('-').strip()
+                if title and not lines:
+                    name = title
+                continue
+            if text:
+                lines.append(line.rstrip())
+            if text.endswith(';'):
+                queries[name] = '\n'.join(lines).rstrip(';').strip()
+                name, lines = None, []
+    return queries
+
+
+def kpis_from_values(values):
+    """KPI dict from {KPI key: single value of its query}, with the dashboard's units"""
+    kpis = {}
+    for key, (_, factor) in KPI_QUERIES.items():
+        value = values[key]
+        if key in COUNT_KPIS:
+            kpis[key] = int(value or 0)
+        elif key in MEAN_KPIS:
+            # AVG over no rows is NULL, like the NaN of an empty mean
+            kpis[key] = np.nan if value is None else float(value) * factor
+        else:
+            kpis[key] = float(value or 0) * factor
+    return kpis
+
+
+class ReportBundle:
+    """Every KPI and breakdown of one selection, computed together.
+
+    Answers kpis() and rollup([dim]) like a selection does, from the
+    precomputed results. `results` holds the raw result of every named
+    query when the bundle came from the SQL backend.
+    """
+
+    def __init__(self, kpis, rollups, results=None):
+        self._kpis = kpis
+        self.rollups = rollups
+        self.results = results or {}
+
+    def kpis(self):
+        return self._kpis
+
+    def rollup(self, dims):
+        if len(dims) != 1 or dims[0] not in self.rollups:
+            raise ValueError(f"the report has no breakdown by {dims}")
+        # The figure builders add columns to what they get
+        return self.rollups[dims[0]].copy()
+
+
+class CubeSelection:
+    """A filtered slice of the loan cube, aggregated with pandas"""
+
+    def __init__(self, cube, data_version=None, coded=None):
+        self.cube = cube
+        self.data_version = data_version
+        self._coded = coded
+
+    def kpis(self):
+        if self.data_version is None:
+            return compute_cube_kpis(self.cube)
+        return get_cube_kpis(self.cube, self.data_version)
+
+    def rollup(self, dims):
+        if not dims:
+            return rollup(self.cube, dims)
+        # The dimensions are factorized on the first breakdown; the others reuse the codes
+        if self._coded is None:
+            self._coded = code_cube(self.cube)
+        return rollup_coded(self._coded, dims)
+
+    def report(self):
+        return ReportBundle(self.kpis(), {dim: self.rollup([dim]) for dim in ROLLUP_QUERIES})
+
+
+class CubeBackend:
+    """Answers every KPI and breakdown from the pre-aggregated loan cube"""
+    name = 'pandas'
+
+    def __init__(self, cube, data_version=None):
+        self.cube = cube
+        self.data_version = data_version
+        self._coded = None
+
+    def select(self, filters=None, start_month=None, end_month=None):
+        if not filters and start_month is None and end_month is None:
+            # Only the whole book's KPIs are cached per data version, and
+            # its factorized dimensions are kept for every later selection
+            if self._coded is None:
+                self._coded = code_cube(self.cube)
+            return CubeSelection(self.cube, self.data_version, self._coded)
+        return CubeSelection(slice_cube(self.cube, filters, start_month, end_month))
+
+
+class SQLSelection:
+    """A filtered slice of the loans, aggregated by running the named queries"""
+
+    def __init__(self, backend, where, params):
+        self.backend = backend
+        self.where = where
+        self.params = params
+
+    def kpis(self):
+        """Every KPI, with a single scan shared by all of their queries"""
+        names = [name for name, _ in KPI_QUERIES.values()]
+        results = self.backend.run_batch(names, self.where, self.params)
+        return kpis_from_values({key: results[name].iat[0, 0]
+                                 for key, (name, _) in KPI_QUERIES.items()})
+
+    def rollup(self, dims):
+        """The named breakdown query for one dimension, shaped like loan_cube.rollup"""
+        if len(dims) != 1 or dims[0] not in ROLLUP_QUERIES:
+            raise ValueError(f"no query in '{os.path.basename(QUERY_FILE)}' breaks the loans down by {dims}")
+        return self.shape_rollup(dims[0], self.backend.run(ROLLUP_QUERIES[dims[0]], self.where, self.params))
+
+    def report(self):
+        """Every named query of the report, with one scan per breakdown instead of per query"""
+        results = self.backend.run_batch(list(self.backend.queries), self.where, self.params)
+        kpis = kpis_from_values({key: results[name].iat[0, 0]
+                                 for key, (name, _) in KPI_QUERIES.items()})
+        rollups = {dim: self.shape_rollup(dim, results[name].copy())
+                   for dim, name in ROLLUP_QUERIES.items()}
+        return ReportBundle(kpis, rollups, results)
+
+    def shape_rollup(self, dim, result):
+        """Rename and reorder one breakdown's result like loan_cube.rollup"""
+        if dim == 'issue_month':
+            year, month = result.pop('Year_Number'), result.pop('Month_Number')
+            keep = year.notna() & month.notna()
+            result = result[keep].copy()
+            # Through dates rather than PeriodIndex.from_fields, which needs pandas 2.2
+            months = pd.to_datetime(pd.DataFrame({'year': year[keep].astype(int),
+                                                  'month': month[keep].astype(int), 'day': 1}))
+            result.insert(0, 'issue_month', months.dt.to_period('M').array)
+        else:
+            result = result.rename(columns={result.columns[0]: dim})
+            result = result[result[dim].notna()]
+            # Same row order as a groupby over the loans' categories
+            dtype = self.backend.dtypes.get(dim)
+            if isinstance(dtype, pd.CategoricalDtype):
+                result[dim] = result[dim].astype(dtype)
+                result = result.sort_values(dim, kind='stable')
+        for column in list(result.columns[1:]):
+            measure, factor = RESULT_COLUMNS.get(column.lower(), (column, 1))
+            result[measure] = result.pop(column).astype('float64') * factor
+        result['count'] = result['count'].astype('int64')
+        return result.reset_index(drop=True)
+
+
+class SQLiteBackend:
+    """Runs the report's MySQL queries on an embedded SQLite copy of the loans.
+
+    The loans live in one indexed table (in memory, or in a file at
+    `path`, which lets the aggregation run on more loans than fit in
+    pandas). `frames` is a DataFrame or an iterable of chunks, e.g. from
+    read_csv_chunks (with `deduplicate`, as the CSV may repeat loans). A
+    file that already holds `data_version` is used as it is, without
+    reading `frames`. One connection is shared by all request threads,
+    one query at a time.
+    """
+    name = 'sql'
+
+    def __init__(self, frames, path=':memory:', query_file=QUERY_FILE, data_version=None, deduplicate=False):
+        self.queries = {name: to_sqlite(query, DATE_PART_COLUMNS)
+                        for name, query in load_named_queries(query_file).items()}
+        self.dtypes = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # The shared scans' cells are temporary tables; keep them off the disk
+        self._conn.execute("PRAGMA temp_store = MEMORY")
+        self.reused = data_version is not None and stored_version(self._conn) == repr(data_version)
+        if not self.reused:
+            self._load(frames, data_version, deduplicate)
+        self._categorical_dtypes()
+
+    def _load(self, frames, data_version, deduplicate):
+        self._conn.execute(f"DROP TABLE IF EXISTS {SQL_META_TABLE}")
+        self._conn.execute(f"DROP TABLE IF EXISTS {SQL_TABLE}")
+        # A frame goes in a chunk at a time too, so only one chunk is ever
+        # converted to Python objects
+        for chunk in (frame_chunks(frames) if isinstance(frames, pd.DataFrame) else frames):
+            self._insert(chunk)
+        if deduplicate:
+            # Straight from the CSV, loans re-sent by `clean_data.py --delta`
+            # batches are still repeated; keep the last copy, like read_cleaned_csv
+            self._conn.execute(f"DELETE FROM {SQL_TABLE} WHERE rowid NOT IN "
+                               f"(SELECT MAX(rowid) FROM {SQL_TABLE} GROUP BY id)")
+        self._create_indexes()
+        # Written last, so a load that was cut short is never taken as complete
+        self._conn.execute(f"CREATE TABLE {SQL_META_TABLE} (data_version TEXT)")
+        self._conn.execute(f"INSERT INTO {SQL_META_TABLE} VALUES (?)",
+                           (None if data_version is None else repr(data_version),))
+        self._conn.commit()
+
+    def _categorical_dtypes(self):
+        """Categories of the filter columns that did not come in as categoricals (e.g. read in chunks)"""
+        for col in INDEXED_COLUMNS:
+            if not isinstance(self.dtypes.get(col), pd.CategoricalDtype):
+                # Sorted, like the categories load_cleaned_data gives them
+                values = self._conn.execute(f"SELECT DISTINCT {col} FROM {SQL_TABLE} "
+                                            f"WHERE {col} IS NOT NULL ORDER BY {col}").fetchall()
+                self.dtypes[col] = pd.CategoricalDtype([value for value, in values])
+
+    def row_count(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {SQL_TABLE}").fetchone()[0]
+
+    def _insert(self, chunk):
+        chunk = chunk[SQL_COLUMNS]
+        for col in SQL_COLUMNS:
+            self.dtypes.setdefault(col, chunk[col].dtype)
+        rows = chunk.astype(object)
+        for col in DATE_PART_COLUMNS:
+            dates = pd.to_datetime(chunk[col], errors='coerce')
+            # Dates as ISO text, which SQLite's date functions and comparisons understand
+            rows[col] = dates.dt.strftime('%Y-%m-%d')
+            rows[f"{col}_month"] = dates.dt.month.astype('Int64').astype(object)
+            rows[f"{col}_year"] = dates.dt.year.astype('Int64').astype(object)
+        rows.to_sql(SQL_TABLE, self._conn, if_exists='append', index=False)
+
+    def _create_indexes(self):
+        for col in INDEXED_COLUMNS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{col} ON {SQL_TABLE} ({col})")
+        for col in DATE_PART_COLUMNS:
+            # The MTD / PMTD queries select by month, the date filters by date
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{col}_month ON {SQL_TABLE} ({col}_month)")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{col} ON {SQL_TABLE} ({col})")
+        self._conn.execute("ANALYZE")
+        self._conn.commit()
+
+    def run(self, name, where='', params=()):
+        """Run one named query over the loans matching `where` and return its result"""
+        sql = (f"WITH {QUERY_TABLE} AS (SELECT * FROM {SQL_TABLE}{where}) "
+               + self.queries[name])
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def run_batch(self, names, where='', params=()):
+        """Run several named queries over the loans matching `where`, sharing their scans.
+
+        The queries are planned into one scan per distinct GROUP BY (see
+        query_batch.compile_batch); each scan aggregates the loans into a
+        few cells, which its queries then read. Returns {name: result}.
+        """
+        names = tuple(names)
+        if names not in self._batches:
+            self._batches[names] = compile_batch({name: self.queries[name] for name in names})
+        results = {}
+        with self._lock:
+            for cells_table, cells_sql, rewritten in self._batches[names]:
+                self._conn.execute(f"DROP TABLE IF EXISTS temp.{cells_table}")
+                self._conn.execute(f"CREATE TEMP TABLE {cells_table} AS WITH {QUERY_TABLE} AS "
+                                   f"(SELECT * FROM {SQL_TABLE}{where}) {cells_sql}", params)
+                try:
+                    for name, sql in rewritten.items():
+                        cursor = self._conn.execute(sql)
+                        columns = [c[0] for c in cursor.description]
+                        results[name] = pd.DataFrame(cursor.fetchall(), columns=columns)
+                finally:
+                    self._conn.execute(f"DROP TABLE temp.{cells_table}")
+        return results
+
+    def select(self, filters=None, start_month=None, end_month=None):
+        """The loans matching `filters` and the issue-month range (see loan_cube.slice_cube)"""
+        clauses, params = [], []
+        for dim, value in (filters or {}).items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            clauses.append(f"{dim} IN ({', '.join('?' * len(values))})")
+            params.extend(str(v) for v in values)
+        if start_month is not None:
+            clauses.append("issue_date >= ?")
+            params.append(pd.Period(start_month, freq='M').start_time.strftime('%Y-%m-%d'))
+        if end_month is not None:
+            clauses.append("issue_date < ?")
+            params.append((pd.Period(end_month, freq='M') + 1).start_time.strftime('%Y-%m-%d'))
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return SQLSelection(self, where, tuple(params))
+
+    def close(self):
+        self._conn.close()
+
+
+# Query backends the dashboard can be switched between
+BACKENDS = ['pandas', 'sql']
+
+
+def stored_version(conn):
+    """The data version of the loans in an SQLite database, or None"""
+    try:
+        row = conn.execute(f"SELECT data_version FROM {SQL_META_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def read_csv_chunks(csv_path, chunksize=SQL_LOAD_CHUNKSIZE):
+    """The SQL_COLUMNS of a cleaned CSV, a chunk at a time, so it never has to fit in memory"""
+    return pd.read_csv(csv_path, usecols=SQL_COLUMNS, chunksize=chunksize)
+
+
+def frame_chunks(df, chunksize=SQL_LOAD_CHUNKSIZE):
+    return (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+
+
+def database_path(cache_dir, data_version):
+    """The SQLite file of one data version of the loans, under the column cache"""
+    name = hashlib.sha1(repr(data_version).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, SQL_DATABASE_DIR, f"loans-{name}.sqlite")
+
+
+def database_ready(path, data_version):
+    """Whether the SQLite file at `path` holds exactly this data version"""
+    if not os.path.exists(path):
+        return False
+    conn = sqlite3.connect(path)
+    try:
+        return stored_version(conn) == repr(data_version)
+    finally:
+        conn.close()
+
+
+def prepare_database(df, cache_dir, data_version):
+    """Bring the SQLite file of `data_version` up to date and delete those of older versions.
+
+    Processes still reading a deleted file keep their open copy of it.
+    """
+    path = database_path(cache_dir, data_version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    backend = SQLiteBackend(df, path=path, data_version=data_version)
+    backend.close()
+    for name in os.listdir(os.path.dirname(path)):
+        if name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass
+    return path
+
+
+def make_backend(name, df, cube=None, data_version=None, cache_dir=None, build=True):
+    """Create the named query backend for one copy of the loan data.
+
+    With a `cache_dir` (and a data version), the sql backend opens that
+    version's database file there, so a restart or another process reuses
+    it instead of copying the loans again. The file is written first if
+    needed, unless `build` is off (serve.py's workers, whose files are
+    written by its prepare step); the loans are then loaded into memory.
+    """
+    if name == 'pandas':
+        return CubeBackend(build_cube(df) if cube is None else cube, data_version)
+    if name == 'sql':
+        if cache_dir is None or data_version is None:
+            return SQLiteBackend(df)
+        path = database_path(cache_dir, data_version)
+        if build:
+            prepare_database(df, cache_dir, data_version)
+        elif not database_ready(path, data_version):
+            print(f"⚠️  No prepared SQLite file for this data in '{cache_dir}'; loading the loans into memory")
+            return SQLiteBackend(df)
+        return SQLiteBackend(df, path=path, data_version=data_version)
+    raise ValueError(f"unknown query backend '{name}', expected one of {BACKENDS}")
+
+
+def compare_selections(expected, actual, rtol=1e-6):
+    """Differences between the KPIs and breakdowns of two selections, as text lines"""
+    differences = []
+    a, b = expected.kpis(), actual.kpis()
+    for key in KPI_QUERIES:
+        if not np.isclose(a[key], b[key], rtol=rtol, equal_nan=True):
+            differences.append(f"{key}: {a[key]!r} != {b[key]!r}")
+    for dim in ROLLUP_QUERIES:
+        left, right = expected.rollup([dim]), actual.rollup([dim])
+        columns = list(right.columns)
+        try:
+            pd.testing.assert_frame_equal(left[columns].astype({dim: str}), right.astype({dim: str}),
+                                          check_dtype=False, rtol=rtol)
+        except AssertionError as e:
+            differences.append(f"{dim}: {str(e).splitlines()[0]}")
+    return differences
+
+
+def check_selections(cube):
+    """The whole book plus a few filtered slices of it, to compare the backends on"""
+    def first(dim, n):
+        return [str(v) for v in cube[dim].dropna().unique()[:n]]
+
+    months = cube['issue_month'].dropna().sort_values()
+    last = str(months.iloc[-1]) if len(months) else None
+    return [
+        {},
+        {'filters': {'loan_status': first('loan_status', 1)}},
+        {'filters': {'term': first('term', 1)}, 'start_month': str(months.iloc[0]) if last else None,
+         'end_month': last},
+        {'filters': {'address_state': first('address_state', 3), 'purpose': first('purpose', 2)}},
+        {'start_month': last}
+    ]
+
+
+def main(argv=None):
+    from loan_data import CLEANED_FILE_PATH, load_cleaned_data, source_signature
+
+    parser = argparse.ArgumentParser(description="Run the report's SQL queries on the cleaned loans.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH, help="cleaned loan CSV")
+    parser.add_argument('--database', default=':memory:',
+                        help="SQLite file to stream the loans into (kept and reused while the CSV is unchanged)")
+    parser.add_argument('--check', action='store_true',
+                        help="verify that the SQL and pandas backends give the same results")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.database != ':memory:' and not args.check and os.path.isfile(args.data):
+        # Out of core: the CSV goes into the file chunk by chunk, and only
+        # when the file does not hold this copy of it yet. The version is
+        # load_cleaned_data's for the same CSV.
+        source = source_signature(args.data)
+        data_version = (source['path'], source['mtime_ns'], source['size'])
+        sql = SQLiteBackend(read_csv_chunks(args.data), path=args.database, data_version=data_version,
+                            deduplicate=True)
+    else:
+        df, data_version = load_cleaned_data(args.data, show_memory=False)
+        start = time.perf_counter()
+        sql = SQLiteBackend(df, path=args.database, data_version=data_version)
+    print(f"🗄️  {'Reused' if sql.reused else 'Loaded'} {sql.row_count():,} loans in SQLite "
+          f"in {time.perf_counter() - start:.2f}s")
+    if not args.check:
+        for key, value in sql.select().kpis().items():
+            print(f"  {key:<25} {value:,.2f}")
+        return 0
+
+    pandas_backend = make_backend('pandas', df)
+    failed = 0
+    for selection in check_selections(pandas_backend.cube):
+        expected = pandas_backend.select(**selection)
+        # Both the query-by-query path and the shared-scan report
+        differences = (compare_selections(expected, sql.select(**selection))
+                       + compare_selections(expected, sql.select(**selection).report()))
+        print(f"{'❌' if differences else '✅'} {selection or 'all loans'}")
+        for line in differences:
+            print(f"     {line}")
+        failed += bool(differences)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# query_batch.py
+
+import re
+
+# Shape of every statement in 'Query MySql File.sql': one SELECT over the
+# loan table, optionally filtered, grouped and ordered
+STATEMENT_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<items>.*?)\s+FROM\s+(?P<table>\w+)"
+    r"(?:\s+WHERE\s+(?P<where>.*?))?(?:\s+GROUP\s+BY\s+(?P<group>.*?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.*?))?\s*$",
+    re.IGNORECASE | re.DOTALL)
+AGGREGATE_PATTERN = re.compile(r"\b(COUNT|SUM|AVG)\s*\(", re.IGNORECASE)
+ALIAS_PATTERN = re.compile(r"^(?P<expr>.*\S)\s+AS\s+(?P<alias>\w+)$", re.IGNORECASE | re.DOTALL)
+
+# Temporary table holding the partial aggregates of one shared scan
+CELLS_TABLE = 'report_cells_{0}'
+
+
+def _outside_quotes(text):
+    """Yield (index, char, quoted) for every character of a SQL fragment"""
+    quoted = False
+    for i, ch in enumerate(text):
+        if ch == "'":
+            quoted = not quoted
+        yield i, ch, quoted
+
+
+def normalize(expr):
+    """One spelling per expression: lower case and no optional spaces, except inside literals"""
+    out = []
+    for _, ch, quoted in _outside_quotes(' '.join(expr.split())):
+        out.append(ch if quoted or ch == "'" else ch.lower())
+    text = ''.join(out)
+    return re.sub(r"\s*([(),=*/+<>-])\s*", r"\1", text)
+
+
+def split_top_level(text):
+    """Split a comma-separated SQL list, ignoring commas inside parentheses and quotes"""
+    parts, depth, start = [], 0, 0
+    for i, ch, quoted in _outside_quotes(text):
+        if quoted:
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return [p for p in parts if p]
+
+
+def _closing_paren(text, open_index):
+    depth = 0
+    for i, ch, quoted in _outside_quotes(text):
+        if i < open_index or quoted:
+            continue
+        depth += (ch == '(') - (ch == ')')
+        if depth == 0:
+            return i
+    raise ValueError(f"unbalanced parentheses in {text!r}")
+
+
+def find_aggregates(expr):
+    """(start, end, function, argument) of every aggregate call in an expression"""
+    calls, pos = [], 0
+    while True:
+        match = AGGREGATE_PATTERN.search(expr, pos)
+        if match is None:
+            return calls
+        close = _closing_paren(expr, match.end() - 1)
+        calls.append((match.start(), close + 1, match.group(1).upper(), expr[match.end():close].strip()))
+        pos = close + 1
+
+
+def parse_statement(sql):
+    """Split one statement into its select items, WHERE, GROUP BY and ORDER BY parts"""
+    match = STATEMENT_PATTERN.match(sql)
+    if match is None:
+        raise ValueError(f"not a single-table SELECT: {sql!r}")
+    items = []
+    for item in split_top_level(match.group('items')):
+        alias = ALIAS_PATTERN.match(item)
+        items.append((alias.group('expr'), alias.group('alias')) if alias else (item, None))
+    return {
+        'table': match.group('table'),
+        'items': items,
+        'where': match.group('where'),
+        'group': split_top_level(match.group('group') or ''),
+        'order': split_top_level(match.group('order') or '')
+    }
+
+
+def compile_scan(parsed, cells_table):
+    """Rewrite parsed statements so that they all read the cells of one scan.
+
+    Returns (cells_sql, rewritten). Running `cells_sql` scans the table
+    once, grouped by the union of the statements' GROUP BY expressions,
+    keeping the partial COUNT / SUM of every distinct aggregate. A WHERE
+    condition moves into the aggregates it filters (SUM(CASE WHEN cond
+    THEN x END)), so statements that differ only in their condition share
+    the scan. `rewritten` maps each name to an equivalent statement over
+    the cells in `cells_table`. AVG is kept as a sum plus a count, so it
+    re-aggregates exactly.
+    """
+    keys, partials = {}, {}  # normalized expression -> (cells column, definition)
+
+    def column_for(registry, prefix, expr):
+        norm = normalize(expr)
+        if norm not in registry:
+            registry[norm] = (f"{prefix}{len(registry)}", expr)
+        return registry[norm][0]
+
+    def partial(function, argument, condition):
+        if condition:
+            argument = f"CASE WHEN {condition} THEN {'1' if argument == '*' else argument} END"
+        return column_for(partials, 'a', f"{function}({argument})")
+
+    def reaggregate(function, argument, condition):
+        if function == 'AVG':
+            total = partial('SUM', argument, condition)
+            count = partial('COUNT', argument, condition)
+            return f"(SUM({total}) * 1.0 / SUM({count}))"
+        column = partial(function, argument, condition)
+        return f"COALESCE(SUM({column}), 0)" if function == 'COUNT' else f"SUM({column})"
+
+    def rewrite(expr, group_keys, condition):
+        if normalize(expr) in group_keys:
+            return column_for(keys, 'k', expr)
+        calls = find_aggregates(expr)
+        if not calls:
+            raise ValueError(f"{expr!r} is neither grouped nor aggregated")
+        out, pos = [], 0
+        for start, end, function, argument in calls:
+            out.append(expr[pos:start])
+            out.append(reaggregate(function, argument, condition))
+            pos = end
+        out.append(expr[pos:])
+        return ''.join(out)
+
+    rewritten = {}
+    for name, p in parsed.items():
+        group_keys = {normalize(g) for g in p['group']}
+        condition = p['where']
+        items = [rewrite(expr, group_keys, condition) + (f" AS {alias}" if alias else f" AS \"{expr}\"")
+                 for expr, alias in p['items']]
+        sql = f"SELECT {', '.join(items)} FROM {cells_table}"
+        if p['group']:
+            sql += f" GROUP BY {', '.join(column_for(keys, 'k', g) for g in p['group'])}"
+            if condition:
+                # Only the groups with rows meeting the condition, as WHERE would leave
+                sql += f" HAVING SUM({partial('COUNT', '*', condition)}) > 0"
+        if p['order']:
+            sql += f" ORDER BY {', '.join(rewrite(o, group_keys, condition) for o in p['order'])}"
+        rewritten[name] = sql
+
+    definitions = list(keys.values()) + list(partials.values())
+    cells_sql = (f"SELECT {', '.join(f'{expr} AS {column}' for column, expr in definitions)} "
+                 f"FROM {parsed[next(iter(parsed))]['table']}")
+    if keys:
+        cells_sql += f" GROUP BY {', '.join(column for column, _ in keys.values())}"
+    return cells_sql, rewritten
+
+
+def compile_batch(queries):
+    """Plan named statements over one table as one shared scan per distinct GROUP BY.
+
+    All statements without a GROUP BY (the KPI totals with their MTD,
+    PMTD, good and bad variants) share one scan, and so do statements
+    grouped the same way. Different groupings are not merged: SQLite
+    groups by sorting, and sorting the rows on the combined keys costs
+    more than scanning them once per grouping. Returns a list of
+    (cells_table, cells_sql, rewritten), see compile_scan.
+    """
+    parsed = {name: parse_statement(sql) for name, sql in queries.items()}
+    tables = {p['table'].lower() for p in parsed.values()}
+    if len(tables) != 1:
+        raise ValueError(f"a batch must read a single table, not {sorted(tables)}")
+
+    scans = {}  # normalized GROUP BY expressions -> {name: parsed statement}
+    for name, p in parsed.items():
+        scans.setdefault(frozenset(normalize(g) for g in p['group']), {})[name] = p
+
+    plan = []
+    for i, members in enumerate(scans.values()):
+        cells_table = CELLS_TABLE.format(i)
+        plan.append((cells_table,) + compile_scan(members, cells_table))
+    return plan
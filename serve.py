@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Bank Loan Analytics - Production Server
+Serves the dashboard from several gunicorn worker processes. The column
+cache and the loan cube are prepared once up front; every worker then
+memory-maps the same read-only files, so each extra worker adds little
+memory on top of the first. When the CSV changes, the caches are rebuilt
+in the background and every worker switches over to them on its own.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+# Imported before the workers are forked, so they share these modules too
+import bank_loan_dashboard
+from loan_cube import read_source_cube, write_cube_cache
+from loan_data import (CACHE_META_FILE, CLEANED_FILE_PATH, cache_dir_for, file_state,
+                       load_cleaned_data, watch_for_changes)
+from parallel_agg import DEFAULT_WORKERS as DEFAULT_AGG_WORKERS, build_cube_parallel
+from query_backend import prepare_database
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is optional and does not run on Windows
+    BaseApplication = None
+
+DEFAULT_WORKERS = int(os.environ.get('DASHBOARD_WORKERS', os.cpu_count() or 1))
+# Sub-directory of the column cache where the workers share their /metrics
+METRICS_DIR = 'metrics'
+# ...and where they track the background jobs building filtered views
+JOBS_DIR = 'jobs'
+DEFAULT_THREADS = 4
+REQUEST_TIMEOUT = 120  # seconds
+
+
+def prepare_shared_data(csv_path, agg_workers=DEFAULT_AGG_WORKERS, backend='pandas'):
+    """Bring the column cache and its cube (and the sql backend's database) up to date for the workers"""
+    df, data_version = load_cleaned_data(csv_path, show_memory=False, mmap=True)
+    cache_dir = cache_dir_for(csv_path)
+    if backend == 'sql':
+        # Before the cube, whose rewrite is what tells the workers to reload
+        path = prepare_database(df, cache_dir, data_version)
+        print(f"SQLite database: '{path}'")
+    # clean_data.py stores a cube with every partition of a directory
+    if read_source_cube(csv_path, mmap=True) is None and not os.path.isdir(csv_path):
+        cube = build_cube_parallel(df, agg_workers)
+        write_cube_cache(cube, cache_dir)
+        print(f"Cube cache: {len(cube):,} cells written to '{cache_dir}'")
+    return len(df)
+
+
+def refresh_shared_data(csv_path, agg_workers=DEFAULT_AGG_WORKERS, backend='pandas'):
+    """Run prepare_shared_data in a separate process, so this one never holds the data.
+
+    A plain subprocess rather than a process pool: gunicorn's master reaps
+    every child that exits, which a pool does not expect. The subprocess
+    runs its own pool of `agg_workers` for the cube.
+    """
+    result = subprocess.run([sys.executable, os.path.abspath(__file__),
+                             '--prepare-only', '--data', csv_path, '--agg-workers', str(agg_workers),
+                             '--backend', backend])
+    return result.returncode == 0
+
+
+def shared_source_state(csv_path):
+    """The CSV and its column cache; either one changing means the shared data is stale"""
+    return (file_state(csv_path), file_state(os.path.join(cache_dir_for(csv_path), CACHE_META_FILE)))
+
+
+def start_source_watcher(csv_path, interval, agg_workers=DEFAULT_AGG_WORKERS, backend='pandas'):
+    """Refresh the shared caches whenever the data changes; each worker then reloads by itself"""
+    def refresh(state):
+        print("🔄 Data source changed, refreshing the shared data...")
+        if not refresh_shared_data(csv_path, agg_workers, backend):
+            raise RuntimeError("preparing the shared data failed")
+        # Preparing rewrites the cache, which is not a change of its own
+        return shared_source_state(csv_path)
+
+    initial = shared_source_state(csv_path)
+    threading.Thread(target=watch_for_changes,
+                     args=(lambda: shared_source_state(csv_path), refresh, interval),
+                     kwargs={'initial': initial}, name='watch-data', daemon=True).start()
+
+
+def gunicorn_app(csv_path, options, reload_interval, backend, metrics_dir=None, jobs_dir=None):
+    """A gunicorn application whose every worker serves create_app(shared=True)"""
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Runs in each worker after the fork, so the loading thread is the worker's own
+            return bank_loan_dashboard.create_app(csv_path, shared=True, reload_interval=reload_interval,
+                                                  backend=backend, metrics_dir=metrics_dir,
+                                                  jobs_dir=jobs_dir).server
+
+    return DashboardApplication()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard with several worker processes.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH, help="cleaned loan CSV to serve")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="worker processes (default: $DASHBOARD_WORKERS or one per CPU core)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help="request threads per worker")
+    parser.add_argument('--reload-interval', type=float,
+                        default=bank_loan_dashboard.RELOAD_CHECK_INTERVAL,
+                        help="seconds between checks for changed data (0 = never reload)")
+    parser.add_argument('--backend', choices=bank_loan_dashboard.BACKENDS,
+                        default=bank_loan_dashboard.QUERY_BACKEND,
+                        help="what computes the KPIs and charts (default: $DASHBOARD_BACKEND or pandas)")
+    parser.add_argument('--agg-workers', type=int, default=DEFAULT_AGG_WORKERS,
+                        help="processes building the loan cube (default: $DASHBOARD_AGG_WORKERS or 1, "
+                             "0 = one per CPU core)")
+    parser.add_argument('--prepare-only', action='store_true',
+                        help="only bring the shared caches up to date, then exit")
+    args = parser.parse_args(argv)
+
+    csv_path = os.path.abspath(args.data)
+    if args.prepare_only:
+        rows = prepare_shared_data(csv_path, args.agg_workers, args.backend)
+        print(f"✅ {rows:,} loans ready to be shared")
+        return 0
+
+    if BaseApplication is None:
+        print("❌ serve.py needs gunicorn (pip install gunicorn), which is not available on Windows.")
+        print("   Use 'python bank_loan_dashboard.py' to run the single-process server instead.")
+        return 1
+
+    print("🔧 Preparing shared loan data...")
+    if not refresh_shared_data(csv_path, args.agg_workers, args.backend):
+        print("⚠️  Could not prepare the shared data; workers will load their own copy")
+
+    options = {
+        'bind': f"{args.host}:{args.port}",
+        'workers': max(1, args.workers),
+        'threads': max(1, args.threads),
+        'worker_class': 'gthread',
+        'timeout': REQUEST_TIMEOUT
+    }
+    if args.reload_interval:
+        options['when_ready'] = lambda server: start_source_watcher(csv_path, args.reload_interval,
+                                                                    args.agg_workers, args.backend)
+    # Every worker writes its metrics here, so /metrics covers all of them
+    # whichever one answers; the counters start over with the server
+    metrics_dir = os.path.join(cache_dir_for(csv_path), METRICS_DIR)
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    # Any worker can follow a view job another one started; none outlive the server
+    jobs_dir = os.path.join(cache_dir_for(csv_path), JOBS_DIR)
+    shutil.rmtree(jobs_dir, ignore_errors=True)
+    print(f"🚀 Serving on http://{args.host}:{args.port}/ with {options['workers']} workers "
+          f"(metrics at /metrics)")
+    gunicorn_app(csv_path, options, args.reload_interval, args.backend, metrics_dir, jobs_dir).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,51 +2,79 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs
 import numpy as np
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from agg_engine import CodedFrame
+from kpi_engine import BAD_LOAN_STATUSES, GOOD_LOAN_STATUSES
+from loan_data import load_cleaned_data
+from time_rollups import GRANULARITIES, build_pyramid
+from generate_loan_data import generate_sample_data
 
 # Load the cleaned data
 try:
-    df = pd.read_csv('cleaned_financial_loan.csv')
-    # Convert date columns back to datetime
-    date_columns = ['issue_date', 'last_credit_pull_date', 'last_payment_date', 'next_payment_date']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce')
+    # Uses the columnar cache written by clean_data.py when it is up to date
+    df, _ = load_cleaned_data()
     print("Data loaded successfully!")
 except Exception as e:
     print(f"Error loading data: {e}")
     print("Creating sample data for demonstration...")
     # Create sample data for demonstration
-    np.random.seed(42)
     n = 1000
-    df = pd.DataFrame({
-        'id': range(1, n+1),
-        'loan_amount': np.random.uniform(5000, 50000, n),
-        'total_payment': np.random.uniform(6000, 60000, n),
-        'int_rate': np.random.uniform(0.05, 0.25, n),
-        'dti': np.random.uniform(0.1, 0.8, n),
-        'issue_date': pd.date_range('2023-01-01', periods=n, freq='D'),
-        'loan_status': np.random.choice(['Fully Paid', 'Current', 'Charged Off'], n, p=[0.6, 0.3, 0.1]),
-        'address_state': np.random.choice(['CA', 'TX', 'NY', 'FL', 'IL'], n),
-        'term': np.random.choice(['36 months', '60 months'], n),
-        'emp_length': np.random.choice(['< 1 year', '1 year', '2 years', '3 years', '4 years', '5 years', '6 years', '7 years', '8 years', '9 years', '10+ years'], n),
-        'purpose': np.random.choice(['debt_consolidation', 'credit_card', 'home_improvement', 'major_purchase', 'medical', 'car', 'vacation', 'wedding'], n),
-        'home_ownership': np.random.choice(['RENT', 'OWN', 'MORTGAGE'], n)
-    })
+    df = generate_sample_data(n, seed=42)
 
 print(f"Dataset shape: {df.shape}")
 print(f"Columns: {list(df.columns)}")
 
+# How the generated HTML files get plotly.js (several MB):
+#   True        - embed the whole bundle in every file (self-contained)
+#   'directory' - write one shared plotly.min.js next to the reports
+#   'cdn'       - load it from the plotly CDN
+#   None        - don't write per-chart files (single-page report mode)
+PLOTLYJS_MODE = True
+PLOTLYJS_CHOICES = {'inline': True, 'shared': 'directory', 'cdn': 'cdn'}
+REPORT_PAGE_PATH = 'loan_report.html'
+
+# Period of the trends chart: one of time_rollups.GRANULARITIES
+TREND_GRANULARITY = 'M'
+
+# Columns the charts break the loans down by, and the measures they add up
+CHART_DIMENSIONS = ['loan_status', 'address_state', 'purpose', 'term', 'emp_length', 'home_ownership']
+CHART_MEASURES = ['loan_amount', 'total_payment', 'int_rate', 'dti']
+_coded = None
+
+def coded_loans():
+    """`df` with its chart dimensions factorized, built on first use and whenever `df` is replaced"""
+    global _coded
+    if _coded is None or _coded[0] is not df:
+        _coded = (df, CodedFrame(df, CHART_DIMENSIONS, CHART_MEASURES))
+    return _coded[1]
+
+def save_chart(fig, filename, label):
+    """Write one chart's HTML file according to PLOTLYJS_MODE"""
+    if PLOTLYJS_MODE is None:
+        return
+    fig.write_html(filename, include_plotlyjs=PLOTLYJS_MODE)
+    print(f"✅ {label} saved as '{filename}'")
+
 # 1. KPI Summary Chart
 def create_kpi_summary():
     """Create a summary chart showing key KPIs"""
+    # Loans per status, added up from the coded frame the other charts share
+    by_status = coded_loans().aggregate(['loan_status'], count='count')
+    statuses = by_status['loan_status'].astype(str)
     kpis = {
         'Metric': ['Total Applications', 'Total Funded ($)', 'Total Received ($)', 'Good Loan %', 'Bad Loan %', 'Avg Interest Rate %', 'Avg DTI %'],
         'Value': [
             len(df),
             df['loan_amount'].sum(),
             df['total_payment'].sum(),
-            (len(df[df['loan_status'].isin(['Fully Paid', 'Current'])] / len(df)) * 100,
-            (len(df[df['loan_status'] == 'Charged Off']) / len(df)) * 100,
+            (by_status['count'][statuses.isin(GOOD_LOAN_STATUSES)].sum() / len(df)) * 100,
+            (by_status['count'][statuses.isin(BAD_LOAN_STATUSES)].sum() / len(df)) * 100,
             df['int_rate'].mean() * 100,
             df['dti'].mean() * 100
         ]
@@ -69,24 +97,20 @@ def create_kpi_summary():
         showlegend=False
     )
     
-    fig.write_html("kpi_summary.html")
-    print("✅ KPI Summary chart saved as 'kpi_summary.html'")
+    save_chart(fig, "kpi_summary.html", "KPI Summary chart")
     return fig
 
-# 2. Monthly Trends Chart
+# 2. Trends Chart
 def create_monthly_trends():
-    """Create monthly trends chart"""
-    monthly_data = df.groupby(df['issue_date'].dt.to_period('M')).agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum'
-    }).reset_index()
-    
-    monthly_data['issue_date'] = monthly_data['issue_date'].astype(str)
+    """Create trends chart at TREND_GRANULARITY (monthly by default)"""
+    # Summed up from daily totals rather than grouped from the rows
+    monthly_data = build_pyramid(df).level(TREND_GRANULARITY).rename(columns={'count': 'id'})
+    monthly_data['issue_date'] = monthly_data['period'].astype(str)
+    label = GRANULARITIES[TREND_GRANULARITY]
     
     fig = make_subplots(
         rows=2, cols=1,
-        subplot_titles=('Monthly Loan Applications', 'Monthly Amounts ($)'),
+        subplot_titles=(f'{label} Loan Applications', f'{label} Amounts ($)'),
         vertical_spacing=0.1
     )
     
@@ -108,21 +132,15 @@ def create_monthly_trends():
         row=2, col=1
     )
     
-    fig.update_layout(height=600, showlegend=True, title_text="Monthly Trends Analysis")
-    fig.write_html("monthly_trends.html")
-    print("✅ Monthly Trends chart saved as 'monthly_trends.html'")
+    fig.update_layout(height=600, showlegend=True, title_text=f"{label} Trends Analysis")
+    save_chart(fig, "monthly_trends.html", f"{label} Trends chart")
     return fig
 
 # 3. Loan Status Analysis
 def create_loan_status_analysis():
     """Create comprehensive loan status analysis"""
-    status_data = df.groupby('loan_status').agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum',
-        'int_rate': 'mean',
-        'dti': 'mean'
-    }).reset_index()
+    status_data = coded_loans().aggregate(['loan_status'], sums=['loan_amount', 'total_payment'],
+                                          means=['int_rate', 'dti'], count='id')
     
     fig = make_subplots(
         rows=2, cols=2,
@@ -161,18 +179,14 @@ def create_loan_status_analysis():
     )
     
     fig.update_layout(height=700, showlegend=False, title_text="Loan Status Analysis")
-    fig.write_html("loan_status_analysis.html")
-    print("✅ Loan Status Analysis chart saved as 'loan_status_analysis.html'")
+    save_chart(fig, "loan_status_analysis.html", "Loan Status Analysis chart")
     return fig
 
 # 4. Geographic Analysis
 def create_geographic_analysis():
     """Create geographic analysis charts"""
-    state_data = df.groupby('address_state').agg({
-        'id': 'count',
-        'loan_amount': 'sum',
-        'total_payment': 'sum'
-    }).reset_index()
+    state_data = coded_loans().aggregate(['address_state'], sums=['loan_amount', 'total_payment'],
+                                         count='id')
     
     fig = make_subplots(
         rows=1, cols=2,
@@ -193,23 +207,23 @@ def create_geographic_analysis():
     )
     
     fig.update_layout(height=500, showlegend=True, title_text="Geographic Analysis by State")
-    fig.write_html("geographic_analysis.html")
-    print("✅ Geographic Analysis chart saved as 'geographic_analysis.html'")
+    save_chart(fig, "geographic_analysis.html", "Geographic Analysis chart")
     return fig
 
 # 5. Good vs Bad Loan Analysis
 def create_good_vs_bad_analysis():
     """Create good vs bad loan comparison"""
-    good_loans = df[df['loan_status'].isin(['Fully Paid', 'Current'])]
-    bad_loans = df[df['loan_status'] == 'Charged Off']
+    status_data = coded_loans().aggregate(['loan_status'], sums=['loan_amount'], count='id')
+    good_loans = status_data[status_data['loan_status'].isin(['Fully Paid', 'Current'])]
+    bad_loans = status_data[status_data['loan_status'] == 'Charged Off']
     
     comparison_data = pd.DataFrame({
         'Category': ['Good Loans', 'Bad Loans'],
-        'Count': [len(good_loans), len(bad_loans)],
+        'Count': [good_loans['id'].sum(), bad_loans['id'].sum()],
         'Amount': [good_loans['loan_amount'].sum(), bad_loans['loan_amount'].sum()],
         'Percentage': [
-            (len(good_loans) / len(df)) * 100,
-            (len(bad_loans) / len(df)) * 100
+            (good_loans['id'].sum() / len(df)) * 100,
+            (bad_loans['id'].sum() / len(df)) * 100
         ]
     })
     
@@ -241,36 +255,26 @@ def create_good_vs_bad_analysis():
     )
     
     fig.update_layout(height=500, showlegend=False, title_text="Good vs Bad Loan Analysis")
-    fig.write_html("good_vs_bad_analysis.html")
-    print("✅ Good vs Bad Loan Analysis chart saved as 'good_vs_bad_analysis.html'")
+    save_chart(fig, "good_vs_bad_analysis.html", "Good vs Bad Loan Analysis chart")
     return fig
 
 # 6. Categorical Analysis
 def create_categorical_analysis():
     """Create categorical analysis charts"""
+    coded = coded_loans()
+    
     # Purpose analysis
-    purpose_data = df.groupby('purpose').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index().sort_values('id', ascending=False).head(10)
+    purpose_data = coded.aggregate(['purpose'], sums=['loan_amount'], count='id').sort_values(
+        'id', ascending=False).head(10)
     
     # Term analysis
-    term_data = df.groupby('term').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    term_data = coded.aggregate(['term'], sums=['loan_amount'], count='id')
     
     # Employee length analysis
-    emp_data = df.groupby('emp_length').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    emp_data = coded.aggregate(['emp_length'], sums=['loan_amount'], count='id')
     
     # Home ownership analysis
-    home_data = df.groupby('home_ownership').agg({
-        'id': 'count',
-        'loan_amount': 'sum'
-    }).reset_index()
+    home_data = coded.aggregate(['home_ownership'], sums=['loan_amount'], count='id')
     
     fig = make_subplots(
         rows=2, cols=2,
@@ -309,78 +313,197 @@ def create_categorical_analysis():
     )
     
     fig.update_layout(height=800, showlegend=False, title_text="Categorical Analysis")
-    fig.write_html("categorical_analysis.html")
-    print("✅ Categorical Analysis chart saved as 'categorical_analysis.html'")
+    save_chart(fig, "categorical_analysis.html", "Categorical Analysis chart")
     return fig
 
 # 7. Risk Analysis Dashboard
-def create_risk_analysis():
+
+# Above this many loans the scatter plots switch from one WebGL marker per
+# loan to a server-side 2D density grid, so file size stays flat
+RISK_SCATTER_MAX_POINTS = 100_000
+RISK_DENSITY_BINS = 100
+RISK_HISTOGRAM_BINS = 30
+
+def _histogram_trace(values, name, color, nbins=RISK_HISTOGRAM_BINS):
+    """Histogram binned with NumPy, so only the bin counts go into the HTML"""
+    values = np.asarray(values, dtype='float64')
+    counts, edges = np.histogram(values[np.isfinite(values)], bins=nbins)
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                  name=name, marker_color=color,
+                  hovertemplate="%{x:.2f}: %{y:,} loans<extra></extra>")
+
+def _risk_scatter_trace(x, y, name, color, colorscale, max_points, nbins=RISK_DENSITY_BINS):
+    """WebGL scatter for moderate sizes, a binned density heatmap above `max_points`"""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    if len(x) <= max_points:
+        return go.Scattergl(x=x, y=y, mode='markers', name=name,
+                            marker=dict(color=color, size=3, opacity=0.6))
+
+    finite = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=nbins)
+    # Empty bins are left blank rather than drawn in the lowest colour
+    z = np.where(counts > 0, counts, np.nan).T
+    return go.Heatmap(x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                      z=z, name=name, colorscale=colorscale, showscale=False,
+                      hovertemplate="x %{x:.2f}, y %{y:.2f}: %{z:,} loans<extra></extra>")
+
+def create_risk_analysis(max_points=RISK_SCATTER_MAX_POINTS):
     """Create risk analysis dashboard"""
     # Interest rate distribution
     fig = make_subplots(
         rows=2, cols=2,
         subplot_titles=('Interest Rate Distribution', 'DTI Distribution', 
                        'Loan Amount vs Interest Rate', 'Risk Matrix'),
-        specs=[[{"type": "histogram"}, {"type": "histogram"}],
-               [{"type": "scatter"}, {"type": "scatter"}]]
+        specs=[[{"type": "xy"}, {"type": "xy"}],
+               [{"type": "xy"}, {"type": "xy"}]]
     )
     
+    int_rate_pct = df['int_rate'].to_numpy(dtype='float64') * 100
+    dti_pct = df['dti'].to_numpy(dtype='float64') * 100
+    
     # Interest rate histogram
     fig.add_trace(
-        go.Histogram(x=df['int_rate']*100, nbinsx=30, name="Interest Rate %",
-                    marker_color='lightcoral'),
+        _histogram_trace(int_rate_pct, "Interest Rate %", 'lightcoral'),
         row=1, col=1
     )
     
     # DTI histogram
     fig.add_trace(
-        go.Histogram(x=df['dti']*100, nbinsx=30, name="DTI %",
-                    marker_color='lightblue'),
+        _histogram_trace(dti_pct, "DTI %", 'lightblue'),
         row=1, col=2
     )
     
     # Scatter plot: Loan Amount vs Interest Rate
     fig.add_trace(
-        go.Scatter(x=df['loan_amount'], y=df['int_rate']*100, mode='markers',
-                  name="Amount vs Rate", marker=dict(color='green', size=3, opacity=0.6)),
+        _risk_scatter_trace(df['loan_amount'], int_rate_pct, "Amount vs Rate",
+                            'green', 'Greens', max_points),
         row=2, col=1
     )
     
     # Risk matrix: DTI vs Interest Rate
     fig.add_trace(
-        go.Scatter(x=df['dti']*100, y=df['int_rate']*100, mode='markers',
-                  name="DTI vs Rate", marker=dict(color='red', size=3, opacity=0.6)),
+        _risk_scatter_trace(dti_pct, int_rate_pct, "DTI vs Rate",
+                            'red', 'Reds', max_points),
         row=2, col=2
     )
     
-    fig.update_layout(height=700, showlegend=False, title_text="Risk Analysis Dashboard")
-    fig.write_html("risk_analysis.html")
-    print("✅ Risk Analysis Dashboard saved as 'risk_analysis.html'")
+    fig.update_layout(height=700, showlegend=False, bargap=0, title_text="Risk Analysis Dashboard")
+    save_chart(fig, "risk_analysis.html", "Risk Analysis Dashboard")
     return fig
 
+# Chart builders in output order; each one writes its own HTML file
+CHART_BUILDERS = [
+    create_kpi_summary,
+    create_monthly_trends,
+    create_loan_status_analysis,
+    create_geographic_analysis,
+    create_good_vs_bad_analysis,
+    create_categorical_analysis,
+    create_risk_analysis
+]
+
+def _timed_build(name, plotlyjs_mode=True, fragment_plotlyjs=None, granularity='M'):
+    """Run one chart builder by name and return its wall time.
+
+    With `fragment_plotlyjs` set, the figure is also returned as an HTML
+    fragment for the single-page report; the value says how that fragment
+    loads plotly.js (False when another fragment already does).
+    """
+    global PLOTLYJS_MODE, TREND_GRANULARITY
+    PLOTLYJS_MODE = plotlyjs_mode
+    TREND_GRANULARITY = granularity
+    start = time.perf_counter()
+    fig = globals()[name]()
+    fragment = None
+    if fragment_plotlyjs is not None:
+        fragment = fig.to_html(full_html=False, include_plotlyjs=fragment_plotlyjs)
+    return name, time.perf_counter() - start, fragment
+
+def _write_shared_plotlyjs(plotlyjs_mode):
+    """Write the shared plotly.min.js once, up front, instead of racing the workers for it"""
+    if plotlyjs_mode == 'directory' and not os.path.exists('plotly.min.js'):
+        with open('plotly.min.js', 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+def _run_builders(jobs, workers):
+    """Run (name, plotlyjs_mode, fragment_plotlyjs, granularity) jobs, in a process pool when `workers` > 1"""
+    if workers <= 1:
+        return [_timed_build(*job) for job in jobs]
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork') if 'fork' in methods else None
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context) as pool:
+        return list(pool.map(_timed_build, *zip(*jobs)))
+
+def generate_charts(workers=1, plotlyjs_mode=True, granularity='M'):
+    """Build every chart into its own HTML file, in a process pool when `workers` > 1.
+
+    Forked workers share the dataset already loaded in this process
+    (copy-on-write); where fork isn't available each worker loads it from
+    the columnar cache. Returns (builder name, seconds) pairs in order.
+    """
+    _write_shared_plotlyjs(plotlyjs_mode)
+    jobs = [(builder.__name__, plotlyjs_mode, None, granularity) for builder in CHART_BUILDERS]
+    return [(name, seconds) for name, seconds, _ in _run_builders(jobs, workers)]
+
+def generate_report_page(workers=1, plotlyjs_mode=True, path=REPORT_PAGE_PATH, granularity='M'):
+    """Build every chart into one HTML page that loads plotly.js only once"""
+    _write_shared_plotlyjs(plotlyjs_mode)
+    # Only the first fragment carries plotly.js; the others reuse it
+    jobs = [(builder.__name__, None, plotlyjs_mode if i == 0 else False, granularity)
+            for i, builder in enumerate(CHART_BUILDERS)]
+    results = _run_builders(jobs, workers)
+
+    sections = "\n".join(f'<section>{fragment}</section>' for _, _, fragment in results)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8">'
+                '<title>Bank Loan Analytics Report</title></head>\n'
+                f'<body>\n<h1>Bank Loan Analytics Report</h1>\n{sections}\n</body>\n</html>\n')
+    print(f"✅ Report page with all charts saved as '{path}'")
+    return [(name, seconds) for name, seconds, _ in results]
+
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate standalone HTML charts.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="charts built in parallel (0 = one per CPU core)")
+    parser.add_argument('--plotlyjs', choices=sorted(PLOTLYJS_CHOICES), default='inline',
+                        help="embed plotly.js in every file, share one plotly.min.js, or use the CDN")
+    parser.add_argument('--single-page', action='store_true',
+                        help=f"write all charts into one '{REPORT_PAGE_PATH}' instead of seven files")
+    parser.add_argument('--granularity', choices=list(GRANULARITIES), default='M',
+                        help="period of the trends chart: D(aily), W(eekly), M(onthly), Q(uarterly) or Y(early)")
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    plotlyjs_mode = PLOTLYJS_CHOICES[args.plotlyjs]
+
     print("🚀 Generating Bank Loan Analytics Charts...")
     print("=" * 50)
     
     # Generate all charts
-    create_kpi_summary()
-    create_monthly_trends()
-    create_loan_status_analysis()
-    create_geographic_analysis()
-    create_good_vs_bad_analysis()
-    create_categorical_analysis()
-    create_risk_analysis()
+    start = time.perf_counter()
+    if args.single_page:
+        timings = generate_report_page(workers, plotlyjs_mode, granularity=args.granularity)
+    else:
+        timings = generate_charts(workers, plotlyjs_mode, args.granularity)
+    total = time.perf_counter() - start
     
     print("=" * 50)
     print("🎉 All charts generated successfully!")
-    print("📁 Check your current directory for the HTML files")
-    print("🌐 Open any HTML file in your web browser to view the interactive charts")
-    print("\n📊 Generated Charts:")
-    print("  • kpi_summary.html - Key Performance Indicators")
-    print("  • monthly_trends.html - Monthly Trends Analysis")
-    print("  • loan_status_analysis.html - Loan Status Analysis")
-    print("  • geographic_analysis.html - Geographic Analysis")
-    print("  • good_vs_bad_analysis.html - Good vs Bad Loan Analysis")
-    print("  • categorical_analysis.html - Categorical Analysis")
-    print("  • risk_analysis.html - Risk Analysis Dashboard")
+    print(f"⏱️  Built in {total:.2f}s with {workers} worker(s):")
+    for name, seconds in timings:
+        print(f"  • {name}: {seconds:.2f}s")
+    if args.single_page:
+        print(f"🌐 Open '{REPORT_PAGE_PATH}' in your web browser to view the interactive charts")
+    else:
+        print("📁 Check your current directory for the HTML files")
+        print("🌐 Open any HTML file in your web browser to view the interactive charts")
+        print("\n📊 Generated Charts:")
+        print("  • kpi_summary.html - Key Performance Indicators")
+        print("  • monthly_trends.html - Monthly Trends Analysis")
+        print("  • loan_status_analysis.html - Loan Status Analysis")
+        print("  • geographic_analysis.html - Geographic Analysis")
+        print("  • good_vs_bad_analysis.html - Good vs Bad Loan Analysis")
+        print("  • categorical_analysis.html - Categorical Analysis")
+        print("  • risk_analysis.html - Risk Analysis Dashboard")
@@ -0,0 +1,192 @@
+# stage_metrics.py
+
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric name -> (Prometheus type, help text)
+METRICS = {
+    'dashboard_stage_seconds': ('histogram', "Time spent in each instrumented stage"),
+    'dashboard_stage_calls_total': ('counter', "Calls of each instrumented stage"),
+    'dashboard_stage_errors_total': ('counter', "Calls of each instrumented stage that raised"),
+    'dashboard_http_request_seconds': ('histogram', "Time to answer an HTTP request, by route"),
+    'dashboard_view_job_requests_total': ('counter', "Filtered views not in the cache, handed to a background job"),
+    'dashboard_data_rows': ('gauge', "Loans in the data being served"),
+    'dashboard_data_memory_bytes': ('gauge', "Memory held by the loan frame being served (arrays only, not the strings of object columns)"),
+    'dashboard_cube_cells': ('gauge', "Cells of the loan cube being served"),
+    'dashboard_data_loaded_timestamp_seconds': ('gauge', "Unix time the served data was loaded")
+}
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class StageMetrics:
+    """Thread-safe timing histograms, counters and gauges, rendered as Prometheus text.
+
+    Every process keeps its own. Worker processes that should be scraped
+    as one (see serve.py) each write their counters and histograms to a
+    shared directory now and then, and render() adds those of the others
+    to its own.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self._counters = {}    # (name, labels) -> value
+        self._gauges = {}      # (name, labels) -> value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[i] += 1
+            values[-2] += 1
+            values[-1] += seconds
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the enclosed block as one call of `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc('dashboard_stage_errors_total', stage=stage)
+            raise
+        finally:
+            self.observe('dashboard_stage_seconds', time.perf_counter() - start, stage=stage)
+            self.inc('dashboard_stage_calls_total', stage=stage)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as `stage`"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        """The counters and histograms as JSON-ready lists"""
+        with self._lock:
+            return {
+                'buckets': list(self.buckets),
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self._histograms.items()],
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()]
+            }
+
+    def write_snapshot(self, directory):
+        """Store this process's counters and histograms for the other workers to render"""
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def render(self, directory=None):
+        """All metrics in the Prometheus text format, adding those of other workers in `directory`"""
+        histograms, counters = {}, {}
+        snapshots = [self.snapshot()]
+        if directory:
+            own = os.path.join(directory, f"{os.getpid()}.json")
+            for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+                if path == own:
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue  # being replaced right now; it is in the next scrape
+                if snapshot.get('buckets') == list(self.buckets):
+                    snapshots.append(snapshot)
+        for snapshot in snapshots:
+            for name, labels, values in snapshot['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = histograms.setdefault(key, [0] * len(values))
+                histograms[key] = [a + b for a, b in zip(total, values)]
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+        with self._lock:
+            gauges = dict(self._gauges)
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = {'histogram': histograms, 'counter': counters, 'gauge': gauges}[kind]
+            keys = sorted(key for key in series if key[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in keys:
+                labels = key[1]
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(series[key])}")
+                    continue
+                values = series[key]
+                for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                    le = bound if bound == '+Inf' else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(values[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {values[-2]}")
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def start_snapshot_writer(directory, interval, metrics=None):
+    """Write this process's metrics into `directory` every `interval` seconds, in the background"""
+    metrics = metrics or registry
+    os.makedirs(directory, exist_ok=True)
+
+    def run():
+        while True:
+            try:
+                metrics.write_snapshot(directory)
+            except OSError as e:
+                print(f"Could not write metrics snapshot: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='metrics-snapshot', daemon=True)
+    thread.start()
+    return thread
+
+
+# The process-wide registry every instrumented module records into
+registry = StageMetrics()
@@ -0,0 +1,165 @@
+# time_rollups.py
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from loan_cube import CUBE_MEASURES, MEAN_MEASURES
+from period_kpis import build_daily_totals
+
+# Granularities of the trend charts, finest first: pandas frequency -> label
+GRANULARITIES = {
+    'D': 'Daily',
+    'W': 'Weekly',
+    'M': 'Monthly',
+    'Q': 'Quarterly',
+    'Y': 'Yearly'
+}
+
+# Level each granularity is summed up from. Weeks straddle month ends, so
+# they come from the days; everything coarser nests in the level before.
+DERIVED_FROM = {
+    'W': 'D',
+    'M': 'D',
+    'Q': 'M',
+    'Y': 'Q'
+}
+
+
+class TimePyramid:
+    """Loan measures per day, week, month, quarter and year of issue.
+
+    The daily level is read off the running totals of a DailyTotals (see
+    period_kpis), and each coarser level is summed from a finer level,
+    never from the loans. Built once per data version and selection, so
+    switching granularity is a lookup.
+    """
+
+    def __init__(self, daily_totals):
+        self.daily_totals = daily_totals
+        days = np.diff(daily_totals.cumulative, axis=0)
+        if len(days):
+            index = pd.period_range(pd.Timestamp(daily_totals.first_day), periods=len(days), freq='D')
+        else:
+            index = pd.PeriodIndex([], freq='D')
+        self._sums = {'D': pd.DataFrame(days, index=index, columns=CUBE_MEASURES)}
+        for freq, finer in DERIVED_FROM.items():
+            sums = self._sums[finer]
+            self._sums[freq] = sums.groupby(sums.index.asfreq(freq)).sum()
+        self.levels = {freq: _finish(sums) for freq, sums in self._sums.items()}
+
+    def level(self, granularity, start=None, end=None):
+        """The periods of one granularity with loans, optionally only those issued from `start` to `end`.
+
+        Periods cut by `start` or `end` only count the days inside, which
+        are two lookups in the running totals, so a date range costs no
+        more than the periods it shows.
+        """
+        if granularity not in self.levels:
+            raise ValueError(f"unknown granularity '{granularity}', expected one of {list(GRANULARITIES)}")
+        if start is None and end is None:
+            return self.levels[granularity]
+        sums = self._sums[granularity]
+        first = pd.Timestamp(start).normalize() if start is not None else None
+        last = pd.Timestamp(end).normalize() if end is not None else None
+        keep = np.ones(len(sums), dtype=bool)
+        if first is not None:
+            keep &= sums.index.end_time.normalize() >= first
+        if last is not None:
+            keep &= sums.index.start_time <= last
+        sums = sums[keep].copy()
+        # Only the first and last period can be cut
+        for i in sorted({0, len(sums) - 1}) if len(sums) else []:
+            period = sums.index[i]
+            lo, hi = period.start_time, period.end_time.normalize()
+            if first is not None and lo < first:
+                lo = first
+            if last is not None and hi > last:
+                hi = last
+            if (lo, hi) != (period.start_time, period.end_time.normalize()):
+                totals = self.daily_totals.range_totals(lo, hi)
+                sums.iloc[i] = [totals[m] for m in CUBE_MEASURES]
+        return _finish(sums)
+
+
+def _finish(sums):
+    """Periods with loans, with the count as an integer and the int_rate / dti averages"""
+    result = sums[sums['count'] > 0].rename_axis('period').reset_index()
+    result['count'] = result['count'].round().astype('int64')
+    for m in MEAN_MEASURES:
+        result[m] = result[f"{m}_sum"] / result[f"{m}_n"]
+    return result
+
+
+def build_pyramid(df, filters=None, index=None):
+    """Build the TimePyramid of the loans matching `filters` (see period_kpis.build_daily_totals)"""
+    return TimePyramid(build_daily_totals(df, filters, index))
+
+
+def scan_level(df, granularity, start=None, end=None):
+    """One level computed straight from the rows, to check the pyramid against"""
+    rows = df[df['issue_date'].notna()]
+    if start is not None:
+        rows = rows[rows['issue_date'] >= pd.Timestamp(start).normalize()]
+    if end is not None:
+        rows = rows[rows['issue_date'] <= pd.Timestamp(end).normalize()]
+    grouped = rows.groupby(rows['issue_date'].dt.to_period(granularity))
+    result = pd.DataFrame({
+        'count': grouped.size(),
+        'loan_amount': grouped['loan_amount'].sum(),
+        'total_payment': grouped['total_payment'].sum(),
+        'int_rate': grouped['int_rate'].mean(),
+        'dti': grouped['dti'].mean()
+    })
+    return result.rename_axis('period').reset_index()
+
+
+def check_pyramid(df, pyramid):
+    """Compare every level, whole and cut to a date range, with a groupby over the rows"""
+    last = pyramid.daily_totals.last_day
+    ranges = [(None, None), (pyramid.daily_totals.first_day + 40, last - 75)]
+    mismatches = []
+    for freq in GRANULARITIES:
+        for start, end in ranges:
+            expected = scan_level(df, freq, start, end)
+            actual = pyramid.level(freq, start, end)[list(expected.columns)]
+            try:
+                pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=1e-6)
+            except AssertionError as e:
+                mismatches.append(f"{GRANULARITIES[freq]} {start}..{end}: {str(e).splitlines()[0]}")
+    return mismatches
+
+
+def main(argv=None):
+    from loan_data import CLEANED_FILE_PATH, load_cleaned_data
+
+    parser = argparse.ArgumentParser(description="Show the loan trend at one time granularity.")
+    parser.add_argument('--data', default=CLEANED_FILE_PATH, help="cleaned loan CSV")
+    parser.add_argument('--granularity', choices=list(GRANULARITIES), default='M',
+                        help="D(aily), W(eekly), M(onthly), Q(uarterly) or Y(early)")
+    parser.add_argument('--check', action='store_true',
+                        help="verify every level against a groupby over the rows")
+    args = parser.parse_args(argv)
+
+    df, _ = load_cleaned_data(args.data, show_memory=False)
+    start = time.perf_counter()
+    pyramid = build_pyramid(df)
+    print(f"🔺 Time rollups built in {time.perf_counter() - start:.3f}s: "
+          + ", ".join(f"{len(pyramid.levels[f]):,} {label.lower()}" for f, label in GRANULARITIES.items()))
+    if args.check:
+        mismatches = check_pyramid(df, pyramid)
+        print(f"{'❌' if mismatches else '✅'} {len(mismatches)} mismatching levels")
+        for line in mismatches:
+            print(f"     {line}")
+        return 1 if mismatches else 0
+
+    level = pyramid.level(args.granularity)
+    print(level[['period', 'count', 'loan_amount', 'total_payment']].to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())